@@ -0,0 +1,65 @@
+"""Microbenchmarks of the farad.elem primitives.
+
+Prints the cost of one call of every elementwise primitive, in microseconds, on
+a plain float, a scalar and an array-valued Dual, and a scalar and an
+array-valued Rnode. Run from the repository root:
+
+    python benchmarks/elem_bench.py [--size N] [--number N]
+
+Each figure is the best of five timeit repeats of --number calls, so that runs
+before and after a change of the derivative rules can be compared line by line.
+"""
+
+import argparse
+import timeit
+
+import numpy as np
+
+import farad.elem as el
+from farad.dual import Dual
+from farad.rnode import Rnode
+
+PRIMITIVES = ['sin', 'cos', 'tan', 'log', 'log10', 'log2', 'sinh', 'cosh', 'tanh',
+              'exp', 'sqrt', 'arcsin', 'arccos', 'arctan', 'relu', 'relu6', 'logistic']
+
+
+def inputs(size: int) -> dict:
+    """Arguments of every benchmarked kind, inside the domain of all primitives."""
+    values = np.linspace(0.1, 0.9, size)
+    return {'float': lambda: 0.5,
+            'Dual': lambda: Dual(0.5, 1.0),
+            'Dual[n]': lambda: Dual(values, np.ones(size)),
+            'Rnode': lambda: Rnode(0.5),
+            'Rnode[n]': lambda: Rnode(values)}
+
+
+def bench(size: int = 1000, number: int = 2000) -> dict:
+    """Return {primitive: {kind: microseconds per call}}."""
+    kinds = inputs(size)
+    results = {}
+    for name in PRIMITIVES:
+        fn = getattr(el, name)
+        results[name] = {}
+        for kind, make in kinds.items():
+            # Rnode arguments collect one child per call, so build a fresh one per repeat,
+            # in the untimed setup
+            arg = {}
+            timer = timeit.Timer(lambda: fn(arg['x']), setup=lambda: arg.update(x=make()))
+            results[name][kind] = min(timer.repeat(5, number)) / number * 1e6
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size', type=int, default=1000, help='length of the array-valued inputs')
+    parser.add_argument('--number', type=int, default=2000, help='calls per timeit repeat')
+    args = parser.parse_args()
+    results = bench(args.size, args.number)
+    kinds = list(inputs(1))
+    print(f"{'us/call':<10}" + ''.join(f'{kind:>10}' for kind in kinds))
+    for name, row in results.items():
+        print(f'{name:<10}' + ''.join(f'{row[kind]:>10.2f}' for kind in kinds))
+
+
+if __name__ == '__main__':
+    main()
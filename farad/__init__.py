@@ -0,0 +1 @@
+from farad.elem import primitive
@@ -0,0 +1,138 @@
+"""Asynchronous evaluation for farad package.
+
+AsyncDiff serves derivatives to asyncio coroutines. Each call of its coroutines asks
+for the results at one point; the requests made within a short window are gathered
+into one batch, which is evaluated by a single driver call, and every request is
+then answered with its row of the results. In forward mode, the function is called
+once per parameter on arrays holding the whole batch (see AutoDiff.value_and_grad),
+so many concurrent requests cost about as much as one; reverse mode still records
+one graph per point.
+
+The batches are evaluated in the event loop's thread by default, which suits tests
+and small functions, or handed to a concurrent.futures executor, which keeps the
+loop responsive while a batch is evaluated.
+"""
+
+__all__ = ['AsyncDiff']
+
+import asyncio
+import numpy as np
+from farad.parallel import _evaluate
+from typing import Callable, List, Optional, Tuple, Union
+
+
+class AsyncDiff:
+
+    def __init__(self, function: Union[Callable, List[Callable]], mode: str = 'forward', dim: int = 1,
+                 wrt: Optional[List[int]] = None, vectorized: bool = False, array_input: bool = False,
+                 window: float = 0.001, max_batch: int = 256, executor=None):
+        """Constructor for AsyncDiff class.
+
+        Parameters
+        ==========
+        function: The function to differentiate, or in reverse mode a list of functions.
+        mode: 'forward' (AutoDiff) or 'reverse' (RAutoDiff).
+        dim, wrt, vectorized, array_input: see ParallelDiff.
+        window: seconds to wait, from the first request of a batch, for more requests.
+        max_batch: number of requests that starts the evaluation of a batch without
+        waiting for the end of the window.
+        executor: optional concurrent.futures executor evaluating the batches; a
+        ProcessPoolExecutor requires a function defined at the top level of a module.
+        """
+        if mode not in ('forward', 'reverse'):
+            raise ValueError("mode must be 'forward' or 'reverse'")
+        if max_batch < 1:
+            raise ValueError('max_batch must be a positive integer')
+        self.function = function
+        self.mode = mode
+        self.options = {'dim': dim, 'wrt': wrt, 'vectorized': vectorized, 'array_input': array_input}
+        self.window = window
+        self.max_batch = max_batch
+        self.executor = executor
+        self._pending = []  # (point, future) of the requests of the next batch
+        self._timer = None  # handle of the end of the window
+        self._tasks = set()  # batches being evaluated
+
+    async def value_and_grad(self, x) -> Tuple[np.ndarray, np.ndarray]:
+        """Value and derivatives of the function at one point.
+
+        Parameters
+        ==========
+        x: array_like, a point: a scalar for a function of one scalar parameter, n
+        values for n parameters, an array for array_input.
+
+        Returns
+        =======
+        (np.ndarray, np.ndarray)
+            The value and the derivatives at x, of shapes (outputs) and
+            (outputs) + (inputs), see farad.driver.
+
+        Notes
+        =====
+        The points of a batch are evaluated in groups of the same shape. If a group
+        fails, its points are evaluated again one by one, so that an error is only
+        raised by the requests at the points that cause it.
+
+        Example
+        =======
+        >>> from farad.elem import sin
+        >>> async def main(engine):
+        ...     return await asyncio.gather(*(engine.grad(x) for x in (0.0, np.pi)))
+        >>> asyncio.run(main(AsyncDiff(sin)))
+        [array(1.), array(-1.)]
+        """
+        point = np.asarray(x, dtype=float)  # a malformed point fails here, not its batch
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((point, future))
+        if len(self._pending) >= self.max_batch:
+            self._dispatch(loop)
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._dispatch, loop)
+        return await future
+
+    async def grad(self, x) -> np.ndarray:
+        """Derivatives of the function at one point, see value_and_grad."""
+        return (await self.value_and_grad(x))[1]
+
+    def _dispatch(self, loop: asyncio.AbstractEventLoop):
+        """Start evaluating the pending requests as one batch."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        task = loop.create_task(self._evaluate(loop, batch))
+        self._tasks.add(task)  # referenced until done, see asyncio.create_task
+        task.add_done_callback(self._tasks.discard)
+
+    async def _evaluate(self, loop: asyncio.AbstractEventLoop, batch: list):
+        """Evaluate a batch and answer its requests, one group of points of the same
+        shape at a time."""
+        groups = {}
+        for point, future in batch:
+            groups.setdefault(point.shape, []).append((point, future))
+        for group in groups.values():
+            await self._answer(loop, group)
+
+    async def _answer(self, loop: asyncio.AbstractEventLoop, group: list):
+        """Evaluate a group of requests with one driver call and answer them; if the
+        call fails, the requests of a larger group are answered one by one."""
+        try:
+            points = np.stack([point for point, _ in group])
+            if self.executor is None:
+                values, ders = _evaluate(self.mode, self.function, self.options, points)
+            else:
+                values, ders = await loop.run_in_executor(self.executor, _evaluate, self.mode, self.function,
+                                                          self.options, points)
+        except Exception as error:
+            if len(group) > 1:
+                for request in group:
+                    await self._answer(loop, [request])
+                return
+            _, future = group[0]
+            if not future.done():  # not cancelled
+                future.set_exception(error)
+            return
+        for i, (_, future) in enumerate(group):
+            if not future.done():
+                future.set_result((values[i, ...], ders[i, ...]))
@@ -0,0 +1,261 @@
+"""Persistent result cache for farad package.
+
+DiskCache memoizes the values and derivatives computed by the AutoDiff and
+RAutoDiff drivers in a directory, across processes and runs. An entry is keyed by
+a fingerprint of the function, the settings of the driver and a hash of the input,
+so re-evaluating the same function at the same points costs a lookup: the stored
+arrays are returned as read-only memory maps, without calling the function.
+
+The function is fingerprinted by its bytecode, constants, names, default arguments
+and closure, by the same parts of the functions and farad.elem Primitives it calls
+by global name, and by the numbers, arrays, lists, tuples and dicts it reads from
+global names, in its body or in nested functions and comprehensions. Partial
+functions are fingerprinted by their function and arguments, bound methods by their
+function and instance, and instances (callable or not) by their class, __call__
+method and attributes; modules, classes, builtins and the functions of farad itself
+are identified by name only, so editing farad, for instance, is not detected (call
+clear() then). Numbers, arrays, lists and dicts in a closure are hashed by content,
+so a function capturing state that changes between calls gets a new fingerprint
+each time; objects that cannot be hashed by content raise TypeError rather than
+share a fingerprint. Entries are listed in an SQLite index, with their sizes and
+order of use, and the least recently used ones are evicted once the files exceed
+max_bytes.
+"""
+
+__all__ = ['DiskCache', 'fingerprint']
+
+import os
+import types
+import functools
+import sqlite3
+import hashlib
+import threading
+import numpy as np
+from farad.driver import AutoDiff, RAutoDiff
+from farad.elem import Primitive
+from typing import Callable, List, Optional, Tuple, Union
+
+
+_FARAD = os.path.dirname(os.path.abspath(__file__)) + os.sep  # source files of farad
+_BY_CONTENT = (types.FunctionType, types.MethodType, functools.partial, Primitive, np.ndarray, list, tuple, dict, int,
+               float, complex, np.number)  # values of global names that are fingerprinted
+
+
+def _names(code: types.CodeType):
+    """Global names read by code and by the functions and comprehensions nested in it."""
+    yield from code.co_names
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            yield from _names(const)
+
+
+def _by_name(obj) -> bool:
+    """Whether obj is fingerprinted by its name only: a module, class, builtin, or a
+    function or primitive of farad, whose own state (such as the rule cache of
+    farad.elem) is not part of the results."""
+    if isinstance(obj, (types.ModuleType, type, np.ufunc)):
+        return True
+    if isinstance(obj, types.BuiltinFunctionType):  # but not the methods of an object
+        return isinstance(obj.__self__, (types.ModuleType, type(None)))
+    fn = obj.fn if isinstance(obj, Primitive) else obj
+    return isinstance(fn, types.FunctionType) and fn.__code__.co_filename.startswith(_FARAD)
+
+
+def _feed(h, obj, seen: set):
+    """Update the hash h with a description of obj, see fingerprint."""
+    if isinstance(obj, (list, tuple, dict, types.FunctionType)) or hasattr(obj, '__dict__'):
+        if id(obj) in seen:  # recursive function or container
+            h.update(b'seen')
+            return
+        seen.add(id(obj))
+    if isinstance(obj, (list, tuple)):
+        h.update(f'{type(obj).__name__}{len(obj)}'.encode())
+        for item in obj:
+            _feed(h, item, seen)
+    elif isinstance(obj, dict):
+        h.update(f'dict{len(obj)}'.encode())
+        for key, value in obj.items():
+            _feed(h, key, seen)
+            _feed(h, value, seen)
+    elif _by_name(obj):  # modules, classes, builtins and farad itself
+        h.update(f'{type(obj).__module__}.{type(obj).__qualname__}:'.encode())
+        name = getattr(obj, '__qualname__', None) or getattr(obj, '__name__', '')  # ufuncs have a __name__ only
+        h.update(str(getattr(obj, '__module__', '')).encode() + str(name).encode())
+    elif isinstance(obj, types.CodeType):
+        h.update(obj.co_code)
+        h.update(repr((obj.co_names, obj.co_varnames, obj.co_freevars)).encode())
+        _feed(h, obj.co_consts, seen)
+    elif isinstance(obj, types.FunctionType):
+        _feed(h, obj.__code__, seen)
+        _feed(h, obj.__defaults__ or (), seen)
+        _feed(h, obj.__kwdefaults__ or {}, seen)
+        _feed(h, [cell.cell_contents for cell in obj.__closure__ or ()], seen)
+        for name in dict.fromkeys(_names(obj.__code__)):  # functions called and values read by global name
+            value = obj.__globals__.get(name)
+            if isinstance(value, _BY_CONTENT):
+                h.update(name.encode())
+                _feed(h, value, seen)
+    elif isinstance(obj, Primitive):  # by its value function and derivative rules
+        h.update(b'Primitive')
+        _feed(h, (obj.fn, obj.jvps, obj.vjps), seen)
+    elif isinstance(obj, functools.partial):
+        h.update(b'partial')
+        _feed(h, (obj.func, obj.args, obj.keywords), seen)
+    elif isinstance(obj, types.MethodType):  # bound method, by its function and instance
+        h.update(b'method')
+        _feed(h, (obj.__func__, obj.__self__), seen)
+    elif isinstance(obj, np.ndarray):
+        h.update(repr((obj.dtype.str, obj.shape)).encode())
+        h.update(np.ascontiguousarray(obj).tobytes())
+    elif obj is None or isinstance(obj, (bool, int, float, complex, str, bytes, np.number)):
+        h.update(repr(obj).encode())
+    elif hasattr(obj, '__dict__'):  # instances, callable or not, by their class and attributes
+        h.update(f'{type(obj).__module__}.{type(obj).__qualname__}:'.encode())
+        if callable(obj):
+            _feed(h, type(obj).__call__, seen)
+        _feed(h, vars(obj), seen)
+    else:
+        raise TypeError(f'cannot fingerprint {type(obj).__qualname__} objects by content')
+
+
+def fingerprint(function: Union[Callable, List[Callable]]) -> str:
+    """Hash of a function, or a list of functions, that changes with its code.
+
+    Returns:
+    str, the hex digest of the bytecode, constants, names, defaults and closure of
+    function and of the functions it calls by global name, and of the numbers,
+    arrays and containers it reads from global names
+
+    Raises:
+    TypeError if function holds an object that cannot be hashed by content
+
+    Example:
+    >>> fingerprint(lambda x: x ** 2) == fingerprint(lambda x: x ** 2)
+    True
+    >>> fingerprint(lambda x: x ** 2) == fingerprint(lambda x: x ** 3)
+    False
+    """
+    h = hashlib.sha256()
+    _feed(h, function, set())
+    return h.hexdigest()
+
+
+class DiskCache:
+
+    def __init__(self, directory: Union[str, os.PathLike], max_bytes: int = 1 << 30):
+        """Constructor for DiskCache class.
+
+        Parameters
+        ==========
+        directory: where the index and the arrays are stored, created if needed.
+        max_bytes: int, size of the stored arrays above which the least recently
+        used entries are evicted.
+        """
+        self.directory = os.fspath(directory)
+        self.max_bytes = max_bytes
+        self.hits = self.misses = 0
+        os.makedirs(self.directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._index = sqlite3.connect(os.path.join(self.directory, 'index.sqlite'), check_same_thread=False,
+                                      isolation_level=None)  # autocommit: each statement is atomic
+        self._index.execute('CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, size INTEGER, used INTEGER)')
+
+    def value_and_grad(self, driver: Union[AutoDiff, RAutoDiff], x, wrt: Optional[List[int]] = None
+                       ) -> Tuple[np.ndarray, np.ndarray]:
+        """Values and derivatives of the function of a driver at input x, looked up
+        in the cache or computed by driver.value_and_grad and stored.
+
+        Parameters
+        ==========
+        driver: AutoDiff or RAutoDiff object.
+        x: the input of driver.value_and_grad.
+        wrt: optional list of int, parameters to differentiate with RAutoDiff.
+
+        Returns
+        =======
+        (np.ndarray, np.ndarray)
+            The results of driver.value_and_grad(x), as read-only memory maps of the
+            stored arrays; results larger than max_bytes are returned, not stored.
+
+        Example
+        =======
+        >>> import tempfile
+        >>> cache = DiskCache(tempfile.mkdtemp())
+        >>> values, ders = cache.value_and_grad(RAutoDiff(lambda x: x ** 2), [1.0, 2.0])
+        >>> values, ders = cache.value_and_grad(RAutoDiff(lambda x: x ** 2), [1.0, 2.0])
+        >>> ders, cache.hits
+        (memmap([2., 4.]), 1)
+        """
+        key = self._key(driver, x, wrt)
+        paths = self._paths(key)
+        with self._lock:
+            row = self._index.execute('SELECT key FROM entries WHERE key = ?', (key,)).fetchone()
+            if row is not None and all(os.path.exists(path) for path in paths):
+                self._index.execute('UPDATE entries SET used = (SELECT MAX(used) FROM entries) + 1 WHERE key = ?',
+                                    (key,))
+                self.hits += 1
+                return tuple(np.load(path, mmap_mode='r') for path in paths)
+            self.misses += 1
+        if isinstance(driver, RAutoDiff):
+            results = driver.value_and_grad(x, wrt)
+        else:
+            results = driver.value_and_grad(x)
+        if sum(array.nbytes for array in results) > self.max_bytes:
+            return results
+        self._store(key, paths, results)
+        return tuple(np.load(path, mmap_mode='r') for path in paths)
+
+    def clear(self):
+        """Remove all entries."""
+        with self._lock:
+            for (key,) in self._index.execute('SELECT key FROM entries').fetchall():
+                self._remove(key)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._index.execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+
+    def _key(self, driver, x, wrt) -> str:
+        """Key of the results of driver at x: the fingerprint of its function and
+        the hash of its settings and of x."""
+        if isinstance(driver, RAutoDiff):
+            settings = ('reverse', driver.fn, driver.vectorized, driver.array_input, wrt)
+        elif isinstance(driver, AutoDiff):
+            settings = ('forward', driver.function, driver.dimensions, driver.array_input)
+        else:
+            raise TypeError('driver must be an AutoDiff or RAutoDiff object')
+        h = hashlib.sha256()
+        _feed(h, settings, set())
+        _feed(h, np.asarray(x, dtype=float), set())
+        return h.hexdigest()
+
+    def _paths(self, key: str) -> Tuple[str, str]:
+        return os.path.join(self.directory, key + '.values.npy'), os.path.join(self.directory, key + '.ders.npy')
+
+    def _store(self, key: str, paths: Tuple[str, str], results: Tuple[np.ndarray, np.ndarray]):
+        """Write the arrays of an entry, then index it and evict older entries."""
+        for path, array in zip(paths, results):
+            temporary = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+            with open(temporary, 'wb') as file:
+                np.save(file, array)
+            os.replace(temporary, path)  # readers see whole files only
+        size = sum(os.path.getsize(path) for path in paths)
+        with self._lock:
+            self._index.execute('INSERT OR REPLACE INTO entries VALUES (?, ?, '
+                                '(SELECT COALESCE(MAX(used), 0) + 1 FROM entries))', (key, size))
+            total = self._index.execute('SELECT SUM(size) FROM entries').fetchone()[0]
+            for old, old_size in self._index.execute('SELECT key, size FROM entries ORDER BY used').fetchall():
+                if total <= self.max_bytes:
+                    break
+                if old != key:  # the entry just computed is returned, and kept
+                    self._remove(old)
+                    total -= old_size
+
+    def _remove(self, key: str):
+        """Delete an entry and its files; called holding the lock."""
+        self._index.execute('DELETE FROM entries WHERE key = ?', (key,))
+        for path in self._paths(key):
+            try:
+                os.remove(path)  # memory maps already returned stay valid
+            except FileNotFoundError:
+                pass
@@ -12,26 +12,65 @@ reverse() is for getting the derivative of the variables via reverse AD mode.
 forwardpass() is to constructor the tree structure required to perform reverse AD
 calculation. forwardpass needs to be called before using values() and reverse().
 
+grad() turns a scalar function into a function returning its gradient via reverse
+mode. The result can be differentiated again, e.g. grad(grad(f)).
+value_and_grad() returns the value along with the gradient, as do the
+value_and_grad() methods of both drivers, which evaluate the function once for both.
+
+The drivers are reentrant and can be shared between threads. Every call works on
+its own arrays and graphs, and only the results needed by later calls (vals, ders,
+values(), reverse() and the graphs re-evaluated by update()) are kept, separately for
+each thread.
+
+With array_input=True, AutoDiff and RAutoDiff differentiate a function of a single
+array parameter, f(x) with x an ndarray, instead of one scalar parameter per input.
+The argument is lifted to one array-valued Dual or Rnode, which can be indexed,
+sliced and reduced (see farad.linalg), and derivatives are returned as ndarrays.
+
+All values and derivatives are returned as C-contiguous float64 ndarrays, of shape
+
+    values:      (points) + (outputs)
+    derivatives: (points) + (outputs) + (inputs)
+
+where (points) is () for a single point and (p,) for p points, (outputs) is () for a
+scalar function and (m,) for m functions, and (inputs) is () for a function of one
+scalar parameter, (n,) for n parameters (or the n parameters in wrt) and x.shape for
+array_input. A single value is a 0-d array. The methods computing results take an
+optional out= argument, a preallocated buffer of that shape which is filled in place
+instead of allocating new arrays.
+
+AutoDiff.iforward() and RAutoDiff.ireverse() consume an iterable of points lazily,
+such as a feed of measurements. They evaluate micro-batches of batch_size points at a
+time and yield the derivatives at each point as soon as its batch is done, so the
+latency and memory are bounded by the batch size.
+
 """
 
 
 from farad.dual import Dual
+import threading
+from itertools import count, islice
 from numbers import Number
 from inspect import signature
-from farad.rnode import Rnode
+from farad.rnode import Rnode, gradient, record, reevaluate, _subgraph, _sweep
 import numpy as np
 
 
+_levels = count(1)  # tags of nested differentiation levels, see grad()
+
+
 class AutoDiff(object):
 
 
-    def __init__(self, function, dim=1):
+    def __init__(self, function, dim=1, array_input=False):
         """Constructor for AutoDiff class.
 
         Parameters
         ==========
         function: The specific AD method for calculating the derivative.
         dim: The dimensionality of the function.
+        array_input: If True, function takes a single ndarray parameter, see
+        values() and forward().
 
         Notes
         =====
@@ -41,336 +80,821 @@ class AutoDiff(object):
         """
         self.function = function  # function input (e.g., lambda x, y: x**2 + y**2)
         self.dimensions = dim  # dimensionality of function input (e.g., 2 for lambda x: [x**2, x**3])
-        self.vals = []
-        self.ders = []
+        self.array_input = array_input
+        self._local = threading.local()  # results of the last call of each thread, see vals
         try:
-            # if defined as lambda function
-            self.length = len(self.function.__code__.co_varnames)  # no. of function inputs (e.g., 2 for lambda x, y: x**2 +  y**2)
-        except AttributeError:  # if defined as standard function
-            self.length = signature(self.function)
+            self.length = len(signature(self.function).parameters)  # no. of function inputs (e.g., 2 for lambda x, y: x**2 +  y**2)
+        except (TypeError, ValueError):  # callables without a signature, e.g. NumPy ufuncs
+            self.length = 1
 
 
-    def values(self, val):
+    def values(self, val, out=None):
         """Returns node values after propagation through the computational graph.
 
         Parameters
         ==========
         val: a float/integer scalar or a list of scalars.
             Values to be propagated from the input node through the computational graph.
+        out: optional np.ndarray.
+            C-contiguous float64 buffer of the shape of the result, written in place.
 
         Returns
         =======
-        list[float|int], float, or int.
-            Returns list of float or integer values corresponding to output node values.
+        np.ndarray
+            Float64 array of the function values, of shape (points) + (outputs), see
+            farad.driver for the shape convention.
+
+        Notes
+        =====
+        No derivatives are propagated: the function is called on plain floats, and
+        with several points, once on arrays holding all of them (farad.elem functions
+        fall back to NumPy for plain values). Functions that cannot take arrays, e.g.
+        because they branch on the value of their inputs, are called once per point,
+        as are functions whose output does not have the shape of the arrays. The
+        function is assumed to treat each point separately, as scalar functions built
+        from arithmetic and farad.elem do.
 
         Examples
         ========
         >>> example = AutoDiff(lambda x: 2**x)
         >>> example.values(3)
-        [8]
+        array(8.)
         >>> example = AutoDiff(lambda x: 2**x)
         >>> example.values([3, 4])
-        [8, 16]
+        array([ 8., 16.])
         >>> example = AutoDiff(lambda x, y: 3*x + 2*y)
         >>> example.values([3, 4])
-        17
+        array(17.)
         >>> example = AutoDiff(lambda x, y: 2*x + 4*y)
         >>> example.values([[3, 4], [5,4]])
-        [22, 26]
+        array([22., 26.])
+        >>> example = AutoDiff(lambda x: x[0] * x[1], array_input=True)
+        >>> example.values([3.0, 4.0])
+        array(12.)
         """
-        self.vals = []  # reset values to prevent duplicates
-        if self.dimensions == 1:  # (1 input -> scalar objective function)
-
-            if self.length == 1:  # (1 input parameter -> univariate)
-
-                try:  # EAFP principle
-                    try:  # default assumption is list input
-                        for v in val:
-                            a = Dual(v, 1)
-                            self.vals.append(self.function(a)._val)
-                        return self.vals
-                    except TypeError:  # defers to float/integer input
-                        a = Dual(val, 1)
-                        self.vals.append(self.function(a)._val)
-                        return self.vals
-                except TypeError:
-                    raise TypeError('Only list, float, and integer inputs supported.')
-
-            else:  # (>=2 input parameters -> multivariate)
-
-                if any(isinstance(value, list) for value in val):  # parse and calculate for each list
-                    values = []
-                    for value in val:
-                        values.append(self.values(value))
-                    return values
-                try:
-                    self.vals.append(self.function(*val))
-                    return self.function(*val)
-                except:
-                    raise Exception(f'Mismatch between function parameter length: {self.length}, and input length: {len(val)}.')
-
-        else:  # (>=2 inputs -> vector objective function)
-
-            if any(isinstance(el, list) for el in val):
-                for v in val:
-                    values = []
-                    for i in range(self.dimensions):
-                        def inner_func(*args):
-                            return self.function(*args)[i]
-                        func = AutoDiff(inner_func, dim=1)
-                        func.length = self.length
-                        values.append(func.values(v))
-                    self.vals.append(values)
-
-            else:
-
-                self.vals = []  # reset values to prevent duplicates
-                for i in range(self.dimensions):
-                    def inner_func(*args):
-                        return self.function(*args)[i]
-                    func = AutoDiff(inner_func, dim=1)
-                    func.length = self.length
-                    self.vals.append(func.values(val))
-
-            return self.vals
-
-
-    def forward(self, val):
+        point, vals, ders = self._last()
+        if _same_point(point, val):  # computed by the last value_and_grad of this thread
+            if out is None:
+                return vals.copy()
+            _buffer(out, vals.shape)[...] = vals
+            return out
+        if self.array_input:  # (1 array parameter -> one point)
+            value = _outputs(self.function(np.asarray(val, dtype=float)))
+            vals = _buffer(out, np.shape(value))
+            vals[...] = value
+        else:
+            points, batch = self._points(val)
+            vals = _buffer(out, batch + self._outputs_shape())
+            points = np.asarray(points, dtype=float).reshape(batch + (self.length,))
+            try:  # one call on the columns of all points
+                vals[...] = _batched(self.function(*(points[..., i][()] for i in range(self.length))), batch)
+            except (TypeError, ValueError):  # not vectorizable, one call per point
+                for b, point in zip(np.ndindex(*batch), points.reshape(-1, self.length)):
+                    vals[b] = _outputs(self.function(*point))
+        _, kept, ders = self._last()
+        self._local.last = (None, _reuse(kept, vals), ders)
+        return vals
+
+
+    def forward(self, val, out=None):
         """Forward mode method of AutoDiff class.
 
         Parameters
         ==========
         val: a float/integer scalar or a list of scalars.
             Derivatives to be propagated from the input node through the computational graph.
+        out: optional np.ndarray.
+            C-contiguous float64 buffer of the shape of the result, written in place.
 
         Returns
         =======
-        list[float|int], float, or int.
-            Returns list of float or integer values corresponding to output node derivatives.
+        np.ndarray
+            Float64 array of the derivatives, of shape (points) + (outputs) + (inputs),
+            see farad.driver for the shape convention.
 
         Examples
         ========
         >>> example = AutoDiff(lambda x: 2**x)
         >>> example.forward(3)
-        [5.545177444479562]
+        array(5.54517744)
         >>> example = AutoDiff(lambda x: 2**x)
         >>> example.forward([3, 4])
-        [5.545177444479562, 11.090354888959125]
+        array([ 5.54517744, 11.09035489])
         >>> example = AutoDiff(lambda x, y: 3*x + 2*y)
         >>> example.forward([3, 4])
-        [3, 2]
+        array([3., 2.])
         >>> example = AutoDiff(lambda x, y: 2*x + 4*y)
         >>> example.forward([[3, 4], [5,4]])
-        [[2, 4], [2, 4]]
+        array([[2., 4.],
+               [2., 4.]])
+        >>> example = AutoDiff(lambda x: x[0] * x[1], array_input=True)
+        >>> example.forward([3.0, 4.0])
+        array([4., 3.])
         """
-        self.ders = []   # reset values to prevent duplicates
-
-        if self.dimensions == 1:  # (1 input -> scalar objective function)
-
-            if self.length > 1:  # (1 input parameter -> univariate)
-
-                if any(isinstance(value, list) for value in val):  # parse and calculate for each list
-                    values = []
-                    for value in val:
-                        values.append(self.forward(value))
-                    self.ders = values
-                    return self.ders
-                try:
-                    for i in range(self.length):
-                        val2 = val.copy()
-                        val2[i] = Dual(val2[i], 1)
-                        v = self.function(*val2)
-                        if type(v) is Dual:
-                            self.ders.append(self.function(*val2)._der)
-                        else:
-                            self.ders.append(0)
-                    return self.ders
-                except:
-                    raise Exception(f'Mismatch between function parameter length: {self.length}, and input length: {len(val)}.')
-
-            try:  # EAFP principle
-                try:  # default assumption is list input
-                    for v in val:
-                        a = Dual(v, 1)
-                        self.ders.append(self.function(a)._der)
-                    return self.ders
-                except TypeError:  # defers to float/integer input
-                    a = Dual(val, 1)
-                    self.ders.append(self.function(a)._der)
-                    return self.ders
-            except TypeError:
-                raise TypeError('Only list, float, and integer inputs supported.')
-
-        else:  # (>=2 inputs -> vector objective function)
-
-            if any(isinstance(el, list) for el in val):
-                for v in val:
-                    values = []
-                    for i in range(self.dimensions):
-                        def inner_func(*args):
-                            return self.function(*args)[i]
-                        func = AutoDiff(inner_func, dim=1)
-                        func.length = self.length
-                        values.append(func.forward(v))
-                    self.ders.append(values)
-
-            else:  # (>=2 input parameters -> multivariate)
-
-                for i in range(self.dimensions):
-                    def inner_func(*args):
-                        return self.function(*args)[i]
-                    func = AutoDiff(inner_func, dim=1)
-                    func.length = self.length
-                    self.ders.append(func.forward(val))
-            return self.ders
+        return self.value_and_grad(val, (None, out))[1]
+
+
+    def iforward(self, iterable, batch_size=64):
+        """Forward mode over a stream of points.
+
+        Parameters
+        ==========
+        iterable: an iterable of points, each a valid single-point input of forward().
+            It is consumed lazily, batch_size points at a time, and may be unbounded.
+        batch_size: positive int, number of points evaluated together.
+
+        Returns
+        =======
+        iterator
+            The derivatives at each point in turn, as forward() returns them at a
+            single point.
+
+        Examples
+        ========
+        >>> example = AutoDiff(lambda x, y: x * y)
+        >>> for der in example.iforward(iter([[1, 2], [3, 4], [5, 6]]), batch_size=2):
+        ...     print(der)
+        [2. 1.]
+        [4. 3.]
+        [6. 5.]
+        """
+        batches = _batches(iterable, batch_size)
+        if self.array_input:  # (1 array parameter), one call per point
+            return (self.forward(point) for batch in batches for point in batch)
+        return (der for batch in batches for der in _rows(self.forward(batch)))
+
+
+    def value_and_grad(self, val, out=None):
+        """Values and derivatives of the function, from a single forward pass.
+
+        Parameters
+        ==========
+        val: a float/integer scalar or a list of scalars, see values().
+        out: optional pair of np.ndarray.
+            C-contiguous float64 buffers of the shapes of the values and of the
+            derivatives, written in place. Either one may be None.
+
+        Returns
+        =======
+        (np.ndarray, np.ndarray)
+            The results of values() and forward() at val.
+
+        Notes
+        =====
+        The Dual numbers propagated for the derivatives also carry the values, so the
+        function is not evaluated again for them. The pair is kept for the calling
+        thread (as vals and ders), and values() at the same input returns it without
+        any evaluation. value_and_jacobian is an alias, for vector functions.
+
+        With several points, the function is called once per parameter on arrays
+        holding all of them, as in values(), and once per point and parameter if
+        that fails.
+
+        Examples
+        ========
+        >>> example = AutoDiff(lambda x, y: x * y ** 2)
+        >>> example.value_and_grad([3.0, 2.0])
+        (array(12.), array([ 4., 12.]))
+        """
+        value_out, der_out = (None, None) if out is None else out
+        if self.array_input:  # (1 array parameter -> gradient or Jacobian array)
+            x = np.asarray(val, dtype=float)
+            seeds = np.eye(x.size).reshape((x.size,) + x.shape)  # one direction per element
+            y = self.function(Dual(x, seeds))
+            value, der = _outputs(y), _jacobian(y, x.shape)
+            vals = _buffer(value_out, np.shape(value))
+            vals[...] = value
+            ders = _buffer(der_out, der.shape)
+            ders[...] = der
+            self._keep(val, vals, ders)
+            return vals, ders
+
+        points, batch = self._points(val)
+        inputs = (self.length,) if self.length > 1 else ()
+        vals = _buffer(value_out, batch + self._outputs_shape())
+        ders = _buffer(der_out, batch + self._outputs_shape() + inputs)
+        if batch:
+            columns = np.asarray(points, dtype=float).T
+            try:  # one call per parameter on the columns of all points
+                for i in range(self.length):
+                    args = list(columns)
+                    args[i] = Dual(args[i], np.ones(batch))
+                    der = ders[..., i] if self.length > 1 else ders  # view of this parameter
+                    vals[...], der[...] = _batched_pass(self.function(*args), batch)
+            except (TypeError, ValueError):  # not vectorizable, one call per point
+                pass
+            else:
+                self._keep(val, vals, ders)
+                return vals, ders
+        for b, point in zip(np.ndindex(*batch), points):
+            der = ders[b + (Ellipsis,)]  # view of the derivatives at this point
+            if self.length == 1:  # (1 input parameter -> univariate)
+                y = self.function(Dual(point[0], 1))
+                der[...] = _tangents(y)
+            else:  # (>=2 input parameters -> multivariate), one pass per parameter
+                for i in range(self.length):
+                    args = list(point)
+                    args[i] = Dual(args[i], 1)
+                    y = self.function(*args)
+                    der[..., i] = _tangents(y)
+            vals[b] = _outputs(y)  # carried by the Dual numbers of any pass
+        self._keep(val, vals, ders)
+        return vals, ders
+
+
+    value_and_jacobian = value_and_grad
+
+
+    @property
+    def vals(self):
+        """Values computed by the last call of values(), forward() or value_and_grad()
+        in the current thread."""
+        return _copy(self._last()[1])
+
+
+    @property
+    def ders(self):
+        """Derivatives computed by the last call of forward() or value_and_grad() in
+        the current thread."""
+        return _copy(self._last()[2])
+
+
+    def _keep(self, val, vals, ders):
+        """Record the results at input val for the current thread, see values().
+        Private copies are kept: the arrays returned, which may be out buffers, can
+        be written to by the caller without changing later results. The copies of
+        the previous call are reused when the shapes match, so calls with out
+        buffers do not allocate."""
+        last = self._last()
+        self._local.last = tuple(_reuse(kept, array) for kept, array in zip(last, (val, vals, ders)))
+
+
+    def _last(self):
+        """(input, values, derivatives) of the last call in the current thread, the
+        input being None unless both results are for it."""
+        return getattr(self._local, 'last', (None, [], []))
+
+
+    def _outputs_shape(self):
+        """Shape of the outputs at one point, () for a scalar function."""
+        return (self.dimensions,) if self.dimensions > 1 else ()
+
+
+    def _points(self, val):
+        """Split an input into evaluation points.
+
+        Parameters
+        ==========
+        val: a float/integer scalar, a list of scalars or a list of lists, see values().
+
+        Returns
+        =======
+        points: list of tuples, one value per parameter of the function.
+        batch: () for a single point, (p,) for p points.
+        """
+        if self.length == 1:  # a scalar, or one scalar per point
+            try:
+                points = [(v,) for v in val]
+            except TypeError:  # defers to float/integer input
+                return [(val,)], ()
+            return points, (len(points),)
+        if np.ndim(val) > 1 or any(isinstance(value, list) for value in val):  # one list per point
+            points = [tuple(value) for value in val]
+            batch = (len(points),)
+        else:
+            points = [tuple(val)]
+            batch = ()
+        for point in points:
+            if len(point) != self.length:
+                raise TypeError(f'Mismatch between function parameter length: {self.length}, and input length: {len(point)}.')
+        return points, batch
+
+
+def _reuse(kept, array) -> np.ndarray:
+    """Float copy of array, written into the array kept if it has the same shape."""
+    if isinstance(kept, np.ndarray) and kept.shape == np.shape(array):
+        np.copyto(kept, array)
+        return kept
+    return np.array(array, dtype=float)
+
+
+def _copy(array):
+    """Copy of a recorded result, returned by AutoDiff.vals and ders."""
+    return array.copy() if isinstance(array, np.ndarray) else array
+
+
+def _same_point(point, val):
+    """Whether val is the input recorded as point (None if there is none)."""
+    return point is not None and point.shape == np.shape(val) and np.array_equal(point, val)
+
+
+def _buffer(out, shape):
+    """Output array of the drivers: a new float64 array of the given shape, or out,
+    checked to be a C-contiguous float64 array of that shape.
+    """
+    if out is None:
+        return np.empty(shape)
+    if not isinstance(out, np.ndarray) or out.shape != tuple(shape) or out.dtype != np.float64 \
+            or not out.flags.c_contiguous:
+        raise ValueError(f'out must be a C-contiguous float64 array of shape {tuple(shape)}')
+    return out
+
+
+def _outputs(out):
+    """Value of a function output, a list of outputs being stacked into an array,
+    see AutoDiff.values."""
+    if isinstance(out, (list, tuple)):
+        return np.array([_outputs(o) for o in out])
+    return out._val if isinstance(out, Dual) else out
+
+
+def _batched(out, batch):
+    """Outputs of a function called on arrays of points of shape batch, the outputs
+    of each point along the last axis, see AutoDiff.values. Raises ValueError for
+    outputs of another shape, e.g. reductions over the points or constants, so that
+    the points are evaluated one at a time instead."""
+    if isinstance(out, (list, tuple)):
+        return np.stack([_batched(o, batch) for o in out], axis=-1)
+    if np.shape(out) != batch:
+        raise ValueError('function output does not have the shape of its inputs')
+    return out
+
+
+def _batched_pass(out, batch):
+    """Values and derivatives of the outputs of a function called on arrays of points
+    of shape batch, one parameter seeded, the outputs of each point along the last
+    axis; raises ValueError as _batched."""
+    if isinstance(out, (list, tuple)):
+        pairs = [_batched_pass(o, batch) for o in out]
+        return np.stack([v for v, _ in pairs], axis=-1), np.stack([t for _, t in pairs], axis=-1)
+    value = _batched(_outputs(out), batch)
+    return value, np.broadcast_to(out._der, batch) if isinstance(out, Dual) else np.zeros(batch)
+
+
+def _tangents(out):
+    """Derivative of a function output seeded with a single direction, 0 for outputs
+    that do not depend on the seeded parameter, see AutoDiff.forward."""
+    if isinstance(out, (list, tuple)):
+        return np.array([_tangents(o) for o in out])
+    return out._der if isinstance(out, Dual) else 0.0
+
+
+def _jacobian(out, shape):
+    """Derivatives of the output of a function of one array parameter of the given
+    shape, seeded with one direction per element, see AutoDiff.forward.
+
+    Returns:
+    der: np.ndarray of shape out.shape + shape, i.e. the gradient for a scalar
+    output. A list of outputs is stacked along the first axis.
+    """
+    if isinstance(out, (list, tuple)):
+        return np.array([_jacobian(o, shape) for o in out])
+    if not isinstance(out, Dual):  # does not depend on the parameter
+        return np.zeros(np.shape(out) + shape)
+    vshape = np.shape(out._val)
+    der = np.broadcast_to(out._der, (int(np.prod(shape)),) + vshape)
+    return np.moveaxis(der, 0, -1).reshape(vshape + shape)
+
+
+class _Workspace:
+    """State of one RAutoDiff.forwardpass or update call: the recorded graphs and
+    the results. Each call works on its own workspace, which becomes the last one of
+    the calling thread when the call is done."""
+
+    __slots__ = ('graphs', 'subgraphs', 'replay', 'shape', 'wrt', 'roots', 'value', 'der')
+
+    def __init__(self, shape, wrt, graphs=None, subgraphs=None):
+        self.graphs = [] if graphs is None else graphs  # (roots, output, tape) of every graph built by forwardpass
+        self.subgraphs = {} if subgraphs is None else subgraphs  # id(output) -> traversal of its graph, reused by update
+        self.replay = None if graphs is None else iter(graphs)  # iterator over graphs while updating
+        self.shape = shape
+        self.wrt = wrt
+        self.roots = None
+        self.value = None
+        self.der = None
 
 
 class RAutoDiff:
-    def __init__(self, fn):
+    def __init__(self, fn, vectorized=False, array_input=False, replay=False):
         """Constructor for RAutoDiff class.
 
         Parameters
         ==========
         fn: The specific AD method for calculating the derivative.
+        vectorized: If True, multivariate derivatives are accumulated with the
+        level-scheduled vectorized sweep (see farad.rnode.gradient), which is
+        faster for wide, shallow graphs such as sums over many terms.
+        array_input: If True, fn takes a single ndarray parameter and returns a
+        scalar; forwardpass(x) then evaluates fn at the array x, and reverse()
+        returns the gradient as an array of the shape of x.
+        replay: If True, forwardpass records the operations of the graphs it builds,
+        so that update() can re-evaluate them at new inputs. Recording costs about a
+        quarter of the graph construction time, and keeps the graphs alive until the
+        next call.
         """
         self.fn = fn
-        self._roots = None
-        self._value = None
-        self._der = None
+        self.vectorized = vectorized
+        self.array_input = array_input
+        self.replay = replay
+        self._local = threading.local()  # last _Workspace of each thread, see values()
 
-    def forwardpass(self, x):
+    def forwardpass(self, x, wrt=None, out=None):
         """Constructor the tree structure with input X for specific AD method
         fn. Update the value and derivative of the AD method.
 
         Parameters
         ==========
         x: array_like
+        wrt: optional list of int. Positions of the function parameters to
+        differentiate with respect to. Defaults to all parameters. Only the part of
+        the graph between these inputs and the output is swept in reverse.
+        out: optional pair of np.ndarray. C-contiguous float64 buffers of the shapes
+        of values() and reverse(), written in place and returned by these methods.
 
         Returns:
         No returns.
 
+        Notes
+        =====
+        values() and reverse() are float64 arrays of shape (points) + (outputs) and
+        (points) + (outputs) + (inputs), see farad.driver for the shape convention.
+        They return the results of the last forwardpass or update of the calling
+        thread, so threads can share one RAutoDiff object.
+
+        Examples
+        ========
+        >>> example = RAutoDiff(lambda x, y, z: x * y + z ** 2)
+        >>> example.forwardpass([2.0, 3.0, 4.0], wrt=[0, 2])
+        >>> example.reverse()
+        array([3., 8.])
+        >>> example = RAutoDiff(lambda x: x[0] * x[1] + x[2] ** 2, array_input=True)
+        >>> example.forwardpass([2.0, 3.0, 4.0])
+        >>> example.reverse()
+        array([3., 2., 8.])
+        """
+        x = np.asarray(x, dtype=float) if self.array_input else np.asarray(x)
+        self._local.workspace = self._evaluate(x, _Workspace(x.shape, wrt), out)
+
+    def _evaluate(self, x, ws, out=None):
+        """Build (or replay) the graphs of fn at input X and sweep them, see forwardpass.
+
+        Parameters
+        ==========
+        x: np.ndarray
+        ws: _Workspace of this call, holding wrt and, when updating, the recorded graphs
+        out: optional pair of np.ndarray, output buffers
+
+        Returns:
+        ws: the workspace, with the results
+
         """
-        self._roots = None
-        self._value = None
-        self._der = None
-        x = np.asarray(x)
+        wrt = ws.wrt
         try:
-            nf = len(self.fn)  # if fn is a list of functions
+            fns = list(self.fn)  # if fn is a list of functions
         except TypeError:
-            nf = 1
-        if nf == 1:  # only one function
-            self._value, self._der = self._forwardpass1f(x, self.fn)
-        else:  # vector functions
-            #for now, all the input functions must contain exactly the same parameters
-            #with the same order. function with only a subset of total Parameters
-            # is not allowed
-            nparams_all = [len(signature(fi).parameters) for fi in self.fn]
-            if len(set(nparams_all)) > 1:
-                raise TypeError('all input functions must contain the same parameters')
-            self._value = []
-            self._der = []
-            for idxf in range(nf):
-                tmp = self._forwardpass1f(x, self.fn[idxf])
-                self._value.append(tmp[0])
-                self._der.append(tmp[1])
-        self._value = np.asarray(self._value)
-        self._der = np.asarray(self._der)
-        if len(self._value.shape) == 2 and len(self._der.shape) == 2:
-            self._value = np.transpose(self._value, (1, 0))
-            self._der = np.transpose(self._der, (1, 0))
-        elif len(self._value.shape) == 2 and len(self._der.shape) == 3:
-            self._value = np.transpose(self._value, (1, 0))
-            self._der = np.transpose(self._der, (1, 0, 2))
-
-        try:  # if _value or _der is a scalar array (size = 1), convert array to scalar
-            if self._value.size ==1:
-                self._value = np.asscalar(self._value)
-            if self._der.size == 1:
-                self._der = np.asscalar(self._der)
-        except AttributeError:
-            pass
-
-    def _forwardpass1f(self, x, fi):  # deal with only one function case
+            fns = [self.fn]
+        #for now, all the input functions must contain exactly the same parameters
+        #with the same order. function with only a subset of total Parameters
+        # is not allowed
+        nparams_all = [len(signature(fi).parameters) for fi in fns]
+        if len(set(nparams_all)) > 1:
+            raise TypeError('all input functions must contain the same parameters')
+        wrt, batch, inputs = self._layout(x, nparams_all[0], wrt)
+        outputs = (len(fns),) if fns[0] is not self.fn else ()
+        value = _buffer(None if out is None else out[0], batch + outputs)
+        der = _buffer(None if out is None else out[1], batch + outputs + inputs)
+        for idxf, fi in enumerate(fns):
+            index = (Ellipsis, idxf) if outputs else (Ellipsis,)
+            self._forwardpass1f(ws, x, fi, wrt, batch, value[index], der[index + (slice(None),) * len(inputs)])
+        ws.replay = None
+        ws.value = value
+        ws.der = der
+        return ws
+
+    def _layout(self, x, nparams, wrt):
+        """Check input X against the parameters of fn and find the shape of the results.
+
+        Parameters
+        ==========
+        x: np.ndarray, the input of forwardpass
+        nparams: int, number of parameters of the functions
+        wrt: optional list of int, positions of the parameters to differentiate
+
+        Returns:
+        wrt: list of int, defaulting to all parameters
+        batch: tuple, () for a single point, (p,) for p points
+        inputs: tuple, shape of the derivative at one point of one function
+
+        """
+        if wrt is None:
+            wrt = list(range(nparams))
+        elif any(i not in range(nparams) for i in wrt):
+            raise TypeError('wrt index out of range of function parameters')
+        if self.array_input:  # one array parameter, evaluated at the single point x
+            if nparams != 1:
+                raise TypeError('array_input requires a function of one parameter')
+            return wrt, (), x.shape
+        if nparams == 1:  # function has only one parameter
+            if x.size == 1:  # scalar input
+                return wrt, (), ()
+            if len(x.shape) > 1:
+                raise TypeError('input dimension size not supported')
+            return wrt, (len(x),), ()  # vector input
+        # multiple input parameters (vector input)
+        if x.size == 1:
+            raise TypeError('input has insufficient parameters')
+        if x.shape[-1] != nparams:
+            raise TypeError('input dimension size mismatch')
+        if len(x.shape) == 1:  # evaluate at one vector point
+            return wrt, (), (len(wrt),)
+        return wrt, (x.shape[0],), (len(wrt),)  # evaluate at multiple vector points
+
+    def _forwardpass1f(self, ws, x, fi, wrt, batch, value, der):  # deal with only one function case
         """Constructor the tree structure with input X for one single AD method
         fi. This _forwardpass1f method will be called when dealing with vector function
         input fn = [f1, f2, f3, ...]
 
         Parameters
         ==========
+        ws: _Workspace of the call
         x: array_like
         fi: One AD method
+        wrt: list of int, positions of the parameters to differentiate
+        batch: tuple, () for a single point, (p,) for p points, see _layout
+        value: np.ndarray of shape batch, written with the value of fi(x)
+        der: np.ndarray of shape batch + (inputs), written with the derivative of fi(x)
 
         Returns:
-        tmpval: array_like, the value of fi(x)
-        tmpder : array_like, the derivative of fi(x)
+        No returns.
 
         """
 # shoule only be called from forwardpass
-        self._roots = None
-        nparams = len(signature(fi).parameters)  # number of parameters of input function
-        if nparams == 1:  # function has only one parameter
-            if x.size == 1:  # scalar input
-                self._roots = Rnode(x)
-                f = fi(self._roots)
-                f.grad_value = 1.0
-                tmpval = f.value
-                tmpder = self._roots.grad()
-            else:  # vector input
-                if len(x.shape) > 1:
-                    raise TypeError('input dimension size not supported')
-                else:
-                    tmpval = np.zeros(len(x))
-                    tmpder = np.zeros(len(x))
-                    tmpidx = 0
-                    for xi in x:
-                        self._roots = Rnode(xi)
-                        f = fi(self._roots)
-                        f.grad_value = 1.0
-                        tmpval[tmpidx] = f.value
-                        tmpder[tmpidx] = self._roots.grad()
-                        tmpidx = tmpidx + 1
-
-        else:  # multiple input parameters (vector input)
-            if x.size == 1:
-                raise TypeError('input has insufficient parameters')
-            if len(x.shape) == 1:  # evaluate at one vector point
-                if len(x) != nparams:
-                    raise TypeError('input dimension size mismatch')
-                self._roots = [Rnode(xi) for xi in x]
-                f = fi(*self._roots)
-                f.grad_value = 1.0
-                tmpval = f.value
-                tmpder = [root.grad() for root in self._roots]
-            else:  # evaluate at multiple vector points
-                if x.shape[1] != nparams:
-                    raise TypeError('input dimension size mismatch')
-                nm = x.shape[0]  # number of vector points to be evaluated
-                tmpval = np.zeros(nm)
-                tmpder = np.zeros((nm, nparams))
-                self._roots = []
-                for im in range(nm):
-                    self._roots.append([Rnode(xi) for xi in x[im, :]])
-                    f = fi(*self._roots[im])
-                    f.grad_value = 1.0
-                    tmpval[im] = f.value
-                    tmpder[im, :] = [root.grad() for root in self._roots[im]]
-        return tmpval, tmpder
+        if self.array_input:
+            points = [[x]]
+        elif batch:
+            points = x.reshape(batch + (-1,))
+        else:
+            points = [x.reshape(-1)]
+        ws.roots = []
+        for b, point in zip(np.ndindex(*batch), points):
+            roots, f = self._trace(ws, fi, point)
+            ws.roots.append(roots)
+            if self.array_input and np.ndim(f.value) != 0:
+                raise TypeError('reverse mode requires a scalar function output')
+            value[b] = f.value
+            grads = self._gradient(ws, f, [roots[i] for i in wrt])
+            der[b] = grads if der.ndim > value.ndim and not self.array_input else grads[0]
+        if not batch:
+            ws.roots = ws.roots[0]
+
+    def _trace(self, ws, fi, point):
+        """Build the graph of fi at point, or re-evaluate the matching recorded
+        graph when called from update().
+
+        Parameters
+        ==========
+        ws: _Workspace of the call
+        fi: One AD method
+        point: array_like, one value per parameter of fi
+
+        Returns:
+        roots: list of Rnode, the input nodes
+        f: Rnode, the output node
+
+        """
+        if ws.replay is not None:
+            roots, f, tape = next(ws.replay)
+            reevaluate(f, roots, point, tape)
+            return roots, f
+        roots = [Rnode(xi) for xi in point]
+        if not self.replay:
+            return roots, fi(*roots)
+        with record() as tape:  # operations replayed by update(), see farad.rnode.record
+            f = fi(*roots)
+        ws.graphs.append((roots, f, tape))
+        return roots, f
+
+    def _gradient(self, ws, f, roots):
+        """Derivatives of output node f with respect to roots, see farad.rnode.gradient.
+        With replay, the traversal of each graph is kept, since update() does not
+        change its structure.
+
+        Parameters
+        ==========
+        ws: _Workspace of the call, whose traversals are kept
+        f: Rnode, the output node
+        roots: list of Rnode, the input nodes to differentiate with respect to
+
+        Returns:
+        grads: list of the derivatives of f
+
+        """
+        if self.vectorized or not self.replay:  # graphs not kept, their ids may be reused
+            return gradient(f, roots, self.vectorized)
+        try:
+            subgraph = ws.subgraphs[id(f)]
+        except KeyError:
+            subgraph = ws.subgraphs[id(f)] = _subgraph(f, roots)
+        return _sweep(f, roots, *subgraph)
+
+    def update(self, x, out=None):
+        """Re-evaluate the graphs recorded by the last forwardpass at new input X.
+        Update the value and derivative of the AD method.
+
+        Parameters
+        ==========
+        x: array_like, with the same shape as the input of the last forwardpass
+        out: optional pair of np.ndarray, output buffers, see forwardpass
+
+        Returns:
+        No returns.
+
+        Notes
+        =====
+        Only the nodes depending on inputs that changed since the last call are
+        recomputed, which pays off when consecutive inputs differ in a few
+        coordinates, e.g. in coordinate descent or MCMC. The graphs are only
+        recorded by an RAutoDiff constructed with replay=True, and are only valid if
+        fn does not branch on the value of its inputs.
+
+        Examples
+        ========
+        >>> example = RAutoDiff(lambda x, y, z: x * y + z ** 2, replay=True)
+        >>> example.forwardpass([2.0, 3.0, 4.0])
+        >>> example.update([2.0, 5.0, 4.0])
+        >>> print(example.values())
+        26.0
+        >>> example.reverse()
+        array([5., 2., 8.])
+        """
+        if not self.replay:
+            raise RuntimeError('update needs an RAutoDiff constructed with replay=True')
+        last = getattr(self._local, 'workspace', None)
+        if last is None or not last.graphs:
+            raise RuntimeError('forwardpass needs to be called before update')
+        if np.shape(x) != last.shape:
+            raise TypeError('input dimension size mismatch with the last forwardpass')
+        x = np.asarray(x, dtype=float) if self.array_input else np.asarray(x)
+        ws = _Workspace(last.shape, last.wrt, last.graphs, last.subgraphs)
+        self._local.workspace = self._evaluate(x, ws, out)
+
+    def value_and_grad(self, x, wrt=None, out=None):
+        """Values and derivatives of fn at input X, from a single forward and
+        reverse pass, see forwardpass.
+
+        Returns:
+        (values, derivatives): the results of values() and reverse(), which keep
+        returning them without any evaluation. value_and_jacobian is an alias, for
+        vector functions.
+
+        Examples
+        ========
+        >>> example = RAutoDiff(lambda x, y: x * y ** 2)
+        >>> example.value_and_grad([3.0, 2.0])
+        (array(12.), array([ 4., 12.]))
+        """
+        x = np.asarray(x, dtype=float) if self.array_input else np.asarray(x)
+        ws = self._local.workspace = self._evaluate(x, _Workspace(x.shape, wrt), out)
+        return ws.value, ws.der
+
+    value_and_jacobian = value_and_grad
 
     def values(self):  # return the value of the function
         """Get value of the input method fn for given X
 
         Returns:
-        y : array_like
+        y : array_like, the value computed by the last forwardpass or update of the
+        calling thread, None before the first one
 
         """
-        return self._value
+        return getattr(self._local, 'workspace', _Workspace(None, None)).value
 
     def reverse(self):  # return the derivative with respect to varname variable
         """Get the derivatives (scalar, vector, or matrix depending on the
         the dimension of input method fn and X)
 
         Returns:
-        y : array_like
+        y : array_like, the derivatives computed by the last forwardpass or update of
+        the calling thread, None before the first one
+
+        """
+        return getattr(self._local, 'workspace', _Workspace(None, None)).der
 
+    def ireverse(self, iterable, wrt=None, batch_size=64):
+        """Reverse mode over a stream of points, see AutoDiff.iforward.
+
+        Parameters
+        ==========
+        iterable: an iterable of points, each a valid single-point input of forwardpass,
+            consumed lazily batch_size points at a time.
+        wrt: optional list of int, see forwardpass.
+        batch_size: positive int, number of points evaluated together.
+
+        Returns:
+        iterator of the derivatives at each point in turn, as reverse() returns them
+        after a forwardpass at a single point
+
+        Examples
+        ========
+        >>> example = RAutoDiff(lambda x: x ** 2)
+        >>> list(example.ireverse(range(3), batch_size=2))
+        [array(0.), array(2.), array(4.)]
         """
-        return self._der
+        batches = _batches(iterable, batch_size)
+        if self.array_input:  # one call per point
+            return (self.value_and_grad(point, wrt)[1] for batch in batches for point in batch)
+        return (der for batch in batches for der in _rows(self._batch_ders(batch, wrt)))
+
+    def _batch_ders(self, batch, wrt):
+        """Derivatives at a list of points, along a leading point axis."""
+        x = np.asarray(batch)
+        ders = self.value_and_grad(x, wrt)[1]
+        if x.ndim == 1 and x.size == 1:  # a single scalar point has no point axis
+            return ders[None]
+        return ders
+
+
+def _batches(iterable, size):
+    """Iterator of the lists of the next size items of iterable, see AutoDiff.iforward."""
+    if not isinstance(size, (int, np.integer)) or size < 1:
+        raise ValueError('batch_size must be a positive integer')
+    iterator = iter(iterable)
+    return iter(lambda: list(islice(iterator, size)), [])
+
+
+def _rows(array):
+    """Iterator of the views array[i, ...] along the first axis, 0-d arrays included."""
+    return (array[i, ...] for i in range(len(array)))
+
+
+def grad(fn):
+    """Return a function computing the gradient of the scalar function fn via
+    reverse mode.
+
+    Parameters
+    ==========
+    fn: The scalar function to differentiate, taking one or more scalar parameters,
+    or array parameters, whose derivatives are then arrays of the same shape.
+
+    Returns:
+    gradfn: function with the parameters of fn, returning the derivative (one
+    parameter) or the list of partial derivatives (several parameters) of fn.
+
+    Notes
+    =====
+    gradfn records its backward sweep: when called on Rnode objects, the derivatives
+    it returns are Rnode objects of the caller's graph, so gradfn can itself be
+    differentiated, e.g. grad(grad(f)) for second derivatives. Each call tags its
+    nodes with a new, larger level, and an inner function closing over a node of an
+    outer level treats it as a constant (see farad.rnode._align), which keeps nested
+    derivatives from being mixed up.
+
+    Examples
+    ========
+    >>> df = grad(lambda x: x ** 3)
+    >>> df(2.0)
+    12.0
+    >>> grad(df)(2.0)
+    12.0
+    >>> grad(lambda x, y: x * y ** 2)(3.0, 2.0)
+    [4.0, 12.0]
+    >>> grad(lambda x: x[0] * x[1])(np.array([3.0, 2.0]))
+    array([2., 3.])
+    """
+    def gradfn(*args):
+        return _value_and_grad(fn, args)[1]
+    return gradfn
+
+
+def value_and_grad(fn):
+    """Return a function computing the value and the gradient of the scalar function
+    fn via reverse mode, from a single evaluation of fn, see grad.
+
+    Examples
+    ========
+    >>> value_and_grad(lambda x, y: x * y ** 2)(3.0, 2.0)
+    (12.0, [4.0, 12.0])
+    """
+    def value_and_gradfn(*args):
+        return _value_and_grad(fn, args)
+    return value_and_gradfn
+
+
+def _value_and_grad(fn, args):
+    """Evaluate fn on the nodes of a new differentiation level and sweep back,
+    see grad.
+
+    Returns:
+    value: the value of fn, an Rnode of the caller's graph when args are nodes
+    grads: the derivative (one parameter) or the list of partial derivatives
+    """
+    tag = next(_levels)
+    roots = [Rnode(arg, tag) for arg in args]
+    f = fn(*roots)
+    if isinstance(f, Rnode) and f.tag == tag:
+        value = f.value
+        grads = gradient(f, roots)
+    else:  # fn does not depend on its parameters
+        value = f
+        grads = [0.0] * len(roots)
+    return value, grads[0] if len(args) == 1 else grads
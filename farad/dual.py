@@ -324,7 +324,8 @@ class Dual:
         Dual(1.0,12.0)
         """
         try:
-            return Dual(self._val**x._val, self._val**x._val*(self._der*(x._val/self._val) + x._der*np.log(self._val)))
+            y = self._val**x._val
+            return Dual(y, y*(self._der*(x._val/self._val) + x._der*np.log(self._val)))
         except AttributeError:
             return Dual(self._val**x, self._val**(x-1) * x * np.asarray(self._der))
 
@@ -357,7 +358,8 @@ class Dual:
         try:
             return Dual(x**self._val, x._val**self._val * np.log(x._val) * self._der)
         except AttributeError:
-            return Dual(x**self._val, x**self._val * np.log(x) * self._der)
+            y = x**self._val
+            return Dual(y, y * np.log(x) * self._der)
 
 
     def __truediv__(self, x: Union["Dual", int, float]) -> "Dual":
@@ -480,6 +482,18 @@ class Dual:
         return Dual(self._val, self._der)
 
 
+    def __abs__(self) -> "Dual":
+        """Overload the built-in abs() to handle Dual class, see farad.elem.abs.
+
+        Examples
+        ========
+        >>> abs(Dual(-1.0,4.0))
+        Dual(1.0,-4.0)
+        """
+        from farad import elem  # elem builds on this module
+        return elem.abs(self)
+
+
     def __eq__(self, x: Union["Dual", int, float]) -> bool:
         """Overload the equality operator (e.g., x==y) to handle Dual class.
 
@@ -714,6 +728,41 @@ class Dual:
             return (self._val >= x)
 
 
+    def __array_ufunc__(self, ufunc, method, *inputs, **kwargs):
+        """Dispatch a NumPy ufunc applied to Dual objects, e.g. np.sin(x).
+
+        Notes
+        =====
+        Without this method NumPy would wrap the dual number into an object array
+        and loop over it in Python. Supported ufuncs are routed to the rules of
+        farad.elem and to the overloaded operators, so a Dual holding arrays is
+        differentiated with whole-array operations. Other ufuncs, and ufunc
+        methods such as reduce, raise TypeError.
+
+        Examples
+        ========
+        >>> np.sin(Dual(0.0, 2.0))
+        Dual(0.0,2.0)
+        >>> np.dot(np.array([1.0, 2.0]), Dual(np.array([3.0, 4.0]), np.array([1.0, 0.0])))
+        Dual(11.0,1.0)
+        """
+        from farad import elem  # elem builds on this module
+        return elem._array_ufunc(ufunc, method, inputs, kwargs)
+
+
+    def __array_function__(self, func, types, args, kwargs):
+        """Dispatch a NumPy function applied to Dual objects, e.g. np.dot(a, x).
+
+        Notes
+        =====
+        Reductions and products listed in farad.elem are evaluated with a
+        vectorized derivative rule, and np.shape and np.ndim describe the value.
+        Any other function raises TypeError.
+        """
+        from farad import elem
+        return elem._array_function(func, types, args, kwargs)
+
+
     def __repr__(self) -> str:
         """Prints class definition with inputs - the output can be passed to eval()
         to instantiate new instance of class Dual.
@@ -782,12 +831,46 @@ class Dual:
         length : int
             integer output corresponding to 'length' of Dual object.
 
+        Notes
+        =====
+        As for NumPy arrays, a Dual with a scalar value has no length and raises
+        TypeError. Together with __getitem__ this makes array-valued Dual objects
+        sequences, while NumPy still treats scalar ones as single elements, e.g.
+        in np.array([Dual(1.0), Dual(2.0)]).
+
         Example
         =======
-        >>> len(Dual(1.0,4.0))
-        1
+        >>> len(Dual(np.array([1.0, 2.0]), 1.0))
+        2
         """
-        try:
-            return len(self._val)
-        except TypeError:
-            return 1
+        return len(self._val)  # TypeError for scalars
+
+    def __getitem__(self, key) -> "Dual":
+        """Index or slice an array-valued Dual object (e.g., x[0], x[1:], x[:, 0]).
+
+        Parameters
+        ==========
+        self : Dual class object
+            Class object of type 'Dual' whose value is an array.
+        key : int, slice, tuple or array
+            Any NumPy index of the value.
+
+        Returns
+        =======
+        Dual : Dual class object
+            The selected elements, with the matching elements of the derivative of
+            every seed direction.
+
+        Example
+        =======
+        >>> x = Dual(np.array([1.0, 2.0, 3.0]), np.eye(3))
+        >>> x[1:]
+        Dual(array([2., 3.]),[array([0., 0.]), array([1., 0.]), array([0., 1.])])
+        """
+        val = self._val[key]  # TypeError for scalars, IndexError past the end
+        der = np.asarray(self._der)
+        shape = np.shape(self._val)
+        if der.ndim < len(shape):
+            der = np.broadcast_to(der, shape)
+        lead = (slice(None),) * (der.ndim - len(shape))  # leading seed axes are kept
+        return Dual(val, der[lead + (key if isinstance(key, tuple) else (key,))])
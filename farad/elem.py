@@ -2,15 +2,238 @@
 
 __all__ = ['sin', 'cos', 'tan', 'log', 'log10', 'sinh', 'cosh', 'tanh', \
            'log2', 'exp', 'sqrt', 'arccos', 'arcsin', 'arctan', \
-           'relu', 'logistic', 'relu6']
+           'relu', 'logistic', 'relu6', 'softplus', 'log1p', 'expm1', \
+           'log_logistic', 'xlogy', 'abs', 'maximum', 'minimum', 'clip', 'where', \
+           'primitive', 'Primitive']
 
 
 from farad.dual import Dual
-from farad.rnode import Rnode
+from farad.rnode import Rnode, _record
+import builtins
 import numpy as np
+import operator
+from functools import partial, wraps
 from typing import Union, List
 
 
+def _rnode_rule(primitive, value, deriv, domain, x: Rnode) -> Rnode:
+    """Apply an elementwise primitive to an Rnode, recording the derivative as edge weight."""
+    v = x.value
+    if domain is not None and not np.all(domain[0](v)):
+        raise ValueError(domain[1])
+    y = value(v)
+    z = Rnode(y, x.tag)
+    x.children.append((deriv(v, y), z))
+    _record(z, primitive, (x,))
+    return z
+
+
+def _dual_rule(primitive, value, deriv, domain, x: Dual) -> Dual:
+    """Apply an elementwise primitive to a Dual, by the chain rule on its derivative."""
+    v = x._val
+    if domain is not None and not np.all(domain[0](v)):
+        raise ValueError(domain[1])
+    y = value(v)
+    return Dual(y, deriv(v, y) * np.asarray(x._der))
+
+
+# Rules applying a primitive to a differentiable argument, keyed by the argument type.
+# Other types (floats, NumPy arrays, ...) are entered as None the first time they are
+# seen, and go straight to the value rule.
+_RULES = {Rnode: _rnode_rule, Dual: _dual_rule}
+
+
+def _rule(cls: type):
+    """Look up and cache the rule for an argument type, following its base classes."""
+    rule = next((_RULES[base] for base in cls.__mro__ if base in _RULES), None)
+    _RULES[cls] = rule
+    return rule
+
+
+def _elementwise(deriv, domain=None):
+    """Decorator making an elementwise function of plain values a farad primitive.
+
+    Parameters:
+    deriv : callable. Derivative rule, f'(x) as deriv(x, y) for a plain value x and
+        y = f(x), the output already computed by the value rule.
+    domain : (callable, str), optional. Predicate on the values x of Rnode and Dual
+        arguments, and the message of the ValueError raised where it does not hold.
+
+    Returns:
+    decorator : callable. Wraps the value rule f(x), which then accepts array_like,
+        Rnode and Dual arguments.
+
+    Notes:
+    The argument type selects the rule from _RULES with a single dict lookup, so plain
+    floats and arrays pay no more than a function call over the NumPy function.
+    Derivative rules should be written in terms of y where possible (e.g. exp' = y,
+    tanh' = 1 - y**2), so that each transcendental function is evaluated once.
+    """
+    def decorate(value):
+        @wraps(value)
+        def primitive(x):
+            try:
+                rule = _RULES[x.__class__]
+            except KeyError:
+                rule = _rule(x.__class__)
+            if rule is None:
+                return value(x)
+            return rule(primitive, value, deriv, domain, x)
+        return primitive
+    return decorate
+
+
+class Primitive:
+    """Function with user-supplied derivative rules, see primitive()."""
+
+    def __init__(self, fn):
+        """Constructor for Primitive class.
+
+        Parameters
+        ==========
+        fn : callable
+            Value function, called with the values (not Dual or Rnode objects) of
+            its positional arguments.
+
+        Returns
+        =======
+        self : Primitive class object
+            Callable accepting array_like, Dual and Rnode arguments, without
+            derivative rules until defjvp and defvjp are called.
+        """
+        wraps(fn)(self)
+        self.fn = fn
+        self.jvps = ()
+        self.vjps = ()
+
+    def defjvp(self, *rules) -> "Primitive":
+        """Register the forward-mode (JVP) rules, one per positional argument.
+
+        Parameters
+        ==========
+        rules : callable or None
+            rules[i](t, ans, *args) returns the tangent of the output due to a
+            tangent t of argument i, where ans is the output value and args are the
+            argument values; keyword arguments of the call are passed on. t has the
+            shape of argument i, preceded by an axis over the seed directions if
+            there are several. None marks an argument that is not differentiable.
+
+        Returns
+        =======
+        self : Primitive class object
+        """
+        self.jvps = rules
+        return self
+
+    def defvjp(self, *rules) -> "Primitive":
+        """Register the reverse-mode (VJP) rules, one per positional argument.
+
+        Parameters
+        ==========
+        rules : callable or None
+            rules[i](g, ans, *args) returns the adjoint of argument i given the
+            adjoint g of the output, where ans is the output value and args are the
+            argument values; keyword arguments of the call are passed on. None marks
+            an argument that is not differentiable.
+
+        Returns
+        =======
+        self : Primitive class object
+        """
+        self.vjps = rules
+        return self
+
+    def _rule(self, rules, i: int, mode: str):
+        """Return rules[i], raising NotImplementedError if the rule is missing."""
+        try:
+            rule = rules[i]
+        except IndexError:
+            rule = None
+        if rule is None:
+            raise NotImplementedError(f'no {mode} rule registered for argument {i} of {self.__name__}')
+        return rule
+
+    def __call__(self, *args, **kwargs):
+        if any(isinstance(arg, Rnode) for arg in args):
+            return self._reverse(args, kwargs)
+        if any(isinstance(arg, Dual) for arg in args):
+            return self._forward(args, kwargs)
+        return self.fn(*args, **kwargs)
+
+    def _forward(self, args, kwargs) -> Dual:
+        """Evaluate on Dual arguments, summing the JVPs of the Dual arguments."""
+        values = [arg._val if isinstance(arg, Dual) else arg for arg in args]
+        ans = self.fn(*values, **kwargs)
+        der = 0
+        for i, arg in enumerate(args):
+            if isinstance(arg, Dual):
+                der = der + self._rule(self.jvps, i, 'JVP')(_tangent(arg)[0], ans, *values, **kwargs)
+        return Dual(ans, der)
+
+    def _reverse(self, args, kwargs) -> Rnode:
+        """Evaluate on Rnode arguments, recording one edge per Rnode argument with its
+        VJP as weight."""
+        tag = builtins.max(arg.tag for arg in args if isinstance(arg, Rnode))
+        # nodes of an outer graph are constants of the inner one, as in rnode._align
+        args = [Rnode(arg, tag) if isinstance(arg, Rnode) and arg.tag < tag else arg for arg in args]
+        values = [arg.value if isinstance(arg, Rnode) else arg for arg in args]
+        ans = self.fn(*values, **kwargs)
+        z = Rnode(ans, tag)
+        for i, arg in enumerate(args):
+            if isinstance(arg, Rnode):
+                vjp = self._rule(self.vjps, i, 'VJP')
+                arg.children.append((lambda g, vjp=vjp: vjp(g, ans, *values, **kwargs), z))
+        _record(z, partial(self, **kwargs) if kwargs else self, tuple(args))
+        return z
+
+
+def primitive(fn) -> Primitive:
+    """Decorator registering a function as a farad primitive with custom derivative rules.
+
+    Parameters
+    ==========
+    fn : callable
+        Value function of one or more positional arguments. Keyword arguments, if
+        any, are options that are not differentiated.
+
+    Returns
+    =======
+    f : Primitive class object
+        Calls fn on plain values; on Dual or Rnode arguments, evaluates fn on their
+        values and applies the rules registered with f.defjvp and f.defvjp instead
+        of differentiating through fn. Both drivers, farad.driver.grad and the NumPy
+        dispatch of Dual and Rnode use the rules automatically.
+
+    Notes
+    =====
+    Useful when fn is costly, or not written with farad operations, but has a
+    cheap analytic derivative, e.g. a linear solve or a table interpolation. Only
+    the modes in use need a rule; a missing rule raises NotImplementedError when
+    it is needed.
+
+    Example
+    =======
+    >>> @primitive
+    ... def cube(x):
+    ...     return x ** 3
+    >>> cube = cube.defjvp(lambda t, ans, x: 3 * x ** 2 * t).defvjp(lambda g, ans, x: 3 * x ** 2 * g)
+    >>> cube(Dual(2.0, 1.0))
+    Dual(8.0,12.0)
+    >>> x = Rnode(2.0)
+    >>> f = cube(x) + x
+    >>> f.grad_value = 1.0
+    >>> x.grad()
+    13.0
+    """
+    return Primitive(fn)
+
+
+_LN2, _LN10 = np.log(2), np.log(10)
+_LOG_DOMAIN = (lambda x: x > 0, 'Domain of logarithm is {x > 0}')
+_SQRT_DOMAIN = (lambda x: 1 - x ** 2 > 0, 'Domain of sqrt is {x >= 0}')
+
+
+@_elementwise(lambda x, y: np.cos(x))
 def sin(x: Union[Rnode, Dual, float]) -> Union[Rnode, Dual, float, List[float]]:
     """Calculate sine of the input in radians.
 
@@ -20,17 +243,10 @@ def sin(x: Union[Rnode, Dual, float]) -> Union[Rnode, Dual, float, List[float]]:
     Returns:
     y : array_like, Rnode object, or Dual Object. The sine of each element of x.
     """
-    try:
-        z = Rnode(np.sin(x.value))
-        x.children.append((np.cos(x.value), z))
-        return z
-    except AttributeError:
-        try:  # Python EAFP principle - assume input is type Dual
-            return Dual(np.sin(x._val), np.cos(x._val)*np.asarray(x._der))
-        except AttributeError:
-            return np.sin(x)  # Default to numpy implementation
+    return np.sin(x)
 
 
+@_elementwise(lambda x, y: -np.sin(x))
 def cos(x: Union[Rnode, Dual, float]) -> Union[Rnode, Dual, float, List[float]]:
     """Calculate cosine of the input in radians.
 
@@ -40,17 +256,10 @@ def cos(x: Union[Rnode, Dual, float]) -> Union[Rnode, Dual, float, List[float]]:
     Returns:
     y : array_like, Rnode object, or Dual Object. The cosine of each element of x.
     """
-    try:
-        z = Rnode(np.cos(x.value))
-        x.children.append((-np.sin(x.value), z))
-        return z
-    except AttributeError:
-        try:
-            return Dual(np.cos(x._val), -np.sin(x._val)*np.asarray(x._der))
-        except AttributeError:
-            return np.cos(x)  # Default to numpy implementation
+    return np.cos(x)
 
 
+@_elementwise(lambda x, y: 1 + y ** 2)
 def tan(x: Union[Rnode, Dual, float]) -> Union[Rnode, Dual, float, List[float]]:
     """Calculate tangent of the input in radians.
 
@@ -60,18 +269,10 @@ def tan(x: Union[Rnode, Dual, float]) -> Union[Rnode, Dual, float, List[float]]:
     Returns:
     y : array_like, Rnode object, or Dual Object. The tangent of each element of x.
     """
-
-    try:
-        z = Rnode(np.tan(x.value))
-        x.children.append((1 / (np.cos(x.value) ** 2), z))
-        return z
-    except AttributeError:
-        try:
-            return Dual(np.tan(x._val), 1/np.cos(x._val)**2*np.asarray(x._der))
-        except AttributeError:
-            return np.tan(x)  # Default to numpy implementation
+    return np.tan(x)
 
 
+@_elementwise(lambda x, y: 1 / x, _LOG_DOMAIN)
 def log(x: Union[Rnode, Dual, float]) -> Union[Rnode, Dual, float, List[float]]:
     """Calculate natural logarithm of input.
 
@@ -81,19 +282,10 @@ def log(x: Union[Rnode, Dual, float]) -> Union[Rnode, Dual, float, List[float]]:
     Returns:
     y : array_like, Rnode object, or Dual Object. The natural logarithm of each element of x.
     """
-    try:
-        z = Rnode(np.log(x.value))
-        x.children.append(((1/x.value), z))
-        return z
-    except AttributeError:
-        try:
-            if x._val <= 0:
-                raise ValueError('Domain of logarithm is {x > 0}')
-            return Dual(np.log(x._val), (1/x._val)*np.asarray(x._der))
-        except AttributeError:
-            return np.log(x)  # Default to numpy implementation
+    return np.log(x)
 
 
+@_elementwise(lambda x, y: 1 / (x * _LN10), _LOG_DOMAIN)
 def log10(x: Union[Rnode, Dual, float]) -> Union[Rnode, Dual, float, List[float]]:
     """Calculates the base-10 logarithm of input.
 
@@ -103,20 +295,10 @@ def log10(x: Union[Rnode, Dual, float]) -> Union[Rnode, Dual, float, List[float]
     Returns:
     y : array_like, Rnode object, or Dual Object. The base-10 logarithm of each element of x.
     """
-
-    try:
-        z = Rnode(np.log10(x.value))
-        x.children.append((1/(x.value * np.log(10)), z))
-        return z
-    except AttributeError:
-        try:
-            if x._val <= 0:
-                raise ValueError('Domain of logarithm is {x > 0}')
-            return Dual(np.log10(x._val), (1/(x._val*np.log(10)))*np.asarray(x._der))
-        except AttributeError:
-            return np.log10(x)  # Default to numpy implementation
+    return np.log10(x)
 
 
+@_elementwise(lambda x, y: 1 / (x * _LN2), _LOG_DOMAIN)
 def log2(x: Union[Rnode, Dual, float]) -> Union[Rnode, Dual, float, List[float]]:
     """Calculates the base-2 logarithm of input.
 
@@ -126,19 +308,10 @@ def log2(x: Union[Rnode, Dual, float]) -> Union[Rnode, Dual, float, List[float]]
     Returns:
     y : array_like, Rnode object, or Dual Object. The base-2 logarithm of each element of x.
     """
-    try:
-        z = Rnode(np.log2(x.value))
-        x.children.append((1/(x.value * np.log(2)), z))
-        return z
-    except AttributeError:
-        try:
-            if x._val <= 0:
-                raise ValueError('Domain of logarithm is {x > 0}')
-            return Dual(np.log2(x._val), (1/(x._val*np.log(2)))*np.asarray(x._der))
-        except AttributeError:
-            return np.log2(x)  # Default to numpy implementation
+    return np.log2(x)
 
 
+@_elementwise(lambda x, y: np.cosh(x))
 def sinh(x: Union[Rnode, Dual, float]) -> Union[Rnode, Dual, float, List[float]]:
     """Calculates the hyberbolic sine of input.
 
@@ -148,17 +321,10 @@ def sinh(x: Union[Rnode, Dual, float]) -> Union[Rnode, Dual, float, List[float]]
     Returns:
     y : array_like, Rnode object, or Dual Object. The hyperbolic sine of each element of x.
     """
-    try:
-        z = Rnode(np.sinh(x.value))
-        x.children.append((np.cosh(x.value), z))
-        return z
-    except AttributeError:
-        try:
-            return Dual(np.sinh(x.val), np.cosh(x.val) * np.asarray(x.der))
-        except AttributeError:
-            return np.sinh(x)  # default to numpy implementation
+    return np.sinh(x)
 
 
+@_elementwise(lambda x, y: np.sinh(x))
 def cosh(x: Union[Rnode, Dual, float]) -> Union[Rnode, Dual, float, List[float]]:
     """Calculates the hyberbolic cosine of input.
 
@@ -168,17 +334,10 @@ def cosh(x: Union[Rnode, Dual, float]) -> Union[Rnode, Dual, float, List[float]]
     Returns:
     y : array_like, Rnode object, or Dual Object. The hyperbolic cosine of each element of x.
     """
-    try:
-        z = Rnode(np.cosh(x.value))
-        x.children.append((np.sinh(x.value), z))
-        return z
-    except AttributeError:
-        try:
-            return Dual(np.cosh(x.val), np.sinh(x.val) * np.asarray(x.der))
-        except AttributeError:
-            return np.cosh(x)  # default to numpy implementation
+    return np.cosh(x)
 
 
+@_elementwise(lambda x, y: 1 - y ** 2)
 def tanh(x: Union[Rnode, Dual, float]) -> Union[Rnode, Dual, float, List[float]]:
     """Calculates the hyberbolic tangent of input.
 
@@ -188,17 +347,10 @@ def tanh(x: Union[Rnode, Dual, float]) -> Union[Rnode, Dual, float, List[float]]
     Returns:
     y : array_like, Rnode object, or Dual Object. The hyperbolic tangent of each element of x.
     """
-    try:
-        z = Rnode(np.tanh(x.value))
-        x.children.append((1 / np.cosh(x.value)**2, z))
-        return z
-    except AttributeError:
-        try:
-            return Dual(np.tanh(x.val), x.der / np.cosh(x.val)**2)
-        except AttributeError:
-            return np.tanh(x)  # default to numpy implementation
+    return np.tanh(x)
 
 
+@_elementwise(lambda x, y: np.where(x > 0, 1, 0))
 def relu(x: Union[Rnode, Dual, float]) -> Union[Rnode, Dual, float, List[float]]:
     """Calculates the output of the relu function on the input.
 
@@ -208,22 +360,10 @@ def relu(x: Union[Rnode, Dual, float]) -> Union[Rnode, Dual, float, List[float]]
     Returns:
     y : array_like, Rnode object, or Dual Object. The output  of the relu function on each element of x.
     """
-    try:
-
-        a = max(0, x.value)
-        b = np.where(a > 0, 1, 0)
-        z = Rnode(a)
-        x.children.append((b, z))
-        return z
-    except AttributeError:
-        try:
-            a = max(0, x.val)
-            b = np.where(a > 0, 1, 0)
-            return Dual(a, b * x.der)
-        except AttributeError:
-            return max(0, x)
+    return np.maximum(x, 0)
 
 
+@_elementwise(lambda x, y: np.where((0.0 < x) & (x < 6.0), 1, 0))
 def relu6(x: Union[Rnode, Dual, float]) -> Union[Rnode, Dual, float, List[float]]:
     """Calculates the output of the relu6 function on the input.
 
@@ -233,26 +373,10 @@ def relu6(x: Union[Rnode, Dual, float]) -> Union[Rnode, Dual, float, List[float]
     Returns:
     y : array_like, Rnode object, or Dual Object. The output  of the relu6 function on each element of x.
     """
-    try:
-
-        a = float(max(0, x.value))
-        b = np.where(0.0 < a < 6.0, 1, 0)
-        if a > 6.0:  # clip output to a maximum of 6
-            a = 6.0
-        z = Rnode(a)
-        x.children.append((b, z))
-        return z
-    except AttributeError:
-        try:
-            a = float(max(0, x.val))
-            b = np.where(0.0 < a < 6.0, 1, 0)
-            if a > 6.0:  # clip output to a maximum of 6
-                a = 6.0
-            return Dual(a, b * x.der)
-        except AttributeError:
-            return min(max(0, x), 6)
+    return np.clip(x, 0, 6)  # clip output to a maximum of 6
 
 
+@_elementwise(lambda x, y: y * (1 - y))
 def logistic(x: Union[Rnode, Dual, float]) -> Union[Rnode, Dual, float, List[float]]:
     """Calculates the output of the logistic function given the input.
 
@@ -262,19 +386,11 @@ def logistic(x: Union[Rnode, Dual, float]) -> Union[Rnode, Dual, float, List[flo
     Returns:
     y : array_like, Rnode object, or Dual Object. The output  of the logistic function on each element of x.
     """
-    try:
-        z = Rnode(1 / (1 + np.exp(-x.value)))
-        nominator = np.exp(x.value)
-        denominator = (1 + np.exp(x.value)) ** 2
-        x.children.append((nominator / denominator, z))
-        return z
-    except AttributeError:
-        try:
-            return(1 / (1 + np.exp(-x.val)), np.exp(x.val) / ((1 + np.exp(x.val)) ** 2))
-        except AttributeError:
-            return 1 / (1 + np.exp(-x))
+    e = np.exp(-np.abs(x))  # exp of a non-positive number cannot overflow
+    return (np.where(np.greater_equal(x, 0), 1, e) / (1 + e))[()]
 
 
+@_elementwise(lambda x, y: y)
 def exp(x: Union[Rnode, Dual, float]) -> Union[Rnode, Dual, float, List[float]]:
     """Calculates the exponent of input.
 
@@ -284,15 +400,7 @@ def exp(x: Union[Rnode, Dual, float]) -> Union[Rnode, Dual, float, List[float]]:
     Returns:
     y : array_like, Rnode object, or Dual Object. The exponent of each element of x.
     """
-    try:
-        z = Rnode(np.exp(x.value))
-        x.children.append((np.exp(x.value), z))
-        return z
-    except AttributeError:
-        try:
-            return Dual(np.exp(x.val), np.exp(x.val) * np.asarray(x.der))
-        except AttributeError:
-            return np.exp(x)  # Default to numpy implementation
+    return np.exp(x)
 
 
 # todo: figure out implementation for exp2
@@ -313,6 +421,7 @@ def exp(x: Union[Rnode, Dual, float]) -> Union[Rnode, Dual, float, List[float]]:
 #         return np.exp2(x)
 
 
+@_elementwise(lambda x, y: 0.5 / y)
 def sqrt(x: Union[Rnode, Dual, float]) -> Union[Rnode, Dual, float, List[float]]:
     """Calculates the square root of input.
 
@@ -322,14 +431,7 @@ def sqrt(x: Union[Rnode, Dual, float]) -> Union[Rnode, Dual, float, List[float]]
     Returns:
     y : array_like, Rnode object, or Dual Object. The square root of each element of x.
     """
-    try:
-        z = Rnode(x.value ** 0.5)
-        # ?
-        x.children.append((0.5*x.value ** (-0.5), z))
-        return z
-    except AttributeError:
-
-        return x.__pow__(0.5)
+    return np.sqrt(x)
 
 
 
@@ -346,6 +448,7 @@ def power(x: Union[Rnode, Dual, float], power: float) -> Union[Rnode, Dual, floa
     return x.__pow__(power)
 
 
+@_elementwise(lambda x, y: 1 / np.sqrt(1 - x ** 2), _SQRT_DOMAIN)
 def arcsin(x: Union[Rnode, Dual, float]) -> Union[Rnode, Dual, float, List[float]]:
     """Calculates the inverse sine of the input.
 
@@ -355,21 +458,10 @@ def arcsin(x: Union[Rnode, Dual, float]) -> Union[Rnode, Dual, float, List[float
     Returns:
     y : array_like, Rnode object, or Dual Object. The inverse sine of each element of x.
     """
-    try:
-        z = Rnode(np.arcsin(x.value))
-        temp = 1 - x.value ** 2
-        # print("temp is " + str(temp))
-        if temp <= 0:
-            raise ValueError('Domain of sqrt is {x >= 0}')
-        x.children.append((1 / np.sqrt(temp), z))
-        return z
-    except AttributeError:
-        try:
-            return Dual(np.arcsin(x.val), 1 / np.sqrt(1 - x.val ** 2) * np.asarray(x.der))
-        except AttributeError:
-            return np.arcsin(x)
+    return np.arcsin(x)
 
 
+@_elementwise(lambda x, y: -1 / np.sqrt(1 - x ** 2), _SQRT_DOMAIN)
 def arccos(x: Union[Rnode, Dual, float]) -> Union[Rnode, Dual, float, List[float]]:
     """Calculates the inverse cosine of the input.
 
@@ -379,22 +471,10 @@ def arccos(x: Union[Rnode, Dual, float]) -> Union[Rnode, Dual, float, List[float
     Returns:
     y : array_like, Rnode object, or Dual Object. The inverse cosine of each element of x.
     """
-    try:
-        z = Rnode(np.arccos(x.value))
-        temp = 1 - x.value ** 2
-        # print("temp is " + str(temp))
-        if temp <= 0:
-            raise ValueError('Domain of sqrt is {x >= 0}')
-
-        x.children.append((-1 / np.sqrt(temp), z))
-        return z
-    except AttributeError:
-        try:
-            return Dual(np.arccos(x.val), -1 / np.sqrt(1 - x.val**2) * np.asarray(x.der))
-        except AttributeError:
-            return np.arccos(x)
+    return np.arccos(x)
 
 
+@_elementwise(lambda x, y: 1 / (1 + x ** 2))
 def arctan(x: Union[Rnode, Dual, float]) -> Union[Rnode, Dual, float, List[float]]:
     """Calculates the inverse tangent of the input.
 
@@ -404,15 +484,282 @@ def arctan(x: Union[Rnode, Dual, float]) -> Union[Rnode, Dual, float, List[float
     Returns:
     y : array_like, Rnode object, or Dual Object. The inverse tangent of each element of x.
     """
+    return np.arctan(x)
+
+
+@_elementwise(lambda x, y: -np.expm1(-y))
+def softplus(x: Union[Rnode, Dual, float]) -> Union[Rnode, Dual, float, List[float]]:
+    """Calculates the softplus function log(1 + exp(x)) of input, without overflow.
+
+    Parameters:
+    x : array_like, Rnode object, or Dual Object.
+
+    Returns:
+    y : array_like, Rnode object, or Dual Object. The softplus of each element of x. Its
+    derivative, the logistic function, is computed from y as 1 - exp(-y).
+    """
+    return np.logaddexp(0, x)
+
+
+@_elementwise(lambda x, y: -np.expm1(y))
+def log_logistic(x: Union[Rnode, Dual, float]) -> Union[Rnode, Dual, float, List[float]]:
+    """Calculates the logarithm of the logistic function, -log(1 + exp(-x)), without overflow.
+
+    Parameters:
+    x : array_like, Rnode object, or Dual Object.
+
+    Returns:
+    y : array_like, Rnode object, or Dual Object. The log-sigmoid of each element of x. Its
+    derivative, logistic(-x), is computed from y as 1 - exp(y).
+    """
+    return -np.logaddexp(0, -x)
+
+
+@_elementwise(lambda x, y: 1 / (1 + x), (lambda x: x > -1, 'Domain of log1p is {x > -1}'))
+def log1p(x: Union[Rnode, Dual, float]) -> Union[Rnode, Dual, float, List[float]]:
+    """Calculates log(1 + x), accurate for x near zero.
+
+    Parameters:
+    x : array_like, Rnode object, or Dual Object.
+
+    Returns:
+    y : array_like, Rnode object, or Dual Object. The natural logarithm of 1 + x for each element of x.
+    """
+    return np.log1p(x)
+
+
+@_elementwise(lambda x, y: y + 1)
+def expm1(x: Union[Rnode, Dual, float]) -> Union[Rnode, Dual, float, List[float]]:
+    """Calculates exp(x) - 1, accurate for x near zero.
+
+    Parameters:
+    x : array_like, Rnode object, or Dual Object.
+
+    Returns:
+    y : array_like, Rnode object, or Dual Object. exp(x) - 1 for each element of x.
+    """
+    return np.expm1(x)
+
+
+@primitive
+def xlogy(x: Union[Rnode, Dual, float], y: Union[Rnode, Dual, float]) -> Union[Rnode, Dual, float, List[float]]:
+    """Calculates x * log(y), taken to be 0 where x == 0.
+
+    Parameters:
+    x : array_like, Rnode object, or Dual Object.
+    y : array_like, Rnode object, or Dual Object.
+
+    Returns:
+    z : array_like, Rnode object, or Dual Object. x * log(y) elementwise, without the nan of
+    0 * log(0), as needed for entropies and likelihoods.
+    """
+    x_is_zero = np.equal(x, 0)
+    return np.where(x_is_zero, 0.0, x * np.log(np.where(x_is_zero, 1.0, y)))[()]
+
+
+def _xlogy_dy(x, y):
+    """Derivative x / y of xlogy in y, 0 where x == 0 like xlogy itself (not nan at y == 0)."""
+    x_is_zero = np.equal(x, 0)
+    return np.where(x_is_zero, 0.0, x / np.where(x_is_zero, 1.0, y))
+
+
+xlogy.defjvp(lambda t, ans, x, y: t * np.log(y), lambda t, ans, x, y: t * _xlogy_dy(x, y))
+xlogy.defvjp(lambda g, ans, x, y: g * np.log(y), lambda g, ans, x, y: g * _xlogy_dy(x, y))
+
+
+# Piecewise primitives use subgradient conventions: at a kink, the derivative is that of
+# the constant piece (relu'(0) = abs'(0) = 0, clip passes derivatives strictly inside its
+# bounds), except for maximum and minimum, which split the derivative evenly between tied
+# arguments.
+
+
+@_elementwise(lambda x, y: np.sign(x))
+def abs(x: Union[Rnode, Dual, float]) -> Union[Rnode, Dual, float, List[float]]:
+    """Calculates the absolute value of input.
+
+    Parameters:
+    x : array_like, Rnode object, or Dual Object.
+
+    Returns:
+    y : array_like, Rnode object, or Dual Object. The absolute value of each element of x.
+    """
+    return np.abs(x)
+
+
+def _share(a, b):
+    """Fraction of the derivative of maximum(a, b) going to a: 1, 1/2 at ties, else 0."""
+    return np.where(np.greater(a, b), 1.0, np.where(np.equal(a, b), 0.5, 0.0))
+
+
+@primitive
+def maximum(a: Union[Rnode, Dual, float], b: Union[Rnode, Dual, float]) -> Union[Rnode, Dual, float, List[float]]:
+    """Calculates the elementwise maximum of two inputs.
+
+    Parameters:
+    a, b : array_like, Rnode object, or Dual Object.
+
+    Returns:
+    y : array_like, Rnode object, or Dual Object. The larger of a and b for each element.
+    """
+    return np.maximum(a, b)
+
+
+maximum.defjvp(lambda t, ans, a, b: _share(a, b) * t, lambda t, ans, a, b: _share(b, a) * t)
+maximum.defvjp(lambda g, ans, a, b: _share(a, b) * g, lambda g, ans, a, b: _share(b, a) * g)
+
+
+@primitive
+def minimum(a: Union[Rnode, Dual, float], b: Union[Rnode, Dual, float]) -> Union[Rnode, Dual, float, List[float]]:
+    """Calculates the elementwise minimum of two inputs.
+
+    Parameters:
+    a, b : array_like, Rnode object, or Dual Object.
+
+    Returns:
+    y : array_like, Rnode object, or Dual Object. The smaller of a and b for each element.
+    """
+    return np.minimum(a, b)
+
+
+minimum.defjvp(lambda t, ans, a, b: _share(b, a) * t, lambda t, ans, a, b: _share(a, b) * t)
+minimum.defvjp(lambda g, ans, a, b: _share(b, a) * g, lambda g, ans, a, b: _share(a, b) * g)
+
+
+def _inside(x, a_min, a_max):
+    """Mask of the elements of x strictly between the (optional) bounds."""
+    return np.logical_and(True if a_min is None else np.greater(x, a_min),
+                          True if a_max is None else np.less(x, a_max))
+
+
+@primitive
+def clip(x: Union[Rnode, Dual, float], a_min: Union[Rnode, Dual, float, None],
+         a_max: Union[Rnode, Dual, float, None]) -> Union[Rnode, Dual, float, List[float]]:
+    """Clips (limits) the values of input to an interval.
+
+    Parameters:
+    x : array_like, Rnode object, or Dual Object.
+    a_min, a_max : array_like, Rnode object, Dual Object, or None. Bounds of the interval; None
+    leaves that side unbounded.
+
+    Returns:
+    y : array_like, Rnode object, or Dual Object. x, with elements below a_min set to a_min
+    and elements above a_max set to a_max. Derivatives with respect to x pass where x is
+    strictly inside the interval, and to a bound where x reaches or crosses it.
+    """
+    return np.clip(x, a_min, a_max)
+
+
+clip.defjvp(lambda t, ans, x, a_min, a_max: np.where(_inside(x, a_min, a_max), t, 0.0),
+            lambda t, ans, x, a_min, a_max: np.where(np.less_equal(x, a_min), t, 0.0),
+            lambda t, ans, x, a_min, a_max: np.where(np.greater_equal(x, a_max), t, 0.0))
+clip.defvjp(lambda g, ans, x, a_min, a_max: np.where(_inside(x, a_min, a_max), g, 0.0),
+            lambda g, ans, x, a_min, a_max: np.where(np.less_equal(x, a_min), g, 0.0),
+            lambda g, ans, x, a_min, a_max: np.where(np.greater_equal(x, a_max), g, 0.0))
+
+
+@primitive
+def where(condition, a: Union[Rnode, Dual, float], b: Union[Rnode, Dual, float]) -> Union[Rnode, Dual, float, List[float]]:
+    """Chooses elements from two inputs depending on a condition.
+
+    Parameters:
+    condition : array_like of bool, not differentiated.
+    a, b : array_like, Rnode object, or Dual Object.
+
+    Returns:
+    y : array_like, Rnode object, or Dual Object. a where condition is True, b elsewhere; the
+    derivative is taken from the input that is chosen.
+    """
+    return np.where(condition, a, b)
+
+
+where.defjvp(None, lambda t, ans, c, a, b: np.where(c, t, 0.0), lambda t, ans, c, a, b: np.where(c, 0.0, t))
+where.defvjp(None, lambda g, ans, c, a, b: np.where(c, g, 0.0), lambda g, ans, c, a, b: np.where(c, 0.0, g))
+
+
+def _tangent(x: Dual):
+    """Return the derivative of an array-valued Dual and its number of seed axes.
+
+    Parameters:
+    x : Dual Object.
+
+    Returns:
+    der : np.ndarray. Derivative of x, of shape val.shape for a single seed direction
+        or (k,) + val.shape for k directions; a scalar derivative is broadcast.
+    lead : int. Number of leading seed axes of der (0 or 1).
+    """
+    der = np.asarray(x._der)
+    shape = np.shape(x._val)
+    if der.ndim < len(shape):
+        der = np.broadcast_to(der, shape)
+    return der, der.ndim - len(shape)
+
+
+# linalg builds on Primitive and _tangent above
+from farad import linalg
+
+
+# Ufuncs called on Dual or Rnode objects, see Dual.__array_ufunc__ and Rnode.__array_ufunc__.
+# Arithmetic and comparisons are sent to the operator methods of the farad operand, by name
+# and reflected name, rather than through the operator module, which would dispatch back to
+# NumPy when the other operand is a NumPy array or scalar.
+_UFUNCS = {np.sin: sin, np.cos: cos, np.tan: tan, np.log: log, np.log10: log10, np.log2: log2,
+           np.sinh: sinh, np.cosh: cosh, np.tanh: tanh, np.exp: exp, np.sqrt: sqrt,
+           np.arcsin: arcsin, np.arccos: arccos, np.arctan: arctan, np.log1p: log1p, np.expm1: expm1,
+           np.square: lambda x: power(x, 2), np.negative: operator.neg, np.positive: operator.pos,
+           np.absolute: abs, np.maximum: maximum, np.minimum: minimum,
+           np.matmul: linalg.matmul}
+_OPERATORS = {np.add: ('__add__', '__radd__'), np.subtract: ('__sub__', '__rsub__'),
+              np.multiply: ('__mul__', '__rmul__'), np.true_divide: ('__truediv__', '__rtruediv__'),
+              np.power: ('__pow__', '__rpow__'), np.equal: ('__eq__', '__eq__'),
+              np.not_equal: ('__ne__', '__ne__'), np.less: ('__lt__', '__gt__'),
+              np.less_equal: ('__le__', '__ge__'), np.greater: ('__gt__', '__lt__'),
+              np.greater_equal: ('__ge__', '__le__')}
+
+
+def _value(a: Union[Rnode, Dual]):
+    """Return the value of a Dual or Rnode object."""
+    return a.val if isinstance(a, Dual) else a.value
+
+
+# NumPy functions called on Dual or Rnode objects, see __array_function__
+_FUNCTIONS = {np.clip: clip, np.where: where, np.sum: linalg.sum, np.mean: linalg.mean, np.dot: linalg.dot, np.linalg.norm: linalg.norm,
+              np.shape: lambda a: np.shape(_value(a)), np.ndim: lambda a: np.ndim(_value(a))}
+
+
+def _array_ufunc(ufunc, method, inputs, kwargs):
+    """Apply a NumPy ufunc to inputs containing Dual or Rnode objects.
+
+    Returns NotImplemented, which makes NumPy raise TypeError, for ufuncs without
+    a farad rule, for ufunc methods other than __call__ and for the out argument.
+    """
+    if method != '__call__' or kwargs:
+        return NotImplemented
     try:
-        z = Rnode(np.arctan(x.value))
-        x.children.append((1 / (1 + x.value ** 2), z))
-        return z
-    except AttributeError:
-        try:
-            return Dual(np.arctan(x.val), 1 / (1 + x.val**2) * np.asarray(x.der))
-        except AttributeError:
-            return np.arctan(x)
+        return _UFUNCS[ufunc](*inputs)
+    except KeyError:
+        pass
+    try:
+        name, reflected = _OPERATORS[ufunc]
+    except KeyError:
+        return NotImplemented
+    a, b = inputs
+    if isinstance(a, (Dual, Rnode)):
+        return getattr(a, name)(b)
+    return getattr(b, reflected)(a)
+
+
+def _array_function(func, types, args, kwargs):
+    """Apply a NumPy function to arguments containing Dual or Rnode objects.
+
+    Returns NotImplemented, which makes NumPy raise TypeError, for functions without
+    a farad rule: their own implementation would treat the farad objects as opaque
+    scalars and drop the derivatives.
+    """
+    try:
+        rule = _FUNCTIONS[func]
+    except KeyError:
+        return NotImplemented
+    return rule(*args, **kwargs)
 
 
 # if __name__ == "__main__":
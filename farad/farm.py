@@ -0,0 +1,323 @@
+"""Socket worker farm for farad package.
+
+A Farm coordinates worker processes, on the same machine or on others, which
+connect to it over TCP or a Unix socket (multiprocessing.connection, with an HMAC
+authentication key). The points of a batch are split into chunks; each worker asks
+for the next chunk as soon as it is done with the previous one, evaluates it with
+AutoDiff (forward mode) or RAutoDiff (reverse mode), and sends the results back,
+where they are reassembled with the shape convention of farad.driver.
+
+Once no chunk is left to hand out, idle workers steal a backup copy of a chunk
+still running elsewhere, and the first result wins, so a slow worker does not hold
+up the batch. A worker that disconnects (or, with task_timeout, does not answer in
+time) loses its chunks, which are handed out again, up to max_retries times each.
+
+Functions are sent by pickling, i.e. by reference to their module and name, as for
+ParallelDiff: they must be defined at the top level of a module the workers can
+import. Messages are pickles too, so only workers holding the authentication key
+should be able to connect. A worker on another machine runs
+
+    FARAD_AUTHKEY=<farm.authkey.hex()> python -m farad.farm <host>:<port>
+"""
+
+__all__ = ['Farm', 'work']
+
+import os
+import sys
+import socket
+import struct
+import threading
+import multiprocessing
+import numpy as np
+from collections import deque
+from multiprocessing.connection import Client, Listener, answer_challenge, deliver_challenge
+from farad.driver import _buffer
+from farad.parallel import _evaluate
+from typing import Callable, List, Optional, Tuple, Union
+
+_HANDSHAKE_TIMEOUT = 10.0  # seconds for a connecting worker to authenticate
+
+
+class _Job:
+    """A batch being evaluated: the chunks of its points and their state."""
+    __slots__ = ('id', 'spec', 'points', 'chunks', 'pending', 'running', 'attempts', 'done', 'values', 'ders',
+                 'error')
+
+    def __init__(self, id, spec, points, size):
+        self.id = id
+        self.spec = spec  # (mode, function, options) sent to the workers
+        self.points = points
+        self.chunks = [(i, min(i + size, len(points))) for i in range(0, len(points), size)]
+        self.pending = deque(range(len(self.chunks)))  # chunks to hand out
+        self.running = [0] * len(self.chunks)  # number of workers on each chunk
+        self.attempts = [0] * len(self.chunks)  # chunks lost with their worker
+        self.done = set()
+        self.values = self.ders = None  # allocated with the first result
+        self.error = None
+
+    def finished(self) -> bool:
+        return self.error is not None or len(self.done) == len(self.chunks)
+
+
+class Farm:
+
+    def __init__(self, function: Union[Callable, List[Callable]], mode: str = 'forward', dim: int = 1,
+                 wrt: Optional[List[int]] = None, vectorized: bool = False, array_input: bool = False,
+                 address=('127.0.0.1', 0), authkey: Optional[bytes] = None, chunksize: Optional[int] = None,
+                 max_retries: int = 3, task_timeout: Optional[float] = None):
+        """Constructor for Farm class, which starts listening for workers.
+
+        Parameters
+        ==========
+        function: The function to differentiate, defined at the top level of a module,
+        or in reverse mode a list of such functions.
+        mode: 'forward' (AutoDiff) or 'reverse' (RAutoDiff).
+        dim, wrt, vectorized, array_input: see ParallelDiff.
+        address: (host, port) to listen on with TCP, port 0 choosing a free one, or the
+        path of a Unix socket. The address actually used is kept as self.address.
+        authkey: bytes shared with the workers, random by default (self.authkey).
+        chunksize: number of points per chunk; by default a batch is split in four
+        chunks per connected worker.
+        max_retries: number of times a chunk is handed out again after losing its
+        worker, before the batch fails.
+        task_timeout: optional seconds after which a worker that has not returned its
+        chunk is considered lost.
+        """
+        if mode not in ('forward', 'reverse'):
+            raise ValueError("mode must be 'forward' or 'reverse'")
+        self.spec = (mode, function, {'dim': dim, 'wrt': wrt, 'vectorized': vectorized, 'array_input': array_input})
+        self.authkey = os.urandom(32) if authkey is None else authkey
+        self.chunksize = chunksize
+        self.max_retries = max_retries
+        self.task_timeout = task_timeout
+        self._listener = Listener(address)  # authenticated by _serve, off the accepting thread
+        self.address = self._listener.address
+        self._cond = threading.Condition()
+        self._batch = threading.Lock()  # one batch at a time
+        self._job = None
+        self._jobs = 0
+        self._workers = 0
+        self._closed = False
+        self._processes = []
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def spawn(self, n: int = 1):
+        """Start n local worker processes connecting to the farm."""
+        for _ in range(n):
+            process = multiprocessing.Process(target=work, args=(self.address, self.authkey), daemon=True)
+            process.start()
+            self._processes.append(process)
+
+    def value_and_grad(self, points, out: Optional[Tuple[np.ndarray, np.ndarray]] = None,
+                       timeout: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Values and derivatives of the function at a batch of points, evaluated by
+        the workers.
+
+        Parameters
+        ==========
+        points: array_like, points along the first axis, see ParallelDiff.value_and_grad.
+        out: optional pair of np.ndarray, buffers written in place.
+        timeout: optional seconds to wait for the results.
+
+        Returns
+        =======
+        (np.ndarray, np.ndarray)
+            Values of shape (p,) + (outputs) and derivatives of shape
+            (p,) + (outputs) + (inputs).
+
+        Raises
+        ======
+        The error raised by the function on a worker; RuntimeError if a chunk lost
+        its worker more than max_retries times; TimeoutError after timeout.
+        """
+        points = np.asarray(points, dtype=float)
+        if not len(points):
+            raise ValueError('points must hold at least one point')
+        with self._batch:
+            with self._cond:
+                size = self.chunksize or max(1, -(-len(points) // (4 * max(1, self._workers))))
+                self._jobs += 1
+                job = self._job = _Job(self._jobs, self.spec, points, size)
+                job.values, job.ders = out if out is not None else (None, None)
+                self._cond.notify_all()
+                try:
+                    if not self._cond.wait_for(lambda: job.finished() or self._closed, timeout):
+                        raise TimeoutError(f'{len(job.done)} of {len(job.chunks)} chunks evaluated in time')
+                finally:
+                    self._job = None
+                if job.error is not None:
+                    raise job.error
+                if not job.finished():
+                    raise RuntimeError('the farm was closed')
+                return job.values, job.ders
+
+    def close(self):
+        """Stop the workers and the listener."""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        try:  # wake the accepting thread up; accept() does not authenticate, so this does not block
+            Client(self.address).close()
+        except OSError:
+            pass
+        self._listener.close()
+        for process in self._processes:  # local workers still busy are terminated
+            process.join(1.0)
+            if process.is_alive():
+                process.terminate()
+
+    def __enter__(self) -> "Farm":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _accept(self):
+        """Accept workers, serving each from its own thread."""
+        while True:
+            try:
+                conn = self._listener.accept()
+            except OSError:  # closing
+                if self._closed:
+                    return
+                continue
+            if self._closed:
+                conn.close()
+                return
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn):
+        """Authenticate one worker, then hand chunks out to it and collect its results."""
+        try:
+            _authenticate(conn, self.authkey, _HANDSHAKE_TIMEOUT)
+        except (OSError, EOFError, multiprocessing.AuthenticationError):  # silent, or not a worker
+            conn.close()
+            return
+        with self._cond:
+            self._workers += 1
+        known = None  # id of the job whose function the worker holds
+        job = index = None
+        try:
+            while True:
+                with self._cond:
+                    task = self._cond.wait_for(self._task)
+                    if task == 'stop':
+                        conn.send(('stop',))
+                        return
+                    job, index = task
+                start, stop = job.chunks[index]
+                conn.send(('task', job.id, None if known == job.id else job.spec, job.points[start:stop]))
+                known = job.id
+                if self.task_timeout is not None and not conn.poll(self.task_timeout):
+                    raise TimeoutError
+                reply = conn.recv()
+                with self._cond:
+                    self._finish(job, index, reply)
+                    job = None
+        except (OSError, EOFError, TimeoutError):  # worker lost
+            with self._cond:
+                if job is not None:
+                    self._lose(job, index)
+        finally:
+            conn.close()
+            with self._cond:
+                self._workers -= 1
+
+    def _task(self):
+        """Next (job, chunk) for a worker, 'stop' when closed, or None to wait;
+        called holding the condition, as the predicate of a wait, and takes the
+        chunk it returns."""
+        if self._closed:
+            return 'stop'
+        job = self._job
+        if job is None or job.finished():
+            return None
+        if job.pending:
+            index = job.pending.popleft()
+        else:  # steal a backup copy of a chunk running on a single worker
+            running = [i for i, n in enumerate(job.running) if n == 1 and i not in job.done]
+            if not running:
+                return None
+            index = running[0]
+        job.running[index] += 1
+        return job, index
+
+    def _finish(self, job: _Job, index: int, reply: tuple):
+        """Record the reply of a worker; called holding the condition."""
+        job.running[index] -= 1
+        if reply[0] == 'error':
+            job.error = job.error or reply[1]
+        elif index not in job.done and not job.finished():
+            value, der = reply[1:]
+            try:
+                if not job.done:  # the shapes of the results are known from the first chunk
+                    p = len(job.points)
+                    job.values = _buffer(job.values, (p,) + value.shape[1:])
+                    job.ders = _buffer(job.ders, (p,) + der.shape[1:])
+            except ValueError as error:  # out buffers of the wrong shape
+                job.error = error
+            else:
+                start, stop = job.chunks[index]
+                job.values[start:stop], job.ders[start:stop] = value, der
+                job.done.add(index)
+        self._cond.notify_all()
+
+    def _lose(self, job: _Job, index: int):
+        """Hand a chunk out again after losing its worker; called holding the condition."""
+        job.running[index] -= 1
+        if index in job.done or job.running[index] or job.finished():
+            return
+        job.attempts[index] += 1
+        if job.attempts[index] > self.max_retries:
+            job.error = RuntimeError(f'chunk {index} lost its worker {job.attempts[index]} times')
+        else:
+            job.pending.appendleft(index)
+        self._cond.notify_all()
+
+
+def _authenticate(conn, authkey: bytes, timeout: float):
+    """Run the HMAC handshake of a multiprocessing Listener on an accepted connection,
+    raising OSError if the peer does not take part in it within timeout seconds."""
+    sock = socket.socket(fileno=os.dup(conn.fileno()))  # the same socket, to set its timeouts
+    try:
+        for option in (socket.SO_RCVTIMEO, socket.SO_SNDTIMEO):
+            sock.setsockopt(socket.SOL_SOCKET, option, struct.pack('ll', int(timeout), int(timeout % 1 * 1e6)))
+        deliver_challenge(conn, authkey)
+        answer_challenge(conn, authkey)
+        for option in (socket.SO_RCVTIMEO, socket.SO_SNDTIMEO):  # blocking again, see task_timeout
+            sock.setsockopt(socket.SOL_SOCKET, option, struct.pack('ll', 0, 0))
+    finally:
+        sock.close()
+
+
+def work(address, authkey: bytes):
+    """Evaluate the chunks handed out by the Farm at address until it stops.
+
+    Parameters
+    ==========
+    address: (host, port) or Unix socket path of the farm.
+    authkey: bytes, the authentication key of the farm.
+    """
+    spec = None
+    with Client(address, authkey=authkey) as conn:
+        while True:
+            try:
+                message = conn.recv()
+            except EOFError:  # the farm is gone
+                return
+            if message[0] == 'stop':
+                return
+            _, _, new_spec, points = message
+            spec = new_spec or spec
+            try:
+                reply = ('result',) + tuple(_evaluate(*spec, points))
+            except Exception as error:
+                reply = ('error', error)
+            conn.send(reply)
+
+
+if __name__ == '__main__':
+    host, _, port = sys.argv[1].rpartition(':')
+    work((host, int(port)) if host else sys.argv[1], bytes.fromhex(os.environ['FARAD_AUTHKEY']))
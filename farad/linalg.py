@@ -0,0 +1,311 @@
+"""Reductions and linear algebra for farad package.
+
+The functions of this module operate on whole arrays: applied to an array-valued
+Dual or Rnode (one whose value is an ndarray), they evaluate with a single NumPy
+call and a vectorized derivative rule, and add a single node to the graph. A list
+of scalar Dual or Rnode objects is first packed into one array-valued object, so
+sum([x1, ..., xn]) costs one node instead of n - 1 additions. The NumPy functions
+np.sum, np.mean, np.dot, np.matmul (and the @ operator) and np.linalg.norm are
+routed here when called on Dual or Rnode objects.
+
+Of the arguments of these NumPy functions, the supported subset is axis for np.sum
+and np.mean, and the default norm of np.linalg.norm over all elements. The others
+(dtype, out, keepdims, ord, axis of norm, ...) are accepted at their default
+values only, and raise ValueError otherwise.
+"""
+
+__all__ = ['sum', 'mean', 'dot', 'matmul', 'norm', 'logsumexp', 'softmax']
+
+import builtins
+import numpy as np
+from farad.dual import Dual
+from farad.rnode import Rnode, _record
+from farad.elem import primitive
+from typing import Union, List, Optional
+
+
+def _axes(axis: Optional[int], ndim: int):
+    """Reduction axes of an array of ndim dimensions, counted from the end so that
+    they also apply to tangents with leading seed axes."""
+    if axis is None:
+        return tuple(range(-ndim, 0))
+    return axis - ndim if axis >= 0 else axis
+
+
+def _expand(g, axis: Optional[int]):
+    """Re-insert the axis removed by a reduction, for broadcasting against its input."""
+    return g if axis is None else np.expand_dims(g, axis)
+
+
+def _check(function: str, kwargs: dict, defaults: dict):
+    """Raise ValueError for the keyword arguments of a NumPy function that are not
+    supported, i.e. unknown or given other than their default value."""
+    for name, value in kwargs.items():
+        if name not in defaults or value is not defaults[name]:
+            raise ValueError(f'argument {name} of {function} is unsupported on Dual and Rnode objects')
+
+
+def _stack(items: list, shape: tuple) -> Union[Rnode, Dual, np.ndarray]:
+    """Pack scalar Dual or Rnode objects (and constants) into one array-valued object.
+
+    Parameters
+    ==========
+    items : list
+        Elements in C order.
+    shape : tuple
+        Shape of the packed value.
+
+    Returns
+    =======
+    x : Rnode class object, Dual class object or np.ndarray
+        An Rnode if any element is an Rnode, with one edge from every element node;
+        else a Dual whose derivative stacks the element derivatives along the last
+        axes; else the array of items.
+    """
+    nodes = [item for item in items if isinstance(item, Rnode)]
+    if nodes:
+        tag = builtins.max(node.tag for node in nodes)
+        z = Rnode(np.array([item.value if isinstance(item, Rnode) else item for item in items]).reshape(shape), tag)
+        for i, item in enumerate(items):
+            if isinstance(item, Rnode):
+                item.children.append((lambda g, i=np.unravel_index(i, shape): g[i], z))
+        _record(z, lambda *items: _stack(list(items), shape), tuple(items))
+        return z
+    if any(isinstance(item, Dual) for item in items):
+        ders = [np.asarray(item._der) if isinstance(item, Dual) else np.zeros(()) for item in items]
+        lead = np.broadcast_shapes(*(der.shape for der in ders))
+        der = np.stack([np.broadcast_to(der, lead) for der in ders], axis=-1).reshape(lead + shape)
+        return Dual(np.array([item._val if isinstance(item, Dual) else item for item in items]).reshape(shape), der)
+    return np.array(items).reshape(shape)
+
+
+def _pack(x):
+    """Pack a list, tuple or object array of Dual or Rnode scalars, see _stack."""
+    if isinstance(x, (list, tuple)):
+        return _stack(list(x), (len(x),))
+    if isinstance(x, np.ndarray) and x.dtype == object:
+        return _stack(list(x.flat), x.shape)
+    return x
+
+
+def _value(x):
+    """Value of a Dual, Rnode or plain argument."""
+    if isinstance(x, Rnode):
+        return x.value
+    if isinstance(x, Dual):
+        return x._val
+    return x
+
+
+@primitive
+def _sum(x, axis=None):
+    return np.sum(x, axis=axis)
+
+
+_sum.defjvp(lambda t, ans, x, axis=None: np.sum(t, axis=_axes(axis, np.ndim(x))))
+_sum.defvjp(lambda g, ans, x, axis=None: np.broadcast_to(_expand(g, axis), np.shape(x)))
+
+
+def _matmul_vjp_a(g, ans, a, b):
+    """Adjoint of a in a @ b, i.e. g @ b.T, for 1-D and 2-D operands."""
+    if np.ndim(b) > 1:
+        return np.matmul(g, np.transpose(b)) if np.ndim(a) > 1 else np.matmul(b, g)
+    return np.multiply.outer(g, b) if np.ndim(a) > 1 else g * b
+
+
+def _matmul_vjp_b(g, ans, a, b):
+    """Adjoint of b in a @ b, i.e. a.T @ g, for 1-D and 2-D operands."""
+    if np.ndim(a) > 1:
+        return np.matmul(np.transpose(a), g) if np.ndim(b) > 1 else np.matmul(g, a)
+    return np.multiply.outer(a, g) if np.ndim(b) > 1 else g * a
+
+
+@primitive
+def _matmul(a, b):
+    return np.matmul(a, b)
+
+
+# seed directions stack as matrices, except against a 1-D b, where a @ t = t @ a.T
+_matmul.defjvp(lambda t, ans, a, b: np.matmul(t, b),
+               lambda t, ans, a, b: np.matmul(t, np.transpose(a)) if t.ndim > np.ndim(b) == 1 else np.matmul(a, t))
+_matmul.defvjp(_matmul_vjp_a, _matmul_vjp_b)
+
+
+@primitive
+def _norm(x):
+    return np.linalg.norm(x)
+
+
+_norm.defjvp(lambda t, ans, x: np.sum(x * t, axis=_axes(None, np.ndim(x))) / ans)
+_norm.defvjp(lambda g, ans, x: g * x / ans)
+
+
+@primitive
+def _logsumexp(x, axis=None):
+    m = np.max(x, axis=axis, keepdims=True)
+    m = np.where(np.isfinite(m), m, 0.0)  # all -inf: exp(x - m) = 0, result -inf
+    return np.squeeze(np.log(np.sum(np.exp(x - m), axis=axis, keepdims=True)) + m, axis=axis)[()]
+
+
+# the softmax of x is exp(x - logsumexp(x)), obtained from the output
+_logsumexp.defjvp(lambda t, ans, x, axis=None: np.sum(np.exp(x - _expand(ans, axis)) * t, axis=_axes(axis, np.ndim(x))))
+_logsumexp.defvjp(lambda g, ans, x, axis=None: _expand(g, axis) * np.exp(x - _expand(ans, axis)))
+
+
+@primitive
+def _softmax(x, axis=None):
+    return np.exp(x - _expand(_logsumexp(x, axis=axis), axis))
+
+
+_softmax.defjvp(lambda t, ans, x, axis=None: ans * (t - np.sum(ans * t, axis=_axes(axis, np.ndim(x)), keepdims=True)))
+_softmax.defvjp(lambda g, ans, x, axis=None: ans * (g - np.sum(g * ans, axis=axis, keepdims=True)))
+
+
+def sum(x: Union[Rnode, Dual, List, np.ndarray], axis: Optional[int] = None, **kwargs
+        ) -> Union[Rnode, Dual, float, np.ndarray]:
+    """Sum of array elements over a given axis.
+
+    Parameters
+    ==========
+    x : array_like, list of Rnode/Dual objects, or array-valued Rnode/Dual object
+        Elements to sum.
+    axis : int, optional
+        Axis along which to sum; all elements by default.
+    kwargs : the other arguments of np.sum, at their default values only.
+
+    Returns
+    =======
+    y : float, np.ndarray, Rnode or Dual class object
+        The sum, as a single node of the graph.
+
+    Example
+    =======
+    >>> x = [Rnode(1.0), Rnode(2.0), Rnode(3.0)]
+    >>> f = sum([xi * xi for xi in x])
+    >>> f.grad_value = 1.0
+    >>> [xi.grad() for xi in x]
+    [2.0, 4.0, 6.0]
+    """
+    _check('sum', kwargs, {'dtype': None, 'out': None, 'keepdims': False})
+    return _sum(_pack(x), axis=axis)
+
+
+def mean(x: Union[Rnode, Dual, List, np.ndarray], axis: Optional[int] = None, **kwargs
+         ) -> Union[Rnode, Dual, float, np.ndarray]:
+    """Arithmetic mean over a given axis, see sum."""
+    _check('mean', kwargs, {'dtype': None, 'out': None, 'keepdims': False})
+    x = _pack(x)
+    shape = np.shape(_value(x))
+    return _sum(x, axis=axis) / (int(np.prod(shape)) if axis is None else shape[axis])
+
+
+def matmul(a: Union[Rnode, Dual, List, np.ndarray], b: Union[Rnode, Dual, List, np.ndarray]) -> Union[Rnode, Dual, np.ndarray]:
+    """Matrix product of two arrays.
+
+    Parameters
+    ==========
+    a, b : array_like, list of Rnode/Dual objects, or array-valued Rnode/Dual objects
+        1-D or 2-D operands; a 1-D operand is a vector.
+
+    Returns
+    =======
+    y : float, np.ndarray, Rnode or Dual class object
+        The product a @ b, as a single node of the graph.
+
+    Example
+    =======
+    >>> A = np.array([[1.0, 2.0], [3.0, 4.0]])
+    >>> matmul(A, Dual(np.array([1.0, 1.0]), np.array([1.0, 0.0])))
+    Dual(array([3., 7.]),[1.0, 3.0])
+    """
+    return _matmul(_pack(a), _pack(b))
+
+
+def dot(a: Union[Rnode, Dual, List, np.ndarray], b: Union[Rnode, Dual, List, np.ndarray], **kwargs
+        ) -> Union[Rnode, Dual, float, np.ndarray]:
+    """Dot product of scalar, 1-D or 2-D operands, see matmul; out is not supported.
+
+    Example
+    =======
+    >>> x = [Dual(1.0, [1.0, 0.0]), Dual(2.0, [0.0, 1.0])]
+    >>> dot(x, [3.0, 4.0])
+    Dual(11.0,[3.0, 4.0])
+    """
+    _check('dot', kwargs, {'out': None})
+    a, b = _pack(a), _pack(b)
+    if np.ndim(_value(a)) == 0 or np.ndim(_value(b)) == 0:
+        return a * b
+    return _matmul(a, b)
+
+
+def norm(x: Union[Rnode, Dual, List, np.ndarray], ord: None = None, axis: None = None, keepdims: bool = False
+         ) -> Union[Rnode, Dual, float]:
+    """Euclidean norm of a vector, or Frobenius norm of a matrix.
+
+    Parameters
+    ==========
+    x : array_like, list of Rnode/Dual objects, or array-valued Rnode/Dual object
+        Vector or matrix.
+    ord, axis, keepdims : None, None, False
+        Only the default norm over all elements is supported, for compatibility
+        with np.linalg.norm.
+
+    Returns
+    =======
+    y : float, Rnode or Dual class object
+        sqrt(sum(x**2)), as a single node of the graph.
+
+    Example
+    =======
+    >>> norm(Dual(np.array([3.0, 4.0]), np.array([1.0, 0.0])))
+    Dual(5.0,0.6)
+    """
+    _check('norm', {'ord': ord, 'axis': axis, 'keepdims': keepdims}, {'ord': None, 'axis': None, 'keepdims': False})
+    return _norm(_pack(x))
+
+
+def logsumexp(x: Union[Rnode, Dual, List, np.ndarray], axis: Optional[int] = None) -> Union[Rnode, Dual, float, np.ndarray]:
+    """Logarithm of the sum of exponentials, log(sum(exp(x))), computed stably.
+
+    Parameters
+    ==========
+    x : array_like, list of Rnode/Dual objects, or array-valued Rnode/Dual object
+        Input array.
+    axis : int, optional
+        Axis along which to reduce; all elements by default.
+
+    Returns
+    =======
+    y : float, np.ndarray, Rnode or Dual class object
+        The reduction, as a single node of the graph. The maximum of x is
+        subtracted before exponentiating, so large inputs do not overflow.
+
+    Example
+    =======
+    >>> logsumexp(np.array([1000.0, 1000.0]))
+    1000.6931471805599
+    """
+    return _logsumexp(_pack(x), axis=axis)
+
+
+def softmax(x: Union[Rnode, Dual, List, np.ndarray], axis: Optional[int] = None) -> Union[Rnode, Dual, np.ndarray]:
+    """Softmax function, exp(x) / sum(exp(x)), computed stably.
+
+    Parameters
+    ==========
+    x : array_like, list of Rnode/Dual objects, or array-valued Rnode/Dual object
+        Input array.
+    axis : int, optional
+        Axis along which to normalize; all elements by default.
+
+    Returns
+    =======
+    y : np.ndarray, Rnode or Dual class object
+        The softmax of x, as a single node of the graph.
+
+    Example
+    =======
+    >>> softmax(np.array([0.0, np.log(3.0)]))
+    array([0.25, 0.75])
+    """
+    return _softmax(_pack(x), axis=axis)
@@ -0,0 +1,230 @@
+"""Parallel evaluation for farad package.
+
+ParallelDiff evaluates values and derivatives at a large batch of points by splitting
+the points into chunks, which are handed to the worker processes of a
+concurrent.futures.ProcessPoolExecutor. Each worker runs an AutoDiff (forward mode)
+or RAutoDiff (reverse mode) driver on its chunk, and the results are gathered into
+one output array per result, with the shape convention of farad.driver.
+
+Functions are sent to the workers by pickling, i.e. by reference to their module
+and name, so they must be defined at the top level of a module (not lambdas or
+nested functions). A list of such functions is supported in reverse mode.
+
+The points and the results are exchanged through multiprocessing.shared_memory
+blocks rather than pickled: each worker reads its rows of the points and writes its
+rows of the results in place, and the arrays returned to the caller are views of the
+result blocks, made without copying. On systems that do not map POSIX shared memory
+under /dev/shm, as Linux does, the chunks and their results are pickled instead.
+"""
+
+__all__ = ['ParallelDiff']
+
+import os
+import mmap
+import pickle
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+from farad.driver import AutoDiff, RAutoDiff, _buffer
+from typing import Callable, List, Optional, Tuple, Union
+
+_SHM_DIR = '/dev/shm'  # where POSIX shared memory blocks are mapped as files
+
+
+def _driver(mode: str, function, options: dict):
+    """Driver evaluating function in a worker process."""
+    if mode == 'forward':
+        return AutoDiff(function, dim=options['dim'], array_input=options['array_input'])
+    return RAutoDiff(function, vectorized=options['vectorized'], array_input=options['array_input'])
+
+
+def _evaluate(mode: str, function, options: dict, points: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Values and derivatives at a chunk of points.
+
+    Returns:
+    values, derivatives: np.ndarray, with the points along the first axis
+    """
+    driver = _driver(mode, function, options)
+    if options['array_input']:  # one call per point
+        results = [driver.value_and_grad(point) for point in points]
+        return np.stack([r[0] for r in results]), np.stack([r[1] for r in results])
+    if mode == 'forward':
+        return driver.value_and_grad(points.tolist())
+    values, ders = driver.value_and_grad(points, wrt=options['wrt'])
+    if points.ndim == 1 and points.size == 1:  # a single scalar point has no point axis
+        values, ders = values[None], ders[None]
+    return values, ders
+
+
+def _chunk(mode: str, function, options: dict, points: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Values and derivatives at a chunk of points, run in a worker process and
+    returned by pickling, see _evaluate."""
+    return _evaluate(mode, function, options, points)
+
+
+def _shared_chunk(mode: str, function, options: dict, blocks: tuple, start: int, stop: int):
+    """Values and derivatives at rows start:stop of the points, run in a worker
+    process on shared memory blocks.
+
+    Parameters
+    ==========
+    blocks: ((name, shape) of the points, of the values and of the derivatives)
+    start, stop: int, rows of this chunk
+    """
+    points, values, ders = (_map(name, shape) for name, shape in blocks)
+    values[start:stop], ders[start:stop] = _evaluate(mode, function, options, points[start:stop])
+
+
+def _map(name: str, shape: tuple) -> np.ndarray:
+    """Float64 array of the given shape over the shared memory block name.
+
+    Notes
+    =====
+    The block is mapped anew rather than through a SharedMemory object, so the array
+    owns its mapping: the block can be closed and unlinked while the array is in
+    use, and its memory is released with the array. Workers thereby also stay clear
+    of the resource tracker, which only the creating process should notify.
+    """
+    with open(os.path.join(_SHM_DIR, name), 'r+b') as file:
+        buffer = mmap.mmap(file.fileno(), 0)
+    return np.frombuffer(buffer, count=int(np.prod(shape))).reshape(shape)
+
+
+def _block(shape: tuple) -> SharedMemory:
+    """New shared memory block for a float64 array of the given shape."""
+    return SharedMemory(create=True, size=max(1, int(np.prod(shape))) * 8)
+
+
+class ParallelDiff:
+
+    def __init__(self, function: Union[Callable, List[Callable]], mode: str = 'forward', dim: int = 1,
+                 wrt: Optional[List[int]] = None, vectorized: bool = False, array_input: bool = False,
+                 max_workers: Optional[int] = None, chunksize: Optional[int] = None):
+        """Constructor for ParallelDiff class.
+
+        Parameters
+        ==========
+        function: The function to differentiate, defined at the top level of a module,
+        or in reverse mode a list of such functions.
+        mode: 'forward' (AutoDiff) or 'reverse' (RAutoDiff).
+        dim: The dimensionality of the function, see AutoDiff.
+        wrt: optional list of int, parameters to differentiate in reverse mode, see
+        RAutoDiff.forwardpass.
+        vectorized: see RAutoDiff.
+        array_input: If True, function takes a single ndarray parameter, and each
+        point of a batch is such an array.
+        max_workers: number of worker processes, os.cpu_count() by default.
+        chunksize: number of points per task; by default the batch is split in four
+        tasks per worker, which evens out the load.
+
+        Notes
+        =====
+        The worker processes are started on first use and kept for later batches.
+        Call close(), or use the object as a context manager, to stop them.
+        """
+        if mode not in ('forward', 'reverse'):
+            raise ValueError("mode must be 'forward' or 'reverse'")
+        try:
+            pickle.dumps(function)
+        except (pickle.PicklingError, AttributeError, TypeError):
+            raise TypeError('function must be picklable, e.g. defined at the top level of a module, '
+                            'to be sent to worker processes')
+        self.function = function
+        self.mode = mode
+        self.options = {'dim': dim, 'wrt': wrt, 'vectorized': vectorized, 'array_input': array_input}
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.chunksize = chunksize
+        self._pool = None
+
+    def value_and_grad(self, points, out: Optional[Tuple[np.ndarray, np.ndarray]] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Values and derivatives of the function at a batch of points.
+
+        Parameters
+        ==========
+        points: array_like
+            Points along the first axis: shape (p,) for a function of one scalar
+            parameter, (p, n) for n parameters, (p,) + x.shape for array_input.
+        out: optional pair of np.ndarray
+            C-contiguous float64 buffers of the shapes of the results, written in place.
+
+        Returns
+        =======
+        (np.ndarray, np.ndarray)
+            Values of shape (p,) + (outputs) and derivatives of shape
+            (p,) + (outputs) + (inputs), as for the batch evaluated by the driver of
+            the mode in a single process. Without out, these are views of the
+            shared memory the workers wrote to.
+
+        Notes
+        =====
+        The first point is evaluated in the calling process, which gives the shapes of
+        the results, and the others by the workers.
+
+        Example
+        =======
+        >>> from farad.elem import sin
+        >>> with ParallelDiff(sin, max_workers=2) as pool:
+        ...     values, ders = pool.value_and_grad(np.zeros(3))
+        >>> ders
+        array([1., 1., 1.])
+        """
+        points = np.asarray(points, dtype=float)
+        p = len(points)
+        if not p:
+            raise ValueError('points must hold at least one point')
+        size = self.chunksize or max(1, -(-p // (4 * self.max_workers)))
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(self.max_workers)
+        if os.path.isdir(_SHM_DIR):
+            return self._shared(points, size, out)
+        futures = [self._pool.submit(_chunk, self.mode, self.function, self.options, points[i:i + size])
+                   for i in range(0, p, size)]
+        values = ders = None
+        for i, future in zip(range(0, p, size), futures):
+            value, der = future.result()
+            if values is None:  # the shapes of the results are known from the first chunk
+                values = _buffer(None if out is None else out[0], (p,) + value.shape[1:])
+                ders = _buffer(None if out is None else out[1], (p,) + der.shape[1:])
+            values[i:i + size] = value
+            ders[i:i + size] = der
+        return values, ders
+
+    def _shared(self, points: np.ndarray, size: int, out=None) -> Tuple[np.ndarray, np.ndarray]:
+        """Evaluate a batch through shared memory blocks, see value_and_grad."""
+        p = len(points)
+        value, der = _evaluate(self.mode, self.function, self.options, points[:1])
+        shapes = points.shape, (p,) + value.shape[1:], (p,) + der.shape[1:]
+        blocks = []
+        try:
+            for shape in shapes:
+                blocks.append(_block(shape))
+            arrays = [_map(block.name, shape) for block, shape in zip(blocks, shapes)]
+            arrays[0][...] = points
+            arrays[1][:1], arrays[2][:1] = value, der
+            spec = tuple((block.name, shape) for block, shape in zip(blocks, shapes))
+            futures = [self._pool.submit(_shared_chunk, self.mode, self.function, self.options, spec, i, i + size)
+                       for i in range(1, p, size)]
+            for future in futures:
+                future.result()
+        finally:
+            for block in blocks:  # the arrays keep their own mappings
+                block.close()
+                block.unlink()
+        if out is None:
+            return arrays[1], arrays[2]
+        values = _buffer(out[0], shapes[1])
+        ders = _buffer(out[1], shapes[2])
+        values[...], ders[...] = arrays[1], arrays[2]
+        return values, ders
+
+    def close(self):
+        """Shut the worker processes down."""
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def __enter__(self) -> "ParallelDiff":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
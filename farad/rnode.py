@@ -1,19 +1,145 @@
 import numpy as np
 import numbers
 import reprlib
+import threading
+from contextlib import contextmanager
 from typing import NoReturn, List, Union, Optional, Type
 Array = Union[List[float], np.ndarray, numbers.Integral]
 
 
+class _Recording(threading.local):
+    tapes = ()  # tapes of the active record() blocks of the thread
+
+
+_recording = _Recording()
+
+
+@contextmanager
+def record():
+    """Context manager recording the operations that build a graph, for reevaluate.
+
+    Returns
+    =======
+    tape : dict
+        Filled with id(node) -> (node, function, arguments) for every node made by an
+        Rnode operator or a farad function within the block (and in nested blocks) of
+        the calling thread.
+
+    Notes
+    =====
+    The operations are kept on the tape rather than on the nodes: a node referencing
+    its arguments, which reference it back as a child, would make every graph a
+    reference cycle, left for the cyclic garbage collector to free.
+
+    Example
+    =======
+    >>> with record() as tape:
+    ...     x = Rnode(2.0)
+    ...     f = x * x
+    >>> len(tape)
+    1
+    """
+    tape = {}
+    outer = _recording.tapes
+    _recording.tapes = outer + (tape,)
+    try:
+        yield tape
+    finally:
+        _recording.tapes = outer
+
+
+def _record(node: "Rnode", fn, args: tuple):
+    """Record that node = fn(*args) on the active tapes, see record."""
+    for tape in _recording.tapes:
+        tape[id(node)] = (node, fn, args)
+
+
+def _align(a: "Rnode", b: "Rnode"):
+    """Bring two Rnode objects of different differentiation levels to a common level.
+
+    Parameters
+    ==========
+    a, b : Rnode class objects
+        Operands of a binary operation, with a.tag != b.tag.
+
+    Returns
+    =======
+    a, b : Rnode class objects
+        The operands, where the one with the smaller (outer) tag is replaced by a
+        leaf of the inner level holding it as a value.
+
+    Notes
+    =====
+    With nested derivatives, an inner function may close over a node of an
+    outer graph. Within the inner graph that node is a constant; recording it as
+    an input of the inner graph would mix the two derivatives (perturbation
+    confusion). The outer node still takes part in the outer graph through the
+    value of the leaf.
+    """
+    if a.tag < b.tag:
+        return Rnode(a, b.tag), b
+    return a, Rnode(b, a.tag)
+
+
+def _unbroadcast(adjoint, value):
+    """Sum an adjoint over the axes along which value was broadcast.
+
+    Parameters
+    ==========
+    adjoint : float/np.ndarray
+        Accumulated derivative of the output with respect to a node.
+    value : float/np.ndarray
+        Value of that node.
+
+    Returns
+    =======
+    adjoint : float/np.ndarray
+        The adjoint, reduced to the shape of value.
+
+    Notes
+    =====
+    When a scalar (or a smaller array) is combined with an array, the result is
+    broadcast, and so is the adjoint flowing back to the smaller operand. Edge
+    weights are usually scalars, in which case the adjoint is returned as is.
+    """
+    if adjoint.__class__ is not np.ndarray:
+        return adjoint
+    shape = np.shape(value)
+    if adjoint.shape == shape:
+        return adjoint
+    if not shape:
+        return adjoint.sum()
+    adjoint = adjoint.sum(axis=tuple(range(adjoint.ndim - len(shape))))
+    return adjoint.sum(axis=tuple(i for i, n in enumerate(shape) if n == 1 != adjoint.shape[i]),
+                       keepdims=True).reshape(shape)
+
+
+def _scatter(adjoint, key, shape: tuple) -> np.ndarray:
+    """Adjoint of x[key] with respect to x: the adjoint placed at key in an array of
+    zeros of the shape of x, summed where key selects an element more than once."""
+    result = np.zeros(shape)
+    np.add.at(result, key, adjoint)
+    return result
+
+
 class Rnode:
 
-    def __init__(self, value: numbers.Integral) -> "Rnode":
+    # Graphs are made of many small nodes that are built and dropped together;
+    # slots avoid a per-node __dict__, cutting the memory of a graph by ~15%.
+    # Nodes are not pooled: recycling them would need a Python-level __new__,
+    # slower than CPython's small-object allocator, and their child lists and
+    # edges would still be allocated one by one.
+    __slots__ = ('value', 'children', 'grad_value', 'tag')
+
+    def __init__(self, value: numbers.Integral, tag: int = 0) -> "Rnode":
         """Constructor for Rnode Object class.
 
         Parameters
         ==========
         value : int/float
             Value of farad.rnode.Rnode object.
+        tag : int
+            Differentiation level the node belongs to, see farad.driver.grad.
 
         Returns
         =======
@@ -22,11 +148,14 @@ class Rnode:
         chilren attribute store the children of this Rnode object and the derivative
         relationship between this object and its children. grad_value is used to recursively
         calculate the derivative in the reverse mode. Object also has includes overloaded operator methods for custom functionality.
+        When derivatives are nested, the value of a node may itself be an Rnode of an outer
+        graph with a smaller tag.
 
         """
         self.value = value
         self.children = []
         self.grad_value = None
+        self.tag = tag
 
     def clear(self):
         """Function to clear some attributes a Rnode object before reusing as an input to a new function.
@@ -88,8 +217,8 @@ class Rnode:
         # recurse only if the value is not yet cached
         if self.grad_value is None:
             # calculate derivative using chain rule
-            self.grad_value = sum(weight * var.grad()
-                                  for weight, var in self.children)
+            self.grad_value = _unbroadcast(sum(weight(var.grad()) if callable(weight) else weight * var.grad()
+                                               for weight, var in self.children), self.value)
         return self.grad_value
 
     def __add__(self, x: Union["Rnode", int, float]) -> "Rnode":
@@ -119,13 +248,16 @@ class Rnode:
         >>> Rnode(1.0) + Rnode(2.0)
         Rnode(3.0)
         """
+        if isinstance(x, Rnode) and x.tag != self.tag:
+            self, x = _align(self, x)
         try:
-            z = Rnode(self.value + x.value)
+            z = Rnode(self.value + x.value, self.tag)
             self.children.append((1., z))  # weight = ∂z/∂self = x.value
             x.children.append((1., z))  # weight = ∂z/∂x = self.value
         except AttributeError:
-            z = Rnode(self.value + x)
+            z = Rnode(self.value + x, self.tag)
             self.children.append((1., z))
+        _record(z, Rnode.__add__, (self, x))
         return z
 
     def __radd__(self, x: Union["Rnode", float]) -> "Rnode":
@@ -184,18 +316,20 @@ class Rnode:
         >>> Rnode(2.0) - 4
         Rnode(-2.0)
         """
+        if isinstance(x, Rnode) and x.tag != self.tag:
+            self, x = _align(self, x)
         try:
-            z = Rnode(self.value - x.value)
+            z = Rnode(self.value - x.value, self.tag)
             self.children.append((1., z))
             x.children.append((-1., z))
         except AttributeError:
-            z = Rnode(self.value - x)
+            z = Rnode(self.value - x, self.tag)
             self.children.append((1., z))
+        _record(z, Rnode.__sub__, (self, x))
         return z
 
     def __rsub__(self, x: Union["Rnode", float]) -> "Rnode":
-        """Revert to __sub__ dunder method to handle input reversal of
-        subtraction method.
+        """Overload input reversed subtraction operator to handle Rnode class.
 
         Parameters
         ==========
@@ -216,9 +350,12 @@ class Rnode:
         Examples
         ========
         >>> 4 - Rnode(2.0)
-        Rnode(-2.0)
+        Rnode(2.0)
         """
-        return self.__sub__(x)
+        z = Rnode(x - self.value, self.tag)
+        self.children.append((-1., z))
+        _record(z, Rnode.__rsub__, (self, x))
+        return z
 
     def __mul__(self, x: Union["Rnode", float]) -> "Rnode":
         """Overload the multiplication operator (*) to handle Rnode class.
@@ -249,13 +386,16 @@ class Rnode:
         >>> Rnode(2) * 3
         Rnode(6)
         """
+        if isinstance(x, Rnode) and x.tag != self.tag:
+            self, x = _align(self, x)
         try:
-            z = Rnode(self.value * x.value)
+            z = Rnode(self.value * x.value, self.tag)
             self.children.append((x.value, z))
             x.children.append((self.value, z))
         except AttributeError:
-            z = Rnode(self.value * x)
+            z = Rnode(self.value * x, self.tag)
             self.children.append((x, z))
+        _record(z, Rnode.__mul__, (self, x))
         return z
 
     def __rmul__(self, x: Union["Rnode", int, float]) -> "Rnode":
@@ -313,13 +453,16 @@ class Rnode:
         >>> Rnode(2.0) ** Rnode(4.0)
         Rnode(16.0)
         """
+        if isinstance(x, Rnode) and x.tag != self.tag:
+            self, x = _align(self, x)
         try:
-            z = Rnode(self.value ** x.value)
+            z = Rnode(self.value ** x.value, self.tag)
             self.children.append((x.value * self.value ** (x.value - 1.), z))
-            x.children.append((self.value ** x.value * np.log(self.value), z))
+            x.children.append((z.value * np.log(self.value), z))
         except AttributeError:
-            z = Rnode(self.value ** x)
+            z = Rnode(self.value ** x, self.tag)
             self.children.append((x* self.value ** (x - 1.), z))
+        _record(z, Rnode.__pow__, (self, x))
         return z
 
     def __rpow__(self, x: Union["Rnode", int, float]) -> "Rnode":
@@ -351,8 +494,9 @@ class Rnode:
         #     x.children.append((self.value * x.value ** (self.value - 1.), z))
         #     self.children.append((x.value ** self.value * np.log(x.value), z))
         # except AttributeError:
-        z = Rnode(x ** self.value)
-        self.children.append((x ** self.value * np.log(x), z))
+        z = Rnode(x ** self.value, self.tag)
+        self.children.append((z.value * np.log(x), z))
+        _record(z, Rnode.__rpow__, (self, x))
         return z
 
     def __truediv__(self, x: Union["Rnode", int, float]) -> "Rnode":
@@ -384,13 +528,16 @@ class Rnode:
         >>> Rnode(2.0) / 4
         Rnode(0.5)
         """
+        if isinstance(x, Rnode) and x.tag != self.tag:
+            self, x = _align(self, x)
         try:
-            z = Rnode(self.value / x.value)
+            z = Rnode(self.value / x.value, self.tag)
             self.children.append((1./x.value, z))
             x.children.append((- self.value / (x.value)**2, z))
         except AttributeError:
-            z = Rnode(self.value / x)
+            z = Rnode(self.value / x, self.tag)
             self.children.append((1./x, z))
+        _record(z, Rnode.__truediv__, (self, x))
         return z
 
     def __rtruediv__(self, x: Union["Rnode", int, float]) -> "Rnode":
@@ -423,8 +570,9 @@ class Rnode:
         #     x.children.append((1./self.value, z))
         #     self.children.append((- x.value / (self.value)**2, z))
         # except AttributeError:
-        z = Rnode(x / self.value)
+        z = Rnode(x / self.value, self.tag)
         self.children.append((- x / (self.value)**2, z))
+        _record(z, Rnode.__rtruediv__, (self, x))
         return z
 
     def __neg__(self: Union["Rnode", int, float]) -> "Rnode":
@@ -452,8 +600,9 @@ class Rnode:
         >>> -Rnode(1.0)
         Rnode(-1.0)
         """
-        z = Rnode(-self.value)
+        z = Rnode(-self.value, self.tag)
         self.children.append((-1, z))
+        _record(z, Rnode.__neg__, (self,))
         return z
 
     def __pos__(self: Union["Rnode", int, float]) -> "Rnode":
@@ -481,8 +630,49 @@ class Rnode:
         >>> +Rnode(1.0)
         Rnode(1.0)
         """
-        z = Rnode(self.value)
+        z = Rnode(self.value, self.tag)
         self.children.append((1, z))
+        _record(z, Rnode.__pos__, (self,))
+        return z
+
+    def __abs__(self) -> "Rnode":
+        """Overload the built-in abs() to handle Rnode class, see farad.elem.abs.
+
+        Examples
+        ========
+        >>> abs(Rnode(-2.0))
+        Rnode(2.0)
+        """
+        from farad import elem  # elem builds on this module
+        return elem.abs(self)
+
+    def __getitem__(self, key) -> "Rnode":
+        """Index or slice an array-valued Rnode object (e.g., x[0], x[1:], x[:, 0]).
+
+        Parameters
+        ==========
+        self : Rnode class object
+            Class object of type 'Rnode' whose value is an array.
+        key : int, slice, tuple or array
+            Any NumPy index of the value.
+
+        Returns
+        =======
+        Rnode : Rnode class object
+            The selected elements, as one node. Its adjoint is scattered back into
+            an array of the shape of self, see _scatter.
+
+        Example
+        =======
+        >>> x = Rnode(np.array([1.0, 2.0, 3.0]))
+        >>> f = x[0] * x[2] + x[1]
+        >>> gradient(f, [x])
+        [array([3., 1., 1.])]
+        """
+        z = Rnode(self.value[key], self.tag)  # TypeError for scalars, IndexError past the end
+        shape = np.shape(self.value)
+        self.children.append((lambda g: _scatter(g, key, shape), z))
+        _record(z, Rnode.__getitem__, (self, key))
         return z
 
     def __eq__(self, x: Union["Rnode", int, float]) -> bool:
@@ -693,6 +883,39 @@ class Rnode:
         except AttributeError:
             return (self.value >= x)
 
+    def __array_ufunc__(self, ufunc, method, *inputs, **kwargs):
+        """Dispatch a NumPy ufunc applied to Rnode objects, e.g. np.sin(x).
+
+        Notes
+        =====
+        Without this method NumPy would wrap the node into an object array and
+        loop over it in Python. Supported ufuncs are routed to the rules of
+        farad.elem and to the overloaded operators, so the result is a single
+        node of the graph, also when the value of the node is an array. Other
+        ufuncs, and ufunc methods such as reduce, raise TypeError.
+
+        Example
+        =======
+        >>> x = Rnode(np.array([0.0, 1.0]))
+        >>> f = np.sum(np.exp(x) * 2.0)
+        >>> gradient(f, [x])
+        [array([2.        , 5.43656366])]
+        """
+        from farad import elem  # elem builds on this module
+        return elem._array_ufunc(ufunc, method, inputs, kwargs)
+
+    def __array_function__(self, func, types, args, kwargs):
+        """Dispatch a NumPy function applied to Rnode objects, e.g. np.dot(a, x).
+
+        Notes
+        =====
+        Reductions and products listed in farad.elem are evaluated as a single
+        node with a vectorized derivative rule, and np.shape and np.ndim describe
+        the value. Any other function raises TypeError.
+        """
+        from farad import elem
+        return elem._array_function(func, types, args, kwargs)
+
     def __repr__(self) -> str:
         """Prints class definition with inputs - the output can be passed to eval()
         to instantiate new instance of class Rnode.
@@ -743,3 +966,280 @@ class Rnode:
         """
 
         return f"Reverse-mode {self.__class__.__name__} Object ( Values: {reprlib.repr(np.round(self.value, 4))} )"
+
+
+def _subgraph(output: Rnode, wrt: List[Rnode]):
+    """Collect the nodes lying on a path from any node in wrt to output.
+
+    Parameters
+    ==========
+    output : Rnode class object
+        Function output node.
+    wrt : list[Rnode]
+        Input nodes whose derivatives are requested.
+
+    Returns
+    =======
+    order : list[Rnode]
+        Nodes reachable from wrt that also reach output, in post-order, i.e.
+        every node appears after all of its children.
+    live : set[int]
+        ids of the nodes in order.
+
+    Notes
+    =====
+    The graph is walked iteratively with an explicit stack, so deep graphs do not
+    hit the interpreter recursion limit. Rnode defines __eq__, which makes it
+    unhashable, hence nodes are tracked by id().
+    """
+    live = {id(output)}
+    seen = set()
+    order = []
+    for root in wrt:
+        if id(root) in seen:
+            continue
+        seen.add(id(root))
+        stack = [(root, iter(root.children if root is not output else ()))]
+        while stack:
+            node, children = stack[-1]
+            for _, child in children:
+                if id(child) not in seen:
+                    seen.add(id(child))
+                    stack.append((child, iter(child.children if child is not output else ())))
+                    break
+            else:
+                stack.pop()
+                if node is output or any(id(child) in live for _, child in node.children):
+                    live.add(id(node))
+                    order.append(node)
+    return order, live
+
+
+def gradient(output: Rnode, wrt: List[Rnode], vectorized: bool = False) -> List[float]:
+    """Return the derivatives of output with respect to the nodes in wrt.
+
+    Parameters
+    ==========
+    output : Rnode class object
+        Function output node.
+    wrt : list[Rnode]
+        Input nodes whose derivatives are requested.
+    vectorized : bool
+        If True, use the level-scheduled sweep of _level_gradient (scalar graphs only).
+
+    Returns
+    =======
+    grads : list[float]
+        d(output)/d(node) for every node in wrt, in the same order.
+
+    Notes
+    =====
+    Unlike Rnode.grad(), which pulls derivatives through every child of a node,
+    adjoints are only propagated over the subgraph lying between wrt and output.
+    Nodes fed only by other inputs, and branches that never reach output, are
+    not visited, so the sweep costs in proportion to the requested subgraph.
+    The grad_value attribute of each visited node is updated as a side effect,
+    except in the vectorized sweep, which only returns the requested derivatives.
+
+    Example
+    =======
+    >>> x, y, w = Rnode(2.0), Rnode(3.0), Rnode(4.0)
+    >>> f = x * y + w ** 2
+    >>> gradient(f, [x])
+    [3.0]
+    >>> gradient(f, [y, w])
+    [2.0, 8.0]
+    >>> gradient(f, [x, y, w], vectorized=True)
+    [3.0, 2.0, 8.0]
+    """
+    if vectorized:
+        try:
+            return _level_gradient(output, wrt)
+        except (TypeError, ValueError):  # array-valued weights, use the generic sweep
+            pass
+    return _sweep(output, wrt, *_subgraph(output, wrt))
+
+
+def _sweep(output: Rnode, wrt: List[Rnode], order: List[Rnode], live: set) -> List[float]:
+    """Backward sweep over the subgraph returned by _subgraph(output, wrt).
+
+    Notes
+    =====
+    Split from gradient() so that callers re-evaluating a graph of unchanged
+    structure (see reevaluate) can reuse the traversal.
+    """
+    output.grad_value = 1.0
+    for node in order:
+        if node is not output:
+            node.grad_value = _unbroadcast(sum(weight(var.grad_value) if callable(weight) else weight * var.grad_value
+                                               for weight, var in node.children if id(var) in live), node.value)
+    return [root.grad_value if id(root) in live else 0.0 for root in wrt]
+
+
+def _level_gradient(output: Rnode, wrt: List[Rnode]) -> List[float]:
+    """Level-scheduled backward sweep over the subgraph between wrt and output.
+
+    Parameters
+    ==========
+    output : Rnode class object
+        Function output node.
+    wrt : list[Rnode]
+        Input nodes whose derivatives are requested.
+
+    Returns
+    =======
+    grads : list[float]
+        d(output)/d(node) for every node in wrt, in the same order.
+
+    Notes
+    =====
+    The subgraph is walked once, as in _subgraph, and flattened into a tape of
+    source index, destination index and weight arrays. Each node is assigned a
+    level, its longest distance to output, so the adjoints of all children of a
+    level-k node are final once levels below k are done. Each level is then
+    accumulated with a single np.add.at scatter instead of one Python-level
+    multiply-add per edge. This pays off for wide, shallow graphs; long chains
+    have few edges per level and are better served by the generic sweep.
+    Raises TypeError or ValueError if a weight is not a real scalar.
+    """
+    index = {}  # id(node) -> position on the tape, for nodes that reach output
+    level = []
+    src, dst, weights = [], [], []
+    seen = set()
+    for root in wrt:
+        if id(root) in seen:
+            continue
+        seen.add(id(root))
+        stack = [(root, iter(root.children if root is not output else ()))]
+        while stack:
+            node, children = stack[-1]
+            for _, child in children:
+                if id(child) not in seen:
+                    seen.add(id(child))
+                    stack.append((child, iter(child.children if child is not output else ())))
+                    break
+            else:
+                stack.pop()
+                i = len(level)
+                depth = 0
+                if node is not output:
+                    for weight, child in node.children:
+                        j = index.get(id(child))
+                        if j is not None:
+                            src.append(i)
+                            dst.append(j)
+                            weights.append(weight)
+                            if level[j] >= depth:
+                                depth = level[j] + 1
+                    if not depth:  # no child reaches output
+                        continue
+                index[id(node)] = i
+                level.append(depth)
+    if id(output) not in index:  # output does not depend on wrt
+        return [0.0] * len(wrt)
+    src = np.asarray(src, dtype=np.int64)
+    dst = np.asarray(dst, dtype=np.int64)
+    weights = np.asarray(weights, dtype=np.float64)
+    if weights.ndim != 1:
+        raise ValueError('vectorized sweep requires scalar edge weights')
+
+    # sort the edges by the level of their source node and sweep level by level
+    edge_level = np.asarray(level, dtype=np.int64)[src]
+    by_level = np.argsort(edge_level, kind='stable')
+    bounds = np.searchsorted(edge_level[by_level], np.arange(1, max(level) + 2))
+    adjoint = np.zeros(len(level))
+    adjoint[index[id(output)]] = 1.0
+    for start, stop in zip(bounds[:-1], bounds[1:]):
+        edges = by_level[start:stop]
+        np.add.at(adjoint, src[edges], weights[edges] * adjoint[dst[edges]])
+    return [float(adjoint[index[id(root)]]) if id(root) in index else 0.0 for root in wrt]
+
+
+def reevaluate(output: Rnode, roots: List[Rnode], values: Array, tape: dict):
+    """Re-evaluate a recorded graph at new input values.
+
+    Parameters
+    ==========
+    output : Rnode class object
+        Function output node of the recorded graph.
+    roots : list[Rnode]
+        Input nodes of the recorded graph.
+    values : list[float]
+        New values of the input nodes, in the same order as roots.
+    tape : dict
+        Operations recorded while the graph was built, see record.
+
+    Returns
+    =======
+    value : float
+        Updated value of output.
+
+    Notes
+    =====
+    Only inputs whose value changed are marked dirty, and only the nodes lying
+    between them and output are recomputed, together with the weights of the
+    edges entering them. Every other node keeps its cached value and weights. The
+    graph must have the same structure at the new inputs, i.e. the function must
+    not branch on the value of its inputs. Adjoints are not updated; call gradient()
+    afterwards for the new derivatives.
+
+    Example
+    =======
+    >>> x, y, w = Rnode(2.0), Rnode(3.0), Rnode(4.0)
+    >>> with record() as tape:
+    ...     f = x * y + w ** 2
+    >>> reevaluate(f, [x, y, w], [2.0, 5.0, 4.0], tape)
+    26.0
+    >>> gradient(f, [x, y, w])
+    [5.0, 2.0, 8.0]
+    """
+    dirty = set()
+    for root, value in zip(roots, values):
+        if np.any(root.value != value):
+            root.value = value
+            dirty.add(id(root))
+    if not dirty:
+        return output.value
+    order, _ = _subgraph(output, [root for root in roots if id(root) in dirty])
+    edges = {}  # id(parent) -> {id(child): positions of the edges in parent.children}
+    for node in reversed(order):  # parents before children
+        if id(node) in dirty:
+            continue
+        if id(node) not in tape:
+            raise ValueError('graph node was not recorded by a farad operation')
+        _recompute(node, tape[id(node)], edges)
+    return output.value
+
+
+def _recompute(node: Rnode, op: tuple, edges: dict) -> NoReturn:
+    """Recompute the value of node and the weights of the edges entering it.
+
+    Parameters
+    ==========
+    node : Rnode class object
+        Node to recompute from its recorded operation.
+    op : tuple
+        (node, function, arguments) recorded for node, see record.
+    edges : dict
+        Cache of edge positions, shared across the calls of one reevaluate().
+
+    Notes
+    =====
+    The recorded operation is replayed on detached copies of its Rnode arguments,
+    so the new weights can be read off the copies without touching the graph.
+    """
+    _, fn, args = op
+    copies = [Rnode(arg.value, arg.tag) if isinstance(arg, Rnode) else arg for arg in args]
+    node.value = fn(*copies).value
+    used = {}  # an argument may appear twice, e.g. x * x
+    for arg, copy in zip(args, copies):
+        if isinstance(arg, Rnode):
+            try:
+                positions = edges[id(arg)]
+            except KeyError:
+                positions = edges[id(arg)] = {}
+                for k, (_, child) in enumerate(arg.children):
+                    positions.setdefault(id(child), []).append(k)
+            k = positions[id(node)][used.get(id(arg), 0)]
+            used[id(arg)] = used.get(id(arg), 0) + 1
+            arg.children[k] = (copy.children[0][0], node)
@@ -0,0 +1,123 @@
+"""Special functions for farad package.
+
+Values are computed with the math module or with vectorized NumPy series, and
+derivatives with their closed forms, so each function adds a single node to the
+graph however it is evaluated.
+"""
+
+__all__ = ['erf', 'gammaln', 'digamma', 'betaln']
+
+import math
+import numpy as np
+from farad.dual import Dual
+from farad.rnode import Rnode
+from farad.elem import _elementwise, primitive
+from typing import Union, List
+
+_erf = np.vectorize(math.erf, otypes=[float])
+_lgamma = np.vectorize(math.lgamma, otypes=[float])
+
+
+def _digamma(x):
+    """Digamma function of plain values, psi(x) = d/dx log(Gamma(x)).
+
+    Notes:
+    Arguments below 10 are shifted up with psi(x) = psi(x + 1) - 1/x, then the asymptotic
+    series is used; arguments below 1/2 are first reflected with
+    psi(x) = psi(1 - x) - pi / tan(pi x). The result is accurate to about 1e-15.
+    """
+    x = np.asarray(x, dtype=float)
+    reflect = x < 0.5
+    z = np.where(reflect, 1 - x, x)
+    result = np.zeros_like(z)
+    for _ in range(10):
+        small = z < 10
+        result = result - np.where(small, 1 / z, 0.0)
+        z = np.where(small, z + 1, z)
+    z2 = 1 / (z * z)
+    result = result + np.log(z) - 0.5 / z - z2 * (1 / 12 - z2 * (1 / 120 - z2 * (1 / 252 - z2 * (
+        1 / 240 - z2 * (1 / 132 - z2 * (691 / 32760 - z2 / 12))))))
+    with np.errstate(divide='ignore'):
+        result = np.where(reflect, result - np.pi / np.tan(np.pi * x), result)
+    return result[()]
+
+
+def _trigamma(x):
+    """Trigamma function of plain values, the derivative of digamma; see _digamma."""
+    x = np.asarray(x, dtype=float)
+    reflect = x < 0.5
+    z = np.where(reflect, 1 - x, x)
+    result = np.zeros_like(z)
+    for _ in range(10):
+        small = z < 10
+        result = result + np.where(small, 1 / (z * z), 0.0)
+        z = np.where(small, z + 1, z)
+    z2 = 1 / (z * z)
+    result = result + 1 / z + z2 / 2 + z2 / z * (1 / 6 - z2 * (1 / 30 - z2 * (1 / 42 - z2 * (
+        1 / 30 - z2 * (5 / 66 - z2 * (691 / 2730 - z2 * 7 / 6))))))
+    with np.errstate(divide='ignore'):
+        result = np.where(reflect, np.pi ** 2 / np.sin(np.pi * x) ** 2 - result, result)
+    return result[()]
+
+
+@_elementwise(lambda x, y: 2 / np.sqrt(np.pi) * np.exp(-np.square(x)))
+def erf(x: Union[Rnode, Dual, float]) -> Union[Rnode, Dual, float, List[float]]:
+    """Calculates the error function of input.
+
+    Parameters:
+    x : array_like, Rnode object, or Dual Object.
+
+    Returns:
+    y : array_like, Rnode object, or Dual Object. erf of each element of x, with derivative
+    2 / sqrt(pi) * exp(-x**2).
+    """
+    return _erf(x)[()]
+
+
+@_elementwise(lambda x, y: _digamma(x))
+def gammaln(x: Union[Rnode, Dual, float]) -> Union[Rnode, Dual, float, List[float]]:
+    """Calculates the logarithm of the absolute value of the gamma function of input.
+
+    Parameters:
+    x : array_like, Rnode object, or Dual Object.
+
+    Returns:
+    y : array_like, Rnode object, or Dual Object. log|Gamma(x)| of each element of x, with
+    derivative digamma(x).
+    """
+    return _lgamma(x)[()]
+
+
+@_elementwise(lambda x, y: _trigamma(x))
+def digamma(x: Union[Rnode, Dual, float]) -> Union[Rnode, Dual, float, List[float]]:
+    """Calculates the digamma function, the derivative of gammaln, of input.
+
+    Parameters:
+    x : array_like, Rnode object, or Dual Object.
+
+    Returns:
+    y : array_like, Rnode object, or Dual Object. digamma of each element of x, with
+    derivative trigamma(x).
+    """
+    return _digamma(x)
+
+
+@primitive
+def betaln(a: Union[Rnode, Dual, float], b: Union[Rnode, Dual, float]) -> Union[Rnode, Dual, float, List[float]]:
+    """Calculates the logarithm of the absolute value of the beta function.
+
+    Parameters:
+    a, b : array_like, Rnode object, or Dual Object.
+
+    Returns:
+    y : array_like, Rnode object, or Dual Object. log|B(a, b)| = gammaln(a) + gammaln(b)
+    - gammaln(a + b) elementwise, with derivatives digamma(a) - digamma(a + b) and
+    digamma(b) - digamma(a + b).
+    """
+    return (_lgamma(a) + _lgamma(b) - _lgamma(np.add(a, b)))[()]
+
+
+betaln.defjvp(lambda t, ans, a, b: (_digamma(a) - _digamma(np.add(a, b))) * t,
+              lambda t, ans, a, b: (_digamma(b) - _digamma(np.add(a, b))) * t)
+betaln.defvjp(lambda g, ans, a, b: (_digamma(a) - _digamma(np.add(a, b))) * g,
+              lambda g, ans, a, b: (_digamma(b) - _digamma(np.add(a, b))) * g)
@@ -0,0 +1,103 @@
+"""Streaming evaluation for farad package.
+
+stream evaluates values and derivatives at a set of points too large for memory,
+such as a .npy file opened as a memory map. The points are read one chunk at a
+time, and the results are written to memory-mapped .npy files of the shape
+convention of farad.driver, so the memory used does not grow with the number of
+points. The output files are flushed after every chunk, and an interrupted run
+can be resumed from the last offset reported to the progress callback.
+"""
+
+__all__ = ['stream']
+
+import os
+import numpy as np
+from farad.parallel import ParallelDiff, _evaluate
+from typing import Callable, List, Optional, Tuple, Union
+
+_CHUNK_BYTES = 1 << 20  # default size of a chunk of points, about that of a typical L2 cache
+
+
+def _open(array, path_mode: str, shape: tuple = None) -> np.ndarray:
+    """Memory map of a .npy file, or array itself if it is not a path."""
+    if not isinstance(array, (str, os.PathLike)):
+        return array
+    if path_mode == 'w+':
+        return np.lib.format.open_memmap(array, mode='w+', dtype=np.float64, shape=shape)
+    return np.load(array, mmap_mode=path_mode)
+
+
+def stream(function: Union[Callable, List[Callable]], points, values, ders, mode: str = 'forward',
+           chunksize: Optional[int] = None, start: int = 0, progress: Optional[Callable[[int, int], None]] = None,
+           max_workers: Optional[int] = None, **options) -> Tuple[np.ndarray, np.ndarray]:
+    """Values and derivatives of a function at a large set of points, chunk by chunk.
+
+    Parameters
+    ==========
+    function: The function to differentiate, or in reverse mode a list of functions.
+    points: array_like or path
+        Points along the first axis, as for ParallelDiff.value_and_grad: an array,
+        a memory map, or the path of a .npy file, which is opened as a memory map.
+    values, ders: np.ndarray or path
+        Outputs of shapes (p,) + (outputs) and (p,) + (outputs) + (inputs): arrays
+        such as memory maps, or paths of .npy files, which are created with the
+        shapes of the results, or opened when resuming.
+    mode: 'forward' (AutoDiff) or 'reverse' (RAutoDiff).
+    chunksize: number of points per chunk; by default, as many as fill 1 MiB.
+    start: index of the first point to evaluate, to resume an interrupted run; the
+        outputs then exist and hold the results of the points before.
+    progress: optional callable, called as progress(done, total) after each chunk
+        once the outputs are flushed; done is the offset to resume from.
+    max_workers: if given, chunks are evaluated by a ParallelDiff with this many
+        worker processes, else in the calling process.
+    options: dim, wrt, vectorized and array_input, see ParallelDiff.
+
+    Returns
+    =======
+    (np.ndarray, np.ndarray)
+        values and ders, as memory maps if they were given as paths.
+
+    Example
+    =======
+    >>> from farad.elem import sin
+    >>> values, ders = stream(sin, np.zeros(5), np.empty(5), np.empty(5), chunksize=2)
+    >>> ders
+    array([1., 1., 1., 1., 1.])
+    """
+    if mode not in ('forward', 'reverse'):
+        raise ValueError("mode must be 'forward' or 'reverse'")
+    options = {'dim': 1, 'wrt': None, 'vectorized': False, 'array_input': False, **options}
+    points = _open(points, 'r')
+    p = len(points)
+    if not p:
+        raise ValueError('points must hold at least one point')
+    if not 0 <= start <= p:
+        raise ValueError(f'start must be between 0 and the number of points, {p}')
+    if chunksize is None:
+        chunksize = max(1, _CHUNK_BYTES // max(1, points[0].size * 8))
+    if start:
+        values, ders = _open(values, 'r+'), _open(ders, 'r+')
+        if len(values) != p or len(ders) != p:
+            raise ValueError(f'values and ders must hold the results of {p} points to resume')
+    pool = None if max_workers is None else ParallelDiff(function, mode, max_workers=max_workers, **options)
+    try:
+        for i in range(start, p, chunksize):
+            chunk = np.asarray(points[i:i + chunksize], dtype=float)
+            if pool is None:
+                value, der = _evaluate(mode, function, options, chunk)
+            else:
+                value, der = pool.value_and_grad(chunk)
+            if i == 0:  # the shapes of the results are known from the first chunk
+                values = _open(values, 'w+', (p,) + value.shape[1:])
+                ders = _open(ders, 'w+', (p,) + der.shape[1:])
+            values[i:i + chunksize] = value
+            ders[i:i + chunksize] = der
+            for output in (values, ders):
+                if isinstance(output, np.memmap):
+                    output.flush()
+            if progress is not None:
+                progress(min(i + chunksize, p), p)
+    finally:
+        if pool is not None:
+            pool.close()
+    return values, ders
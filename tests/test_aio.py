@@ -0,0 +1,87 @@
+"""Test asynchronous evaluation for farad package.
+"""
+
+import asyncio
+import pytest
+import numpy as np
+import farad.elem as Elem
+from concurrent.futures import ThreadPoolExecutor
+from farad.aio import AsyncDiff
+
+
+def f(x, y):
+    calls.append(np.shape(x))
+    return Elem.sin(x) * y + x ** 2
+
+
+calls = []
+
+
+async def requests(engine, points):
+    return await asyncio.gather(*(engine.value_and_grad(point) for point in points))
+
+
+def test_batches():
+    """Test of concurrent requests answered from shared batches."""
+    points = [[0.1 * i, 1.0 + i] for i in range(10)]
+    calls.clear()
+    results = asyncio.run(requests(AsyncDiff(f), points))
+    try:
+        assert calls == [(10,), (10,)]  # one call per parameter for all requests
+        for (x, y), (value, der) in zip(points, results):
+            assert value.shape == () and np.isclose(value, np.sin(x) * y + x ** 2)
+            assert np.allclose(der, [np.cos(x) * y + 2 * x, np.sin(x)])
+    except AssertionError as e:
+        print(e)
+        raise AssertionError
+
+    # full batches are evaluated without waiting for the window
+    calls.clear()
+    engine = AsyncDiff(f, window=60.0, max_batch=5)
+    results = asyncio.run(requests(engine, points))
+    try:
+        assert calls == [(5,)] * 4
+        assert np.allclose(results[7][1], [np.cos(0.7) * 8.0 + 1.4, np.sin(0.7)])
+    except AssertionError as e:
+        print(e)
+        raise AssertionError
+
+
+def test_executor():
+    """Test of batches evaluated by an executor, in reverse mode."""
+    async def main(engine):
+        first = await engine.grad(0.0)  # a batch of one request
+        return [first] + await asyncio.gather(*(engine.grad(x) for x in (1.0, 2.0)))
+
+    with ThreadPoolExecutor(1) as executor:
+        ders = asyncio.run(main(AsyncDiff(Elem.exp, mode='reverse', executor=executor)))
+    try:
+        assert np.allclose(ders, np.exp([0.0, 1.0, 2.0]))
+    except AssertionError as e:
+        print(e)
+        raise AssertionError
+
+
+def test_errors():
+    """Test of errors raised by the requests that cause them only."""
+    async def main(engine, points):
+        return await asyncio.gather(*(engine.grad(point) for point in points), return_exceptions=True)
+
+    calls.clear()
+    results = asyncio.run(main(AsyncDiff(f), [[1.0, 2.0], [1.0], [2.0, 3.0], [[1.0], [2.0, 3.0]]]))
+    ders = asyncio.run(main(AsyncDiff(Elem.log), [1.0, -1.0, 2.0]))
+    try:
+        assert isinstance(results[1], TypeError) and isinstance(results[3], ValueError)  # malformed points
+        assert np.allclose(results[0], [np.cos(1.0) * 2.0 + 2.0, np.sin(1.0)])
+        assert np.allclose(results[2], [np.cos(2.0) * 3.0 + 4.0, np.sin(2.0)])
+        assert calls[:2] == [(2,), (2,)]  # the points of the same shape are still batched
+        assert isinstance(ders[1], ValueError)  # outside the domain, retried alone
+        assert np.allclose([ders[0], ders[2]], [1.0, 0.5])
+    except AssertionError as e:
+        print(e)
+        raise AssertionError
+
+    with pytest.raises(ValueError):
+        AsyncDiff(f, mode='sideways')
+    with pytest.raises(ValueError):
+        AsyncDiff(f, max_batch=0)
@@ -0,0 +1,223 @@
+"""Test the persistent result cache for farad package.
+"""
+
+import pytest
+import threading
+import numpy as np
+from functools import partial
+import farad.elem as Elem
+import farad.driver as ad
+from farad.cache import DiskCache, fingerprint
+
+
+def helper(x):
+    return x ** 2
+
+
+def f(x, y):
+    return helper(x) * y
+
+
+def g(x, y):
+    Calls.points.append(x)
+    return f(x, y)
+
+
+class Calls:
+    """Points g was called at, kept on a class: global lists are part of the fingerprint."""
+    points = []
+
+
+SCALE = 2.0
+
+
+def scaled(x):
+    return SCALE * x * x
+
+
+@Elem.primitive
+def square(x):
+    return x * x
+
+
+def squared(x):
+    return square(x)
+
+
+WEIGHTS = [1.0, 2.0]
+
+
+def weighted(x):
+    return WEIGHTS[0] * x + WEIGHTS[1]
+
+
+def spread(x):
+    return sum([SCALE * xi for xi in x])  # SCALE is read in the comprehension
+
+
+class Scaled:
+    def __init__(self, c):
+        self.c = c
+
+    def __call__(self, x):
+        return self.c * x
+
+    def squared(self, x):
+        return self.c * x * x
+
+
+def test_fingerprint():
+    """Test of function fingerprints following code, constants and closures."""
+    def scaled(c):
+        return lambda x: c * Elem.sin(x)
+
+    try:
+        assert fingerprint(f) == fingerprint(f)
+        assert fingerprint(lambda x: x + 1.0) != fingerprint(lambda x: x + 2.0)
+        assert fingerprint(lambda x: x + 1.0) != fingerprint(lambda x: x - 1.0)
+        assert fingerprint(scaled(2.0)) == fingerprint(scaled(2.0))
+        assert fingerprint(scaled(2.0)) != fingerprint(scaled(3.0))
+        assert fingerprint(lambda x: Elem.sin(x)) != fingerprint(lambda x: Elem.cos(x))
+        assert fingerprint([f, f]) != fingerprint([f])
+        assert fingerprint(partial(f, 1.0)) != fingerprint(partial(f, 5.0))
+        assert fingerprint(partial(f, 1.0)) != fingerprint(partial(g, 1.0))
+        assert fingerprint(Scaled(1.0).squared) != fingerprint(Scaled(3.0).squared)
+        assert fingerprint(Scaled(1.0)) == fingerprint(Scaled(1.0)) != fingerprint(Scaled(7.0))
+        assert fingerprint(lambda x: {'c': 1.0}) != fingerprint(lambda x: {'c': 2.0})
+    except AssertionError as e:
+        print(e)
+        raise AssertionError
+    with pytest.raises(TypeError):
+        lock = threading.Lock()
+        fingerprint(lambda x: lock)
+
+    # state read from global names, in comprehensions too, and captured containers
+    global SCALE
+    spread_before, weighted_before = fingerprint(spread), fingerprint(weighted)
+    state = {'c': 1.0}
+    closure = lambda x: state['c'] * x
+    closure_before = fingerprint(closure)
+    try:
+        SCALE = 3.0
+        WEIGHTS.append(3.0)
+        state['c'] = 2.0
+        assert fingerprint(spread) != spread_before
+        assert fingerprint(weighted) != weighted_before
+        assert fingerprint(closure) != closure_before
+    except AssertionError as e:
+        print(e)
+        raise AssertionError
+    finally:
+        SCALE = 2.0
+        WEIGHTS.pop()
+
+    global helper
+    before = fingerprint(f)
+    original, helper = helper, lambda x: x ** 3
+    try:
+        assert fingerprint(f) != before  # functions called by global name are included
+    except AssertionError as e:
+        print(e)
+        raise AssertionError
+    finally:
+        helper = original
+
+    # primitives are fingerprinted by their value function
+    global square
+    before = fingerprint(squared)
+    original, square = square, Elem.primitive(lambda x: x * x * x)
+    try:
+        assert fingerprint(squared) != before
+        assert fingerprint(lambda x: Elem.Primitive(np.sin)(x)) != fingerprint(lambda x: Elem.Primitive(np.cos)(x))
+    except AssertionError as e:
+        print(e)
+        raise AssertionError
+    finally:
+        square = original
+
+
+def test_cache(tmp_path):
+    """Test of hits, misses, persistence and the keys of entries."""
+    points = [[1.0, 2.0], [3.0, 4.0]]
+    cache = DiskCache(tmp_path)
+    values, ders = cache.value_and_grad(ad.AutoDiff(f), points)
+    again = cache.value_and_grad(ad.AutoDiff(f), points)
+    try:
+        assert (cache.hits, cache.misses) == (1, 1)
+        assert isinstance(again[1], np.memmap) and not again[1].flags.writeable
+        assert np.array_equal(again[0], [2.0, 36.0]) and np.array_equal(again[1], [[4.0, 1.0], [24.0, 9.0]])
+    except AssertionError as e:
+        print(e)
+        raise AssertionError
+
+    # another process, or run, finds the entry; other inputs and settings miss
+    cache = DiskCache(tmp_path)
+    Calls.points.clear()
+    try:
+        cache.value_and_grad(ad.AutoDiff(f), points)
+        assert cache.hits == 1 and len(cache) == 1
+        cache.value_and_grad(ad.AutoDiff(f), [[1.0, 2.0], [3.0, 5.0]])
+        reverse = cache.value_and_grad(ad.RAutoDiff(f), points, wrt=[1])
+        assert np.array_equal(reverse[1], [[1.0], [9.0]])
+        cache.value_and_grad(ad.RAutoDiff(g), points, wrt=[1])
+        cache.value_and_grad(ad.RAutoDiff(g), points, wrt=[1])
+        assert len(Calls.points) == 2 and cache.misses == 3 and len(cache) == 4
+        cache.clear()
+        assert len(cache) == 0 and sorted(p.name for p in tmp_path.iterdir()) == ['index.sqlite']
+    except AssertionError as e:
+        print(e)
+        raise AssertionError
+
+    with pytest.raises(TypeError):
+        cache.value_and_grad(f, points)
+
+    # partial functions, bound methods and callable instances are keyed by content
+    cache = DiskCache(tmp_path / 'callables')
+    try:
+        assert cache.value_and_grad(ad.AutoDiff(partial(f, 1.0)), 1.0)[0] == 1.0
+        assert cache.value_and_grad(ad.AutoDiff(partial(f, 5.0)), 1.0)[0] == 25.0
+        assert cache.value_and_grad(ad.AutoDiff(Scaled(1.0).squared), 1.0)[1] == 2.0
+        assert cache.value_and_grad(ad.AutoDiff(Scaled(3.0).squared), 1.0)[1] == 6.0
+        assert cache.value_and_grad(ad.AutoDiff(Scaled(1.0)), 1.0)[1] == 1.0
+        assert cache.value_and_grad(ad.AutoDiff(Scaled(7.0)), 1.0)[1] == 7.0
+        assert cache.hits == 0
+    except AssertionError as e:
+        print(e)
+        raise AssertionError
+
+    # numbers read from global names are part of the key
+    global SCALE
+    cache = DiskCache(tmp_path / 'globals')
+    try:
+        assert cache.value_and_grad(ad.AutoDiff(scaled), 1.0)[1] == 4.0
+        SCALE = 5.0
+        assert cache.value_and_grad(ad.AutoDiff(scaled), 1.0)[1] == 10.0
+        assert cache.value_and_grad(ad.AutoDiff(scaled), 1.0)[1] == 10.0
+        assert (cache.hits, cache.misses) == (1, 2) and len(cache) == 2
+    except AssertionError as e:
+        print(e)
+        raise AssertionError
+    finally:
+        SCALE = 2.0
+
+
+def test_eviction(tmp_path):
+    """Test of least recently used entries evicted above the size limit."""
+    driver = ad.RAutoDiff(Elem.exp)
+    entry = 2 * (128 + 8 * 100)  # two .npy files of 100 float64
+    cache = DiskCache(tmp_path, max_bytes=3 * entry)
+    batches = [np.arange(100.0) + i for i in range(4)]
+    for x in batches[:3]:
+        cache.value_and_grad(driver, x)
+    cache.value_and_grad(driver, batches[0])  # used again, so batches[1] is the oldest
+    cache.value_and_grad(driver, batches[3])
+    try:
+        assert len(cache) == 3 and cache.hits == 1
+        cache.value_and_grad(driver, batches[0])
+        cache.value_and_grad(driver, batches[1])
+        assert cache.hits == 2 and cache.misses == 5
+        values, ders = DiskCache(tmp_path, max_bytes=100).value_and_grad(driver, np.arange(50.0))
+        assert not isinstance(ders, np.memmap) and np.allclose(ders, np.exp(np.arange(50.0)))
+    except AssertionError as e:
+        print(e)
+        raise AssertionError
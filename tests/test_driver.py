@@ -2,6 +2,7 @@
 """
 
 import pytest
+from itertools import count, islice
 import numpy as np
 import farad.elem as Elem
 from farad.dual import Dual
@@ -32,8 +33,8 @@ def test_values():
     f = ad.AutoDiff(function, dim=2)
 
     try:
-        assert f.values([3, 2]) == [9, 1.5]
-        assert f.values([[3, 2],[3,2]]) == [[9, 1.5], [9, 1.5]]
+        assert np.array_equal(f.values([3, 2]), [9, 1.5])
+        assert np.array_equal(f.values([[3, 2],[3,2]]), [[9, 1.5], [9, 1.5]])
     except AssertionError as e:
         print(e)
         raise AssertionError
@@ -63,8 +64,8 @@ def test_forward():
     f = ad.AutoDiff(function, dim=2)
 
     try:
-        assert f.forward([3, 2]) == [[3, 3], [0.5, -0.75]]
-        assert f.forward([[3, 2],[3,2]]) == [[[3, 3], [0.5, -0.75]], [[3, 3], [0.5, -0.75]]]
+        assert np.array_equal(f.forward([3, 2]), [[3, 3], [0.5, -0.75]])
+        assert np.array_equal(f.forward([[3, 2],[3,2]]), [[[3, 3], [0.5, -0.75]], [[3, 3], [0.5, -0.75]]])
     except AssertionError as e:
         print(e)
         raise AssertionError
@@ -196,3 +197,494 @@ def test_get_forwardpass():
         function.forwardpass([1,2])
     assert "all input functions must contain the same parameters" in str(excinfo.value)
     function = ad.RAutoDiff([f2d2, f2d3])
+
+
+def test_forwardpass_wrt():
+    """Test of forwardpass restricted to a subset of the inputs."""
+    def f(x, y, z):
+        return x * y + z ** 2
+
+    function = ad.RAutoDiff(f)
+    function.forwardpass([2, 3, 4], wrt=[0, 2])
+    try:
+        assert function.values() == 22
+        assert np.array_equal(function.reverse(), [3, 8])
+    except AssertionError as e:
+        print(e)
+        raise AssertionError
+
+    function.forwardpass([[2, 3, 4], [1, 1, 1]], wrt=[1])
+    try:
+        assert np.array_equal(function.reverse(), [[2], [1]])
+    except AssertionError as e:
+        print(e)
+        raise AssertionError
+
+    with pytest.raises(TypeError) as excinfo:
+        function.forwardpass([2, 3, 4], wrt=[3])
+    assert "wrt index out of range" in str(excinfo.value)
+
+
+def test_forwardpass_vectorized():
+    """Test of forwardpass with the vectorized reverse sweep."""
+    def f(x, y, z):
+        return x * y + z ** 2 + Elem.sin(x)
+
+    function = ad.RAutoDiff(f, vectorized=True)
+    function.forwardpass([[2, 3, 4], [1, 1, 1]])
+    try:
+        assert np.allclose(function.reverse(), [[3 + np.cos(2), 2, 8], [1 + np.cos(1), 1, 2]])
+    except AssertionError as e:
+        print(e)
+        raise AssertionError
+
+
+def test_update():
+    """Test of update method, i.e., incremental re-evaluation of recorded graphs"""
+    def f1(x, y):
+        return Elem.sin(x) * y + y ** 2
+
+    def f2(x, y):
+        return x * y
+
+    function = ad.RAutoDiff([f1, f2], replay=True)
+    function.forwardpass([[1, 2], [3, 4]])
+    function.update([[1, 5], [3, 4]])
+    reference = ad.RAutoDiff([f1, f2])
+    reference.forwardpass([[1, 5], [3, 4]])
+    try:
+        assert np.allclose(function.values(), reference.values())
+        assert np.allclose(function.reverse(), reference.reverse())
+    except AssertionError as e:
+        print(e)
+        raise AssertionError
+
+    function = ad.RAutoDiff(Elem.exp, replay=True)
+    function.forwardpass([1.0, 2.0])
+    function.update([1.0, 3.0])
+    try:
+        assert np.allclose(function.values(), np.exp([1.0, 3.0]))
+        assert np.allclose(function.reverse(), np.exp([1.0, 3.0]))
+    except AssertionError as e:
+        print(e)
+        raise AssertionError
+
+    with pytest.raises(TypeError) as excinfo:
+        function.update([1.0, 2.0, 3.0])
+    assert "input dimension size mismatch" in str(excinfo.value)
+
+    with pytest.raises(RuntimeError) as excinfo:
+        ad.RAutoDiff(Elem.exp, replay=True).update(1.0)
+    assert "forwardpass needs to be called" in str(excinfo.value)
+
+    # graphs are only recorded on request
+    function = ad.RAutoDiff(Elem.exp)
+    function.forwardpass([1.0, 2.0])
+    with pytest.raises(RuntimeError) as excinfo:
+        function.update([1.0, 3.0])
+    assert "replay=True" in str(excinfo.value)
+
+
+def test_grad():
+    """Test of grad function, including nested (higher order) derivatives."""
+    try:
+        assert np.isclose(ad.grad(Elem.sin)(1.0), np.cos(1.0))
+        assert np.isclose(ad.grad(ad.grad(Elem.sin))(1.0), -np.sin(1.0))
+        assert np.isclose(ad.grad(ad.grad(ad.grad(lambda x: x ** 4)))(2.0), 48.0)
+        assert ad.grad(lambda x: 3.0)(1.0) == 0.0
+    except AssertionError as e:
+        print(e)
+        raise AssertionError
+
+    # reverse-over-reverse Hessian
+    def f(x, y):
+        return x * y ** 2 + Elem.log(x) * Elem.arcsin(y)
+
+    hessian = [ad.grad(lambda x, y, i=i: ad.grad(f)(x, y)[i])(2.0, 0.5) for i in range(2)]
+    fxy = 1.0 + 0.5 / np.sqrt(0.75)
+    try:
+        assert np.allclose(hessian, [[-np.arcsin(0.5) / 4, fxy],
+                                     [fxy, 4.0 + np.log(2.0) * 0.5 / 0.75 ** 1.5]])
+    except AssertionError as e:
+        print(e)
+        raise AssertionError
+
+    # nested levels are tagged, avoiding perturbation confusion
+    try:
+        assert ad.grad(lambda x: x * ad.grad(lambda y: x + y)(1.0))(3.0) == 1.0
+        assert ad.grad(lambda x: ad.grad(lambda y: x * y)(2.0))(5.0) == 1.0
+    except AssertionError as e:
+        print(e)
+        raise AssertionError
+
+
+def test_primitive():
+    """Test of user-registered primitives in the drivers."""
+    from farad import primitive
+
+    calls = []
+
+    @primitive
+    def interp(x):
+        calls.append(x)
+        return np.interp(x, [0.0, 1.0, 2.0], [0.0, 2.0, 3.0])
+
+    interp.defjvp(lambda t, ans, x: np.where(x < 1.0, 2.0, 1.0) * t)
+    interp.defvjp(lambda g, ans, x: np.where(x < 1.0, 2.0, 1.0) * g)
+
+    def f(x, y):
+        return interp(x) * y
+
+    forward = ad.AutoDiff(f)
+    reverse = ad.RAutoDiff(f, replay=True)
+    reverse.forwardpass([[0.5, 3.0]])
+    try:
+        assert np.allclose(forward.forward([0.5, 3.0]), [6.0, 1.0])
+        assert np.allclose(reverse.reverse(), [6.0, 1.0])
+        assert np.isclose(ad.grad(f)(1.5, 2.0)[0], 2.0)
+    except AssertionError as e:
+        print(e)
+        raise AssertionError
+
+    # re-evaluation replays the primitive on the new inputs
+    reverse.update([[1.5, 3.0]])
+    try:
+        assert np.isclose(reverse.values(), 7.5)
+        assert np.allclose(reverse.reverse(), [3.0, 2.5])
+        assert calls[-1] == 1.5
+    except AssertionError as e:
+        print(e)
+        raise AssertionError
+
+
+def test_array_input():
+    """Test of functions of a single array parameter in both drivers."""
+    import farad.linalg as La
+
+    def f(x):
+        y = x[0] * x[1]  # a local variable does not count as a parameter
+        return y + La.sum(x[1:] ** 2)
+
+    x = np.array([2.0, 3.0, 4.0])
+    expected = np.array([3.0, 2.0 + 6.0, 8.0])
+    forward = ad.AutoDiff(f, array_input=True)
+    reverse = ad.RAutoDiff(f, array_input=True, replay=True)
+    reverse.forwardpass(x)
+    try:
+        assert forward.length == 1
+        assert forward.values(x) == 31.0
+        assert isinstance(forward.forward(x), np.ndarray)
+        assert np.allclose(forward.forward(x), expected)
+        assert reverse.values() == 31.0
+        assert isinstance(reverse.reverse(), np.ndarray)
+        assert np.allclose(reverse.reverse(), expected)
+        assert np.allclose(ad.grad(f)(x), expected)
+    except AssertionError as e:
+        print(e)
+        raise AssertionError
+
+    # re-evaluation of the recorded graph
+    reverse.update([1.0, 3.0, 4.0])
+    try:
+        assert reverse.values() == 28.0
+        assert np.allclose(reverse.reverse(), [3.0, 7.0, 8.0])
+    except AssertionError as e:
+        print(e)
+        raise AssertionError
+
+    # matrix parameter, vector and list outputs
+    A = np.array([[1.0, 2.0], [3.0, 4.0]])
+    W = np.array([[0.5, -1.0], [2.0, 1.0]])
+    reverse = ad.RAutoDiff([lambda M: La.sum(M * W), lambda M: La.norm(M)], array_input=True)
+    reverse.forwardpass(A)
+    try:
+        assert np.allclose(ad.AutoDiff(lambda M: M[:, 0] * 2.0, array_input=True).forward(A),
+                           [[[2.0, 0.0], [0.0, 0.0]], [[0.0, 0.0], [2.0, 0.0]]])
+        assert np.allclose(ad.AutoDiff(lambda M: [M[0, 1], 3.0], array_input=True).forward(A),
+                           [[[0.0, 1.0], [0.0, 0.0]], np.zeros((2, 2))])
+        assert np.allclose(ad.AutoDiff(lambda M: [M[0, 1], 3.0], array_input=True).values(A), [2.0, 3.0])
+        assert reverse.reverse().shape == (2, 2, 2)
+        assert np.allclose(reverse.reverse()[0], W)
+        assert np.allclose(reverse.reverse()[1], A / np.linalg.norm(A))
+    except AssertionError as e:
+        print(e)
+        raise AssertionError
+
+    with pytest.raises(TypeError) as excinfo:
+        ad.RAutoDiff(lambda x: x * 2.0, array_input=True).forwardpass(x)
+    assert "scalar function output" in str(excinfo.value)
+
+    with pytest.raises(TypeError) as excinfo:
+        ad.RAutoDiff(lambda x, y: x * y, array_input=True).forwardpass(x)
+    assert "one parameter" in str(excinfo.value)
+
+
+def test_output_arrays():
+    """Test of the shapes of the driver outputs and of preallocated out= buffers."""
+    f = lambda x, y: [x * y, x + y]
+    forward = ad.AutoDiff(f, dim=2)
+    reverse = ad.RAutoDiff([lambda x, y: x * y, lambda x, y: x + y])
+    points = [[1.0, 2.0], [3.0, 4.0], [5.0, 6.0]]
+    reverse.forwardpass(points)
+    results = [forward.values(points), forward.forward(points), reverse.values(), reverse.reverse(),
+               ad.AutoDiff(Elem.exp).values(1.0), ad.AutoDiff(Elem.exp).forward([1.0, 2.0])]
+    try:
+        for result in results:
+            assert isinstance(result, np.ndarray)
+            assert result.dtype == np.float64
+            assert result.flags.c_contiguous
+        assert [result.shape for result in results] == [(3, 2), (3, 2, 2), (3, 2), (3, 2, 2), (), (2,)]
+        assert np.array_equal(results[1], results[3])
+    except AssertionError as e:
+        print(e)
+        raise AssertionError
+
+    # results are written into the buffers, which are returned
+    values, ders = np.empty((3, 2)), np.empty((3, 2, 2))
+    reverse.forwardpass(points, out=(values, ders))
+    buffer = np.empty((3, 2, 2))
+    try:
+        assert forward.forward(points, out=buffer) is buffer
+        assert reverse.values() is values and reverse.reverse() is ders
+        assert np.array_equal(buffer, ders)
+        assert np.array_equal(values, [[2.0, 3.0], [12.0, 7.0], [30.0, 11.0]])
+    except AssertionError as e:
+        print(e)
+        raise AssertionError
+
+    with pytest.raises(ValueError) as excinfo:
+        forward.forward(points, out=np.empty((3, 2)))
+    assert "out must be a C-contiguous float64 array of shape (3, 2, 2)" in str(excinfo.value)
+
+    with pytest.raises(ValueError):
+        forward.values(points, out=np.empty((2, 3)).T)
+
+
+def test_value_and_grad():
+    """Test of the fused value and derivative methods and of their cache."""
+    calls = []
+
+    def f(x, y):
+        calls.append((x, y))
+        return [x * y ** 2, Elem.sin(x)]
+
+    forward = ad.AutoDiff(f, dim=2)
+    value, der = forward.value_and_grad([[3.0, 2.0], [1.0, 1.0]])
+    try:
+        assert len(calls) == 2  # one pass per parameter on arrays of all points
+        assert np.allclose(value, [[12.0, np.sin(3.0)], [1.0, np.sin(1.0)]])
+        assert np.allclose(der, [[[4.0, 12.0], [np.cos(3.0), 0.0]], [[1.0, 2.0], [np.cos(1.0), 0.0]]])
+        assert forward.value_and_jacobian == forward.value_and_grad
+    except AssertionError as e:
+        print(e)
+        raise AssertionError
+
+    # functions that cannot take arrays are evaluated point by point
+    branching = ad.AutoDiff(lambda x, y: x * y if x > 0 else -x).value_and_grad([[2.0, 3.0], [-1.0, 5.0]])
+    try:
+        assert np.array_equal(branching[0], [6.0, 1.0]) and np.array_equal(branching[1], [[3.0, 2.0], [-1.0, 0.0]])
+    except AssertionError as e:
+        print(e)
+        raise AssertionError
+
+    # values at the same input are cached, other inputs are evaluated
+    try:
+        assert np.array_equal(forward.values([[3.0, 2.0], [1.0, 1.0]]), value)
+        assert len(calls) == 2
+        assert np.allclose(forward.values([[3.0, 1.0], [1.0, 1.0]])[0], [3.0, np.sin(3.0)])
+        assert len(calls) == 3  # one call on arrays of all points
+        assert np.allclose(forward.values([[3.0, 2.0], [1.0, 1.0]]), value)
+        assert len(calls) == 4
+    except AssertionError as e:
+        print(e)
+        raise AssertionError
+
+    # array parameter and out buffers
+    buffers = np.empty(()), np.empty(3)
+    forward = ad.AutoDiff(lambda x: x[0] * x[1] * x[2], array_input=True)
+    try:
+        assert forward.value_and_grad([1.0, 2.0, 3.0], out=buffers)[1] is buffers[1]
+        assert buffers[0] == 6.0 and np.array_equal(buffers[1], [6.0, 3.0, 2.0])
+        # the cached values are private copies, not the out buffers
+        buffers[0][...] = -1.0
+        assert forward.values([1.0, 2.0, 3.0]) == 6.0
+        returned = forward.values([1.0, 2.0, 3.0])
+        returned[...] = 99.0
+        assert forward.values([1.0, 2.0, 3.0]) == 6.0
+        forward.vals[...] = 99.0
+        assert forward.values([1.0, 2.0, 3.0]) == 6.0
+        forward.values([2.0, 2.0, 3.0], out=buffers[0])
+        buffers[0][...] = -1.0
+        assert forward.vals == 12.0
+        # the private copies are reused by later calls with out buffers
+        kept = forward._local.last
+        forward.value_and_grad([3.0, 2.0, 1.0], out=buffers)
+        assert all(a is b for a, b in zip(forward._local.last[1:], kept[1:]))
+        assert forward.values([3.0, 2.0, 1.0]) == 6.0 and np.array_equal(forward.ders, [2.0, 3.0, 6.0])
+    except AssertionError as e:
+        print(e)
+        raise AssertionError
+
+    reverse = ad.RAutoDiff(lambda x, y: x * y ** 2)
+    value, der = reverse.value_and_grad([[3.0, 2.0], [1.0, 1.0]], wrt=[1])
+    try:
+        assert np.array_equal(value, [12.0, 1.0]) and np.array_equal(der, [[12.0], [2.0]])
+        assert reverse.values() is value and reverse.reverse() is der
+    except AssertionError as e:
+        print(e)
+        raise AssertionError
+
+    # function version, with a single evaluation
+    calls.clear()
+    try:
+        assert ad.value_and_grad(lambda x, y: f(x, y)[0])(3.0, 2.0) == (12.0, [4.0, 12.0])
+        assert len(calls) == 1
+        assert ad.value_and_grad(lambda x: 3.0)(1.0) == (3.0, 0.0)
+        assert ad.grad(lambda x: ad.value_and_grad(lambda y: x * y ** 2)(2.0)[0])(3.0) == 4.0
+    except AssertionError as e:
+        print(e)
+        raise AssertionError
+
+
+def test_values_vectorized():
+    """Test of the primal-only evaluation of AutoDiff.values on arrays of points."""
+    calls = []
+
+    def f(x, y):
+        calls.append((x, y))
+        return Elem.log(x) * y + Elem.tanh(x * y)
+
+    points = [[0.5, 1.0], [1.0, 2.0], [2.0, -1.0]]
+    expected = [np.log(x) * y + np.tanh(x * y) for x, y in points]
+    try:
+        assert np.allclose(ad.AutoDiff(f).values(points), expected)
+        assert len(calls) == 1
+        assert isinstance(calls[0][0], np.ndarray) and not isinstance(calls[0][0], Dual)
+        assert type(ad.AutoDiff(f).values(points[0])) is np.ndarray
+        assert isinstance(calls[1][0], float)
+    except AssertionError as e:
+        print(e)
+        raise AssertionError
+
+    # functions that branch on their inputs, reduce or are constant are evaluated per point
+    points = [-1.0, 0.5, 2.0]
+    try:
+        assert np.array_equal(ad.AutoDiff(lambda x: x if x > 0 else -x).values(points), [1.0, 0.5, 2.0])
+        assert np.array_equal(ad.AutoDiff(lambda x: np.sum(x) * 2.0).values(points), [-2.0, 1.0, 4.0])
+        assert np.array_equal(ad.AutoDiff(lambda x: 3.0).values(points), [3.0, 3.0, 3.0])
+        assert np.array_equal(ad.AutoDiff(lambda x: [x, 1.0], dim=2).values(points), [[-1.0, 1.0], [0.5, 1.0], [2.0, 1.0]])
+    except AssertionError as e:
+        print(e)
+        raise AssertionError
+
+    # plain values follow NumPy out of the domain, as farad.elem does
+    with np.errstate(invalid='ignore'):
+        values = ad.AutoDiff(Elem.log).values([1.0, -1.0])
+    try:
+        assert values[0] == 0.0 and np.isnan(values[1])
+    except AssertionError as e:
+        print(e)
+        raise AssertionError
+
+
+def test_threads():
+    """Test of drivers shared between threads, and of reentrant calls."""
+    from concurrent.futures import ThreadPoolExecutor
+
+    def f(x, y):
+        return Elem.sin(x) * y + x ** 2
+
+    forward = ad.AutoDiff(f)
+    reverse = ad.RAutoDiff(f, replay=True)
+
+    def work(i):
+        point = [0.1 * i, 1.0 + i]
+        results = []
+        for _ in range(20):
+            value, der = forward.value_and_grad(point)
+            reverse.forwardpass(point)
+            reverse.update([0.1 * i, 2.0 + i])
+            results.append((value, der, forward.values(point), reverse.values(), reverse.reverse()))
+        return results
+
+    with ThreadPoolExecutor(8) as pool:
+        outcomes = list(pool.map(work, range(32)))
+    try:
+        for i, results in enumerate(outcomes):
+            x, y = 0.1 * i, 1.0 + i
+            for value, der, value2, rvalue, rder in results:
+                assert np.isclose(value, np.sin(x) * y + x ** 2) and value2 == value
+                assert np.allclose(der, [np.cos(x) * y + 2 * x, np.sin(x)])
+                assert np.isclose(rvalue, np.sin(x) * (y + 1) + x ** 2)
+                assert np.allclose(rder, [np.cos(x) * (y + 1) + 2 * x, np.sin(x)])
+        assert reverse.values() is None  # nothing was computed in this thread
+    except AssertionError as e:
+        print(e)
+        raise AssertionError
+
+    # a function calling the driver that evaluates it
+    def g(x, y):
+        calls.append(x)
+        if len(calls) == 1:
+            inner.forwardpass([2.0, 3.0])
+        return x * y
+
+    calls = []
+    inner = ad.RAutoDiff(g)
+    value, der = inner.value_and_grad([[1.0, 5.0], [2.0, 7.0]])
+    try:
+        assert np.array_equal(value, [5.0, 14.0]) and np.array_equal(der, [[5.0, 1.0], [7.0, 2.0]])
+        assert np.array_equal(inner.values(), [5.0, 14.0])
+    except AssertionError as e:
+        print(e)
+        raise AssertionError
+
+
+def test_streams():
+    """Test of iforward and ireverse over lazily consumed streams of points."""
+    taken = []
+
+    def feed():  # an unbounded stream, recording how far it was consumed
+        for i in count():
+            taken.append(i)
+            yield [0.1 * i, 1.0 + i]
+
+    f = lambda x, y: Elem.sin(x) * y + x ** 2
+    ders = ad.AutoDiff(f).iforward(feed(), batch_size=4)
+    first = next(ders)
+    try:
+        assert len(taken) == 4  # one batch only
+        assert np.allclose(first, [1.0, 0.0])
+        for i, der in enumerate(islice(ders, 5), 1):
+            x, y = 0.1 * i, 1.0 + i
+            assert der.shape == (2,) and np.allclose(der, [np.cos(x) * y + 2 * x, np.sin(x)])
+        assert len(taken) == 8
+    except AssertionError as e:
+        print(e)
+        raise AssertionError
+
+    ders = ad.RAutoDiff(f, vectorized=True).ireverse(feed(), wrt=[1], batch_size=3)
+    try:
+        assert np.allclose(list(islice(ders, 7)), [[np.sin(0.1 * i)] for i in range(7)])
+    except AssertionError as e:
+        print(e)
+        raise AssertionError
+
+    # single scalar parameters, uneven last batch, and array inputs
+    try:
+        ders = list(ad.AutoDiff(Elem.exp).iforward([0.0, 1.0, 2.0], batch_size=2))
+        assert all(der.shape == () for der in ders) and np.allclose(ders, np.exp([0.0, 1.0, 2.0]))
+        ders = list(ad.RAutoDiff([Elem.exp, Elem.sin]).ireverse([0.0], batch_size=5))
+        assert len(ders) == 1 and np.allclose(ders[0], [1.0, 1.0])
+        ders = list(ad.RAutoDiff(lambda x: x[0] * x[1], array_input=True).ireverse([[1.0, 2.0], [3.0, 4.0]]))
+        assert np.allclose(ders, [[2.0, 1.0], [4.0, 3.0]])
+        ders = list(ad.AutoDiff(lambda x: x[0] * x[1], array_input=True).iforward(iter([[1.0, 2.0]])))
+        assert np.allclose(ders, [[2.0, 1.0]])
+    except AssertionError as e:
+        print(e)
+        raise AssertionError
+
+    with pytest.raises(ValueError):
+        ad.AutoDiff(f).iforward(feed(), batch_size=0)
+    with pytest.raises(ValueError):
+        ad.RAutoDiff(f).ireverse(feed(), batch_size=2.5)
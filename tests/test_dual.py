@@ -388,12 +388,77 @@ def test_str():
 
 def test_len():
     """Test of the length special method (__len__) of Dual class."""
-    # Test for string special method with scalar Dual objects
-    x = Dual(2)
-    y = Dual(2, [0, 1])
+    # Test for length special method with array-valued Dual objects
+    x = Dual(np.array([2.0, 3.0]))
+    y = Dual(np.array([2.0, 3.0, 4.0]), np.eye(3))
+    try:
+        assert len(x) == 2
+        assert len(y) == 3
+    except AssertionError as e:
+        print(e)
+        raise AssertionError
+
+    # scalar Dual objects have no length, as 0-d NumPy arrays
+    with pytest.raises(TypeError):
+        len(Dual(2, [0, 1]))
+
+
+def test_numpy_dispatch():
+    """Test of NumPy ufuncs and array functions applied to Dual objects."""
+    # ufuncs are routed to farad rules
+    x = Dual(0.5)
+    fx = np.sin(x) * np.exp(x) + np.float64(2.0) * x
+    try:
+        assert isinstance(fx, Dual)
+        assert np.isclose(fx.der, np.cos(0.5) * np.exp(0.5) + np.sin(0.5) * np.exp(0.5) + 2.0)
+    except AssertionError as e:
+        print(e)
+        raise AssertionError
+
+    # array-valued Dual with one seed direction per element
+    x = Dual(np.array([0.5, 1.0, 2.0]), np.eye(3))
+    fx = np.sum(np.log(x) * 3.0 + np.array([1.0, 2.0, 3.0]) * x ** 2)
+    try:
+        assert np.isclose(fx.val, np.sum(3 * np.log([0.5, 1.0, 2.0]) + [0.25, 2.0, 12.0]))
+        assert np.allclose(fx.der, [7.0, 7.0, 13.5])
+    except AssertionError as e:
+        print(e)
+        raise AssertionError
+
+    # products, against a single seed direction and against several
+    A = np.array([[1.0, 2.0], [3.0, 4.0], [5.0, 6.0]])
+    b = np.array([1.0, 1.0, 2.0])
+    for seed in (np.array([1.0, 0.0]), np.eye(2)):
+        w = Dual(np.array([0.5, -1.0]), seed)
+        fx = np.dot(b, np.tanh(A @ w))
+        try:
+            assert np.isclose(fx.val, np.dot(b, np.tanh(A @ [0.5, -1.0])))
+            assert np.allclose(fx.der, seed @ (A.T @ (b / np.cosh(A @ [0.5, -1.0]) ** 2)))
+        except AssertionError as e:
+            print(e)
+            raise AssertionError
+
+    # unsupported ufuncs raise TypeError
+    with pytest.raises(TypeError):
+        np.floor(Dual(1.5))
+
+
+def test_getitem():
+    """Test of indexing and slicing (__getitem__) of array-valued Dual objects."""
+    x = Dual(np.arange(6.0).reshape(2, 3), np.eye(6).reshape(6, 2, 3))
     try:
-        assert len(x) == 1
-        assert len(y) == 1
+        assert x[1, 2].val == 5.0
+        assert np.all(x[1, 2].der == np.eye(6)[5])
+        assert np.all(x[:, 0].val == [0.0, 3.0])
+        assert x[:, 0].der.shape == (6, 2)
+        assert np.all(Dual(np.array([1.0, 2.0]), 3.0)[1].der == 3.0)
+        a, b = Dual(np.array([1.0, 2.0]), np.array([4.0, 5.0]))
+        assert a.der == 4.0 and b.der == 5.0
     except AssertionError as e:
         print(e)
         raise AssertionError
+
+    with pytest.raises(TypeError):
+        Dual(1.0, 1.0)[0]
+    with pytest.raises(IndexError):
+        Dual(np.array([1.0, 2.0]))[2]
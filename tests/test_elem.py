@@ -5,7 +5,7 @@ import pytest
 import numpy as np
 import farad.elem as Elem
 from farad.dual import Dual
-from farad.rnode import Rnode
+from farad.rnode import Rnode, gradient
 
 
 def test_sin():
@@ -350,7 +350,7 @@ def test_tanh():
 
     try:
         assert z.val == np.tanh(val.val)
-        assert np.all(z.der == der)
+        assert np.allclose(z.der, der)
 
     except AssertionError as e:
         print(e)
@@ -477,9 +477,10 @@ def test_logistic():
     # Test for logistic with two Dual objects
     x = Dual(3, [4, 1])
     z = Elem.logistic(x)
-    result = (1 / (1 + np.exp(-x.val)), np.exp(x.val) / ((1 + np.exp(x.val)) ** 2))
+    der = np.exp(x.val) / ((1 + np.exp(x.val)) ** 2) * np.asarray(x.der)
     try:
-        assert z == result
+        assert z.val == 1 / (1 + np.exp(-x.val))
+        assert np.allclose(z.der, der)
 
     except AssertionError as e:
         print(e)
@@ -582,8 +583,8 @@ def test_sqrt():
 
     try:
         assert z.val == np.sqrt(x.val)
-        assert z.der[0] == result.der[0]
-        assert z.der[1] == result.der[1]
+        assert np.isclose(z.der[0], result.der[0])
+        assert np.isclose(z.der[1], result.der[1])
 
     except AssertionError as e:
         print(e)
@@ -758,3 +759,225 @@ def test_arctan():
     except AssertionError as e:
         print(e)
         raise AssertionError
+
+
+def test_dispatch():
+    """Test of the type-keyed dispatch of elem primitives."""
+    # plain values go to the value rule, arrays elementwise
+    x = np.array([0.5, 1.0, 2.0])
+    try:
+        assert np.all(Elem.log(x) == np.log(x))
+        assert np.all(Elem.relu(np.array([-1.0, 2.0])) == [0.0, 2.0])
+        assert np.all(Elem.relu6(np.array([-1.0, 2.0, 7.0])) == [0.0, 2.0, 6.0])
+    except AssertionError as e:
+        print(e)
+        raise AssertionError
+
+    # subclasses of Dual and Rnode follow the rule of their base class
+    class Seed(Dual):
+        pass
+
+    z = Elem.exp(Seed(1.0, 2.0))
+    try:
+        assert isinstance(z, Dual)
+        assert z.der == 2 * np.exp(1.0)
+    except AssertionError as e:
+        print(e)
+        raise AssertionError
+
+    # domain checks apply to both modes
+    with pytest.raises(ValueError, match=r".* sqrt .*"):
+        Elem.arcsin(Dual(1.0))
+    with pytest.raises(ValueError, match=r".* logarithm .*"):
+        Elem.log(Rnode(np.array([1.0, -1.0])))
+
+
+def test_primitive():
+    """Test of user-registered primitives with custom JVP and VJP rules."""
+    from farad import primitive
+
+    # linear solve A x = b, differentiated with respect to b only
+    @primitive
+    def solve(A, b):
+        return np.linalg.solve(A, b)
+
+    solve.defjvp(None, lambda t, ans, A, b: np.linalg.solve(A, t.T).T)
+    solve.defvjp(None, lambda g, ans, A, b: np.linalg.solve(A.T, g))
+
+    A = np.array([[3.0, 1.0], [1.0, 2.0]])
+    b = np.array([1.0, 2.0])
+    try:
+        assert solve.__name__ == 'solve'
+        assert np.allclose(solve(A, b), np.linalg.solve(A, b))
+    except AssertionError as e:
+        print(e)
+        raise AssertionError
+
+    # forward mode, one seed direction per element of b
+    z = solve(A, Dual(b, np.eye(2)))
+    try:
+        assert np.allclose(z.val, np.linalg.solve(A, b))
+        assert np.allclose(z.der, np.linalg.inv(A).T)
+    except AssertionError as e:
+        print(e)
+        raise AssertionError
+
+    # reverse mode, through a reduction
+    x = Rnode(b)
+    f = np.sum(Elem.exp(solve(A, x)))
+    f.grad_value = 1.0
+    try:
+        assert np.allclose(x.grad(), np.linalg.solve(A.T, np.exp(np.linalg.solve(A, b))))
+    except AssertionError as e:
+        print(e)
+        raise AssertionError
+
+    # missing rules raise NotImplementedError
+    with pytest.raises(NotImplementedError) as excinfo:
+        solve(Rnode(A), b)
+    assert "argument 0 of solve" in str(excinfo.value)
+    with pytest.raises(NotImplementedError):
+        primitive(np.sin)(Dual(1.0))
+
+
+def test_stable():
+    """Test of the fused, numerically stable primitives."""
+    x = np.array([-1000.0, -30.0, -1.0, 0.0, 2.0, 40.0, 1000.0])
+    with np.errstate(over='ignore'):
+        sigmoid = 1 / (1 + np.exp(-x))
+        complement = 1 / (1 + np.exp(x))
+
+    # values are finite where the naive formulas overflow
+    with np.errstate(over='raise'):
+        try:
+            assert np.allclose(Elem.logistic(x), sigmoid, rtol=1e-12, atol=0)
+            assert np.allclose(Elem.softplus(x)[:6], np.log1p(np.exp(x[:6])))
+            assert Elem.softplus(x)[-1] == 1000.0
+            assert np.allclose(Elem.log_logistic(x)[1:], -np.log1p(np.exp(-x[1:])))
+            assert Elem.log_logistic(x)[0] == -1000.0
+        except AssertionError as e:
+            print(e)
+            raise AssertionError
+
+    # derivatives in both modes
+    for f, df in [(Elem.softplus, sigmoid), (Elem.log_logistic, complement),
+                  (Elem.logistic, sigmoid * complement)]:
+        z = Rnode(x)
+        g = f(z)
+        g.grad_value = 1.0
+        try:
+            assert np.allclose(z.grad(), df, rtol=1e-12, atol=1e-16)
+            assert np.allclose(f(Dual(x, 2.0)).der, 2 * df, rtol=1e-12, atol=1e-16)
+        except AssertionError as e:
+            print(e)
+            raise AssertionError
+
+    x = np.array([1e-10, 0.5, -0.5])
+    try:
+        assert np.allclose(Elem.log1p(Dual(x, 1.0)).der, 1 / (1 + x))
+        assert np.allclose(Elem.expm1(Dual(x, 1.0)).der, np.exp(x))
+        assert Elem.expm1(Dual(1e-10, 1.0)).val == np.expm1(1e-10)
+        assert np.log1p(Rnode(1e-10)).value == np.log1p(1e-10)
+    except AssertionError as e:
+        print(e)
+        raise AssertionError
+    with pytest.raises(ValueError, match=r".* log1p .*"):
+        Elem.log1p(Dual(-1.0))
+
+    # xlogy is 0 where x == 0, including at y == 0
+    p = np.array([0.0, 0.25, 0.75])
+    try:
+        assert np.all(Elem.xlogy(p, np.array([0.0, 0.5, 1.0])) == [0.0, 0.25 * np.log(0.5), 0.0])
+        assert Elem.xlogy(0.0, 0.0) == 0.0
+    except AssertionError as e:
+        print(e)
+        raise AssertionError
+    P, Q = Rnode(p), Rnode(np.array([0.5, 0.25, 0.25]))
+    f = np.sum(Elem.xlogy(P, Q))
+    fx = Elem.xlogy(Dual(2.0, [1.0, 0.0]), Dual(3.0, [0.0, 1.0]))
+    try:
+        dp, dq = gradient(f, [P, Q])
+        assert np.allclose(dp, np.log([0.5, 0.25, 0.25]))
+        assert np.allclose(dq, p / [0.5, 0.25, 0.25])
+        assert np.allclose(fx.der, [np.log(3.0), 2.0 / 3.0])
+    except AssertionError as e:
+        print(e)
+        raise AssertionError
+
+    # the derivative in y is 0, not nan, where x == 0 and y == 0
+    X, Y = Rnode(np.array([0.0, 1.0])), Rnode(np.array([0.0, 0.5]))
+    f = np.sum(Elem.xlogy(X, Y))
+    fx = Elem.xlogy(np.array([0.0, 1.0]), Dual(np.array([0.0, 0.5]), np.array([1.0, 1.0])))
+    try:
+        assert np.array_equal(gradient(f, [Y])[0], [0.0, 2.0])
+        assert np.array_equal(fx.der, [0.0, 2.0])
+    except AssertionError as e:
+        print(e)
+        raise AssertionError
+
+
+def test_piecewise():
+    """Test of the vectorized piecewise primitives and their subgradient conventions."""
+    x = np.array([-2.0, 0.0, 1.0, 6.0, 7.0])
+
+    # relu, relu6 and abs on batched inputs, derivative 0 at the kinks
+    for f, value, der in [(Elem.relu, [0.0, 0.0, 1.0, 6.0, 7.0], [0, 0, 1, 1, 1]),
+                          (Elem.relu6, [0.0, 0.0, 1.0, 6.0, 6.0], [0, 0, 1, 0, 0]),
+                          (Elem.abs, [2.0, 0.0, 1.0, 6.0, 7.0], [-1, 0, 1, 1, 1])]:
+        z = Rnode(x)
+        g = np.sum(f(z))
+        fx = f(Dual(x, 1.0))
+        try:
+            assert np.all(g.value == np.sum(value))
+            assert np.all(gradient(g, [z])[0] == der)
+            assert np.all(fx.val == value)
+            assert np.all(fx.der == der)
+        except AssertionError as e:
+            print(e)
+            raise AssertionError
+
+    # built-in abs and NumPy functions dispatch to the primitives
+    try:
+        assert abs(Dual(-3.0, 2.0)).der == -2.0
+        assert np.abs(Rnode(-3.0)).value == 3.0
+        assert np.maximum(Dual(1.0, 1.0), 2.0).der == 0.0
+        assert np.clip(Dual(x, 1.0), 0.0, 6.0).val.tolist() == [0.0, 0.0, 1.0, 6.0, 6.0]
+    except AssertionError as e:
+        print(e)
+        raise AssertionError
+
+    # clip, differentiable in its bounds
+    z, lo, hi = Rnode(x), Rnode(0.0), Rnode(6.0)
+    f = np.sum(Elem.clip(z, lo, hi))
+    try:
+        dz, dlo, dhi = gradient(f, [z, lo, hi])
+        assert np.all(dz == [0, 0, 1, 0, 0])
+        assert dlo == 2.0
+        assert dhi == 2.0
+        assert np.all(Elem.clip(Dual(x, 1.0), None, 1.0).der == [1, 1, 0, 0, 0])
+    except AssertionError as e:
+        print(e)
+        raise AssertionError
+
+    # maximum and minimum split ties evenly
+    a, b = Rnode(np.array([1.0, 2.0, 3.0])), Rnode(np.array([3.0, 2.0, 1.0]))
+    f = np.sum(Elem.maximum(a, b) * np.array([1.0, 10.0, 100.0]))
+    g = Elem.minimum(Dual(np.array([1.0, 2.0, 3.0]), 1.0), np.array([3.0, 2.0, 1.0]))
+    try:
+        da, db = gradient(f, [a, b])
+        assert np.all(da == [0.0, 5.0, 100.0])
+        assert np.all(db == [1.0, 5.0, 0.0])
+        assert np.all(g.der == [1.0, 0.5, 0.0])
+    except AssertionError as e:
+        print(e)
+        raise AssertionError
+
+    # where picks the derivative of the chosen input
+    z = Rnode(x)
+    f = np.sum(np.where(x > 0, Elem.exp(z), z * z))
+    try:
+        assert np.allclose(gradient(f, [z])[0], np.where(x > 0, np.exp(x), 2 * x))
+        assert np.all(Elem.where(x > 0, Dual(x, 1.0), 0.0).der == [0, 0, 1, 1, 1])
+    except AssertionError as e:
+        print(e)
+        raise AssertionError
@@ -0,0 +1,173 @@
+"""Test the socket worker farm for farad package.
+"""
+
+import os
+import time
+import pytest
+import numpy as np
+import farad.elem as Elem
+import farad.driver as ad
+from farad.farm import Farm
+
+
+def f(x, y):
+    return Elem.sin(x) * y + x ** 2
+
+
+def crash(x):
+    """exp, killing its worker the first time it meets x = 3."""
+    marker = os.environ['FARAD_TEST_MARKER']
+    if x == 3.0 and not os.path.exists(marker):
+        open(marker, 'w').close()
+        os._exit(1)
+    return Elem.exp(x)
+
+
+def hang(x):
+    """exp, stalling its worker the first time it meets x = 3."""
+    marker = os.environ['FARAD_TEST_MARKER']
+    if x == 3.0 and not os.path.exists(marker):
+        open(marker, 'w').close()
+        time.sleep(60)
+    return Elem.exp(x)
+
+
+def fail(x):
+    raise ZeroDivisionError('no derivative here')
+
+
+def test_farm(tmp_path):
+    """Test of batches over TCP and Unix sockets, with result reassembly."""
+    points = np.random.default_rng(0).normal(size=(40, 2))
+    reference = ad.AutoDiff(f).value_and_grad(points)
+    with Farm(f, chunksize=3) as farm:
+        farm.spawn(2)
+        values, ders = farm.value_and_grad(points, timeout=60)
+        try:
+            assert values.shape == (40,) and ders.shape == (40, 2)
+            assert np.allclose(values, reference[0]) and np.allclose(ders, reference[1])
+        except AssertionError as e:
+            print(e)
+            raise AssertionError
+
+        out = np.empty(40), np.empty((40, 2))
+        try:
+            assert farm.value_and_grad(points, out=out, timeout=60)[1] is out[1]
+            assert np.allclose(out[1], reference[1])
+        except AssertionError as e:
+            print(e)
+            raise AssertionError
+
+    with Farm([f, f], mode='reverse', wrt=[1], address=str(tmp_path / 'farm.sock')) as farm:
+        farm.spawn(1)
+        values, ders = farm.value_and_grad(points, timeout=60)
+        try:
+            assert values.shape == (40, 2) and np.allclose(ders[:, 1, 0], np.sin(points[:, 0]))
+        except AssertionError as e:
+            print(e)
+            raise AssertionError
+
+
+def test_lost_workers(tmp_path, monkeypatch):
+    """Test of chunks handed out again after losing or waiting on their worker."""
+    x = np.arange(6.0)
+    monkeypatch.setenv('FARAD_TEST_MARKER', str(tmp_path / 'crashed'))
+    with Farm(crash, mode='reverse', chunksize=1) as farm:
+        farm.spawn(2)
+        values, ders = farm.value_and_grad(x, timeout=60)
+        try:
+            assert os.path.exists(tmp_path / 'crashed')
+            assert np.allclose(ders, np.exp(x))
+        except AssertionError as e:
+            print(e)
+            raise AssertionError
+
+    monkeypatch.setenv('FARAD_TEST_MARKER', str(tmp_path / 'hung'))
+    with Farm(hang, mode='reverse', chunksize=1) as farm:
+        farm.spawn(2)
+        start = time.perf_counter()
+        values, ders = farm.value_and_grad(x, timeout=60)
+        try:
+            assert time.perf_counter() - start < 30  # the stalled chunk was stolen
+            assert np.allclose(ders, np.exp(x))
+        except AssertionError as e:
+            print(e)
+            raise AssertionError
+
+
+def test_retries(tmp_path, monkeypatch):
+    """Test of a lost chunk handed out first to the next worker, and of max_retries."""
+    from concurrent.futures import ThreadPoolExecutor
+
+    x = np.arange(6.0)
+    monkeypatch.setenv('FARAD_TEST_MARKER', str(tmp_path / 'crashed'))
+    with Farm(crash, mode='reverse', chunksize=1) as farm, ThreadPoolExecutor(1) as pool:
+        farm.spawn(1)
+        result = pool.submit(farm.value_and_grad, x, timeout=60)
+        deadline = time.perf_counter() + 30
+        while not (os.path.exists(tmp_path / 'crashed') and farm._workers == 0) and time.perf_counter() < deadline:
+            time.sleep(0.01)
+        try:
+            with farm._cond:  # the only worker is gone, its chunk is next
+                assert farm._workers == 0
+                assert list(farm._job.pending) == [3, 4, 5] and farm._job.attempts[3] == 1
+        except AssertionError as e:
+            print(e)
+            raise AssertionError
+        farm.spawn(1)  # the replacement picks the chunk up
+        values, ders = result.result(60)
+        try:
+            assert np.allclose(ders, np.exp(x))
+        except AssertionError as e:
+            print(e)
+            raise AssertionError
+
+    monkeypatch.setenv('FARAD_TEST_MARKER', str(tmp_path / 'crashed again'))
+    with Farm(crash, mode='reverse', chunksize=1, max_retries=0) as farm:
+        farm.spawn(1)
+        with pytest.raises(RuntimeError, match='chunk 3 lost its worker 1 times'):
+            farm.value_and_grad(x, timeout=60)
+
+
+def test_handshake(monkeypatch):
+    """Test of clients that do not authenticate, which must not hold up the farm."""
+    import socket
+    import farad.farm
+    from multiprocessing.connection import Client
+
+    monkeypatch.setattr(farad.farm, '_HANDSHAKE_TIMEOUT', 0.5)
+    x = np.arange(4.0)
+    farm = Farm(Elem.exp, mode='reverse', chunksize=1)
+    silent = socket.create_connection(farm.address)  # connects and never speaks
+    try:
+        farm.spawn(2)
+        values, ders = farm.value_and_grad(x, timeout=30)
+        assert np.allclose(ders, np.exp(x))
+        with pytest.raises(Exception):
+            Client(farm.address, authkey=b'wrong key')
+        assert farm.value_and_grad(x, timeout=30)[0][3] == np.exp(3.0)
+    except AssertionError as e:
+        print(e)
+        raise AssertionError
+    finally:
+        start = time.perf_counter()
+        farm.close()
+        silent.close()
+    try:
+        assert time.perf_counter() - start < 5  # closing does not wait on the silent client
+    except AssertionError as e:
+        print(e)
+        raise AssertionError
+
+
+def test_errors():
+    """Test of errors raised by the function and of timeouts."""
+    with Farm(fail) as farm:
+        farm.spawn(1)
+        with pytest.raises(ZeroDivisionError):
+            farm.value_and_grad([1.0, 2.0], timeout=60)
+    with Farm(f) as farm:  # no workers
+        with pytest.raises(TimeoutError):
+            farm.value_and_grad([[1.0, 2.0]], timeout=0.1)
+    with pytest.raises(ValueError):
+        Farm(f, mode='sideways')
@@ -0,0 +1,162 @@
+"""Test reductions and linear algebra for farad package.
+"""
+
+import pytest
+import numpy as np
+import farad.linalg as La
+import farad.elem as Elem
+from farad.dual import Dual
+from farad.rnode import Rnode, gradient, record, reevaluate
+
+
+def numeric_gradient(f, x, h=1e-6):
+    """Central finite differences of a scalar function of an array."""
+    g = np.zeros_like(x)
+    for i in np.ndindex(x.shape):
+        e = np.zeros_like(x)
+        e[i] = h
+        g[i] = (f(x + e) - f(x - e)) / (2 * h)
+    return g
+
+
+def test_sum():
+    """Test of sum and mean over lists and arrays."""
+    # a list of scalar nodes becomes one packed node and one sum node
+    x = [Rnode(1.0), Rnode(2.0), Rnode(3.0)]
+    with record() as tape:
+        f = La.sum(x)
+    try:
+        assert f.value == 6.0
+        assert len(x[0].children) == 1
+        assert len(x[0].children[0][1].children) == 1
+        assert gradient(f, x) == [1.0, 1.0, 1.0]
+    except AssertionError as e:
+        print(e)
+        raise AssertionError
+
+    # packed graphs can be re-evaluated
+    try:
+        assert reevaluate(f, x, [1.0, 5.0, 3.0], tape) == 9.0
+    except AssertionError as e:
+        print(e)
+        raise AssertionError
+
+    # list of Duals, with constants
+    fx = La.sum([Dual(1.0, [1.0, 0.0]), 2.0, Dual(3.0, [0.0, 2.0])])
+    try:
+        assert fx.val == 6.0
+        assert np.all(fx.der == [1.0, 2.0])
+    except AssertionError as e:
+        print(e)
+        raise AssertionError
+
+    # reductions along an axis
+    A = np.arange(6.0).reshape(2, 3)
+    M = Rnode(A)
+    f = La.sum(La.mean(M * M, axis=0) * np.array([1.0, 2.0, 3.0]))
+    fx = La.sum(La.mean(Dual(A, np.ones((2, 3))) ** 2, axis=1))
+    try:
+        assert np.allclose(gradient(f, [M])[0], A * [1.0, 2.0, 3.0])
+        assert np.isclose(fx.val, np.sum(np.mean(A ** 2, axis=1)))
+        assert np.isclose(fx.der, np.sum(2 * A / 3))
+    except AssertionError as e:
+        print(e)
+        raise AssertionError
+
+
+def test_matmul():
+    """Test of matmul and dot for all combinations of 1-D and 2-D operands."""
+    rng = np.random.default_rng(0)
+    shapes = [((3,), (3,)), ((2, 3), (3,)), ((3,), (3, 2)), ((2, 3), (3, 4))]
+    for sa, sb in shapes:
+        a, b = rng.normal(size=sa), rng.normal(size=sb)
+        w = rng.normal(size=np.shape(a @ b))
+
+        A, B = Rnode(a), Rnode(b)
+        ga, gb = gradient(La.sum(La.matmul(A, B) * w), [A, B])
+        try:
+            assert np.allclose(ga, numeric_gradient(lambda x: np.sum((x @ b) * w), a))
+            assert np.allclose(gb, numeric_gradient(lambda x: np.sum((a @ x) * w), b))
+        except AssertionError as e:
+            print(e)
+            raise AssertionError
+
+        # one seed direction per element of b
+        fx = La.sum(La.dot(a, Dual(b, np.eye(b.size).reshape((b.size,) + sb))) * w)
+        try:
+            assert np.allclose(fx.der, gb.ravel())
+        except AssertionError as e:
+            print(e)
+            raise AssertionError
+
+    # dot with a scalar is a product
+    try:
+        assert La.dot(Dual(2.0, 1.0), 3.0).der == 3.0
+        assert np.allclose((np.ones((2, 2)) @ Dual(np.ones(2), np.ones(2))).val, [2.0, 2.0])
+    except AssertionError as e:
+        print(e)
+        raise AssertionError
+
+
+def test_norm():
+    """Test of the Euclidean norm."""
+    x = np.array([1.0, -2.0, 2.0])
+    X = Rnode(x)
+    f = La.norm(X)
+    try:
+        assert f.value == 3.0
+        assert np.allclose(gradient(f, [X])[0], x / 3.0)
+        assert np.isclose(np.linalg.norm(Dual(x, [1.0, 0.0, 0.0])).der, 1.0 / 3.0)
+    except AssertionError as e:
+        print(e)
+        raise AssertionError
+
+    # other norms and NumPy arguments are rejected by name
+    for call, name in [(lambda: La.norm(X, ord=1), 'ord'), (lambda: np.linalg.norm(X, axis=0), 'axis'),
+                       (lambda: np.sum(X, keepdims=True), 'keepdims'), (lambda: np.mean(X, dtype=float), 'dtype'),
+                       (lambda: np.dot(X, x, out=np.empty(())), 'out')]:
+        with pytest.raises(ValueError, match=f'argument {name} of .* is unsupported'):
+            call()
+    try:
+        assert np.sum(X, keepdims=False).value == 1.0  # default values are accepted
+        assert np.linalg.norm(X, None, None).value == 3.0
+    except AssertionError as e:
+        print(e)
+        raise AssertionError
+
+
+def test_logsumexp_softmax():
+    """Test of logsumexp and softmax."""
+    x = np.array([[1.0, 2.0, 3.0], [1000.0, 1001.0, -1000.0]])
+    w = np.array([[0.5, -1.0, 2.0], [1.0, 0.0, 3.0]])
+    for axis in (None, 0, 1):
+        X = Rnode(x)
+        f = La.sum(La.logsumexp(X, axis=axis))
+        g = La.sum(La.softmax(X, axis=axis) * w)
+        try:
+            assert np.all(np.isfinite(f.value))
+            assert np.allclose(gradient(f, [X])[0], numeric_gradient(
+                lambda y: np.sum(La.logsumexp(y, axis=axis)), x))
+            assert np.allclose(gradient(g, [X])[0], numeric_gradient(
+                lambda y: np.sum(La.softmax(y, axis=axis) * w), x), atol=1e-6)
+        except AssertionError as e:
+            print(e)
+            raise AssertionError
+
+        # forward mode with one seed direction per element
+        seed = np.eye(x.size).reshape((x.size,) + x.shape)
+        fx = La.sum(La.softmax(Dual(x, seed), axis=axis) * w)
+        try:
+            assert np.allclose(fx.der, gradient(g, [X])[0].ravel())
+        except AssertionError as e:
+            print(e)
+            raise AssertionError
+
+    # with scalar nodes
+    x = [Rnode(0.0), Rnode(np.log(3.0))]
+    f = Elem.log(La.dot(La.softmax(x), [0.0, 1.0]))
+    try:
+        assert np.allclose(gradient(f, x), [-0.25, 0.25])
+    except AssertionError as e:
+        print(e)
+        raise AssertionError
@@ -0,0 +1,114 @@
+"""Test parallel evaluation for farad package.
+"""
+
+import os
+import mmap
+import pytest
+import numpy as np
+import farad.elem as Elem
+import farad.linalg as La
+import farad.driver as ad
+import farad.parallel as parallel
+from farad.parallel import ParallelDiff
+
+
+def f(x, y):
+    return Elem.sin(x) * y + x ** 2
+
+
+def g(x, y):
+    return [x * y, Elem.exp(x) - y]
+
+
+def h(x):
+    return La.sum(x * x) + x[0]
+
+
+def test_forward():
+    """Test of forward mode over a batch of points."""
+    points = np.random.default_rng(0).normal(size=(50, 2))
+    with ParallelDiff(f, max_workers=2) as pool:
+        values, ders = pool.value_and_grad(points)
+    reference = ad.AutoDiff(f).value_and_grad(points.tolist())
+    try:
+        assert values.shape == (50,) and ders.shape == (50, 2)
+        assert np.allclose(values, reference[0]) and np.allclose(ders, reference[1])
+    except AssertionError as e:
+        print(e)
+        raise AssertionError
+
+    # vector functions, uneven chunks, and output buffers
+    out = np.empty((50, 2)), np.empty((50, 2, 2))
+    with ParallelDiff(g, dim=2, max_workers=2, chunksize=7) as pool:
+        values, ders = pool.value_and_grad(points, out=out)
+    try:
+        assert values is out[0] and ders is out[1]
+        assert np.allclose(ders, ad.AutoDiff(g, dim=2).forward(points.tolist()))
+    except AssertionError as e:
+        print(e)
+        raise AssertionError
+
+
+def test_reverse():
+    """Test of reverse mode, with a single parameter and with array parameters."""
+    x = np.linspace(0.0, 1.0, 9)
+    with ParallelDiff(Elem.exp, mode='reverse', max_workers=2, chunksize=1) as pool:
+        values, ders = pool.value_and_grad(x)
+    try:
+        assert np.allclose(values, np.exp(x)) and np.allclose(ders, np.exp(x))
+    except AssertionError as e:
+        print(e)
+        raise AssertionError
+
+    points = np.arange(12.0).reshape(4, 3)
+    with ParallelDiff(h, mode='reverse', array_input=True, max_workers=2) as pool:
+        values, ders = pool.value_and_grad(points)
+    try:
+        assert np.allclose(values, np.sum(points ** 2, axis=1) + points[:, 0])
+        assert np.allclose(ders, 2 * points + [1.0, 0.0, 0.0])
+    except AssertionError as e:
+        print(e)
+        raise AssertionError
+
+    with ParallelDiff([f, f], mode='reverse', wrt=[1], max_workers=2) as pool:
+        values, ders = pool.value_and_grad([[0.5, 2.0]])
+    try:
+        assert values.shape == (1, 2) and ders.shape == (1, 2, 1)
+        assert np.allclose(ders, np.sin(0.5))
+    except AssertionError as e:
+        print(e)
+        raise AssertionError
+
+
+@pytest.mark.skipif(not os.path.isdir(parallel._SHM_DIR), reason='no POSIX shared memory directory')
+def test_shared_memory():
+    """Test of the results returned as views of shared memory."""
+    x = np.linspace(0.0, 1.0, 9)
+    before = set(os.listdir(parallel._SHM_DIR))
+    try:
+        with ParallelDiff(Elem.exp, mode='reverse', max_workers=2, chunksize=2) as pool:
+            values, ders = pool.value_and_grad(x)
+            assert np.allclose(values, np.exp(x)) and np.allclose(ders, np.exp(x))
+            # the results are views of the shared blocks, not copies
+            assert isinstance(values.base.base.obj, mmap.mmap) and isinstance(ders.base.base.obj, mmap.mmap)
+            # and the blocks are unlinked once the batch is done
+            assert set(os.listdir(parallel._SHM_DIR)) == before
+            out = np.empty(9), np.empty(9)
+            values, ders = pool.value_and_grad(x, out=out)
+            assert values is out[0] and ders is out[1] and np.allclose(ders, np.exp(x))
+    except AssertionError as e:
+        print(e)
+        raise AssertionError
+
+
+def test_errors():
+    """Test of the arguments checked before starting workers."""
+    with pytest.raises(TypeError) as excinfo:
+        ParallelDiff(lambda x: x)
+    assert "picklable" in str(excinfo.value)
+
+    with pytest.raises(ValueError):
+        ParallelDiff(f, mode='sideways')
+
+    with pytest.raises(ValueError):
+        ParallelDiff(f).value_and_grad(np.empty((0, 2)))
@@ -0,0 +1,91 @@
+"""Test special functions for farad package.
+"""
+
+import math
+import numpy as np
+import farad.special as Sp
+from farad.dual import Dual
+from farad.rnode import Rnode, gradient
+
+EULER = 0.5772156649015329
+
+
+def test_values():
+    """Test of special function values against math and known constants."""
+    x = np.array([-2.5, -0.5, 0.1, 0.5, 1.0, 3.7, 25.0])
+    try:
+        assert np.allclose(Sp.erf(x), [math.erf(xi) for xi in x])
+        assert np.allclose(Sp.gammaln(x), [math.lgamma(xi) for xi in x])
+        assert np.isclose(Sp.digamma(1.0), -EULER, rtol=1e-14)
+        assert np.isclose(Sp.digamma(0.5), -EULER - 2 * np.log(2), rtol=1e-14)
+        assert np.isclose(Sp.digamma(-0.5), 2 - EULER - 2 * np.log(2), rtol=1e-14)
+        assert np.isclose(Sp.digamma(10.0), 1 + 1 / 2 + 1 / 3 + 1 / 4 + 1 / 5 + 1 / 6 + 1 / 7 + 1 / 8 + 1 / 9 - EULER)
+        assert np.isclose(Sp.betaln(2.0, 3.0), np.log(1 / 12))
+        assert isinstance(Sp.erf(0.5), float)
+    except AssertionError as e:
+        print(e)
+        raise AssertionError
+
+
+def test_derivatives():
+    """Test of special function derivatives in forward and reverse mode."""
+    h = 1e-6
+    for x in [-2.5, -0.5, 0.3, 1.0, 3.7, 12.0]:
+        for f in [Sp.erf, Sp.gammaln, Sp.digamma]:
+            numeric = (f(x + h) - f(x - h)) / (2 * h)
+            fx = f(Dual(x, 1.0))
+            X = Rnode(x)
+            try:
+                assert np.isclose(fx.val, f(x))
+                assert np.isclose(fx.der, numeric, rtol=1e-6)
+                assert np.isclose(gradient(f(X), [X])[0], fx.der)
+            except AssertionError as e:
+                print(e)
+                raise AssertionError
+
+    # closed forms: trigamma(1) = pi**2 / 6
+    try:
+        assert np.isclose(Sp.digamma(Dual(1.0, 1.0)).der, np.pi ** 2 / 6, rtol=1e-14)
+        assert np.isclose(Sp.erf(Dual(0.0, 1.0)).der, 2 / np.sqrt(np.pi))
+    except AssertionError as e:
+        print(e)
+        raise AssertionError
+
+
+def test_arrays():
+    """Test of array-valued inputs, one node per call."""
+    x = np.array([0.5, 1.5, 4.0])
+    X = Rnode(x)
+    f = Sp.gammaln(X)
+    fx = Sp.gammaln(Dual(x, np.eye(3)))
+    try:
+        assert len(X.children) == 1
+        assert np.allclose(f.value, [math.lgamma(xi) for xi in x])
+        assert np.allclose(fx.der, np.diag(Sp.digamma(x)))
+    except AssertionError as e:
+        print(e)
+        raise AssertionError
+
+
+def test_betaln():
+    """Test of betaln gradients in both arguments."""
+    h = 1e-6
+    a, b = 2.5, 0.7
+    A, B = Rnode(a), Rnode(b)
+    ga, gb = gradient(Sp.betaln(A, B), [A, B])
+    fa = Sp.betaln(Dual(a, [1.0, 0.0]), Dual(b, [0.0, 1.0]))
+    try:
+        assert np.isclose(ga, (Sp.betaln(a + h, b) - Sp.betaln(a - h, b)) / (2 * h), rtol=1e-6)
+        assert np.isclose(gb, (Sp.betaln(a, b + h) - Sp.betaln(a, b - h)) / (2 * h), rtol=1e-6)
+        assert np.allclose(fa.der, [ga, gb])
+        assert np.isclose(ga, Sp.digamma(a) - Sp.digamma(a + b))
+    except AssertionError as e:
+        print(e)
+        raise AssertionError
+
+    # mixed constant and Dual arguments
+    try:
+        assert np.isclose(Sp.betaln(a, Dual(b, 1.0)).der, gb)
+    except AssertionError as e:
+        print(e)
+        raise AssertionError
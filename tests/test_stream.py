@@ -0,0 +1,67 @@
+"""Test streaming evaluation for farad package.
+"""
+
+import pytest
+import numpy as np
+import farad.elem as Elem
+import farad.driver as ad
+from farad.stream import stream
+
+
+def f(x, y):
+    return Elem.sin(x) * y + x ** 2
+
+
+def test_files(tmp_path):
+    """Test of .npy files in and out, and of resuming an interrupted run."""
+    points = np.random.default_rng(0).normal(size=(50, 2))
+    np.save(tmp_path / 'points.npy', points)
+    reference = ad.AutoDiff(f).value_and_grad(points)
+
+    reported = []
+    values, ders = stream(f, tmp_path / 'points.npy', tmp_path / 'values.npy', tmp_path / 'ders.npy',
+                          chunksize=8, progress=lambda done, total: reported.append((done, total)))
+    try:
+        assert isinstance(values, np.memmap) and ders.shape == (50, 2)
+        assert reported == [(i, 50) for i in (8, 16, 24, 32, 40, 48, 50)]
+        assert np.allclose(np.load(tmp_path / 'values.npy'), reference[0])
+        assert np.allclose(np.load(tmp_path / 'ders.npy'), reference[1])
+    except AssertionError as e:
+        print(e)
+        raise AssertionError
+
+    def interrupt(done, total):
+        if done >= 24:
+            raise KeyboardInterrupt
+
+    (tmp_path / 'values.npy').unlink()
+    with pytest.raises(KeyboardInterrupt):
+        stream(f, tmp_path / 'points.npy', tmp_path / 'values.npy', tmp_path / 'ders.npy', chunksize=12,
+               progress=interrupt)
+    values, ders = stream(f, tmp_path / 'points.npy', tmp_path / 'values.npy', tmp_path / 'ders.npy', chunksize=12,
+                          start=24)
+    try:
+        assert np.allclose(values, reference[0]) and np.allclose(ders, reference[1])
+    except AssertionError as e:
+        print(e)
+        raise AssertionError
+
+
+def test_arrays():
+    """Test of in-memory outputs, reverse mode and worker processes."""
+    x = np.linspace(0.0, 1.0, 9)
+    values, ders = np.empty(9), np.empty(9)
+    result = stream(Elem.exp, x, values, ders, mode='reverse', chunksize=4, max_workers=1)
+    try:
+        assert result[0] is values and result[1] is ders
+        assert np.allclose(values, np.exp(x)) and np.allclose(ders, np.exp(x))
+    except AssertionError as e:
+        print(e)
+        raise AssertionError
+
+    with pytest.raises(ValueError):
+        stream(Elem.exp, x, values, ders, start=10)
+    with pytest.raises(ValueError):
+        stream(Elem.exp, x, np.empty(3), np.empty(3), start=4)
+    with pytest.raises(ValueError):
+        stream(Elem.exp, [], values, ders)